@@ -1,27 +1,15 @@
-from flask import Flask, render_template, jsonify, request
+import logging
 from dotenv import load_dotenv
-import os
-from ecommbot.retrieval_generation import generation
-from ecommbot.ingest import ingestdata
-
-app = Flask(__name__)
+from ecommbot.server import create_app
+from ecommbot.startup import chain, initialize
 
 load_dotenv()
+logging.basicConfig(level=logging.INFO)
 
-vstore=ingestdata("done")
-chain=generation(vstore)
-
-@app.route("/")
-def index():
-    return render_template('chat.html')
+# The vector store and chain are built on the first request, or earlier per APP_INIT
+initialize()
 
-@app.route("/get", methods=["GET", "POST"])
-def chat():
-    msg = request.form["msg"]
-    input = msg
-    result=chain.invoke(input)
-    print("Response : ", result)
-    return str(result)
+app = create_app(chain)
 
 if __name__ == '__main__':
-    app.run(debug= True)
\ No newline at end of file
+    app.run(debug= True)
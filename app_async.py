@@ -0,0 +1,16 @@
+import logging
+from dotenv import load_dotenv
+from ecommbot.async_server import create_async_app
+from ecommbot.startup import chain, initialize
+
+load_dotenv()
+logging.basicConfig(level=logging.INFO)
+
+# The vector store and chain are built on the first request, or earlier per APP_INIT
+initialize()
+
+app = create_async_app(chain)
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run("app_async:app", workers=4)
@@ -0,0 +1,92 @@
+"""
+Recall/latency harness for the IVF index against exact search.
+
+Queries are the questions in data-generator/ragas_synthetic_testset.json. They
+are embedded with the ingest embedder, or with deterministic fake embeddings
+when --offline is set. The corpus is either the saved local index
+(LOCAL_INDEX_PATH) or, with --synthetic N, N clustered random vectors. The
+synthetic mode is for scale tests.
+
+Usage:
+    python benchmarks/bench_ann.py --synthetic 1000000 --dim 256 --offline
+    python benchmarks/bench_ann.py --nprobe 1,4,8,16,32
+"""
+
+import argparse
+import time
+
+import numpy as np
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from common import load_questions
+from ecommbot.local_vectorstore import LocalVectorStore
+
+
+def synthetic_store(n, dim, embedding, clusters=1000, seed=0):
+    """Gaussian blobs around random centres, so the data has structure for IVF to exploit."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dim), dtype=np.float32)
+    store = LocalVectorStore(embedding, capacity=n)
+    chunk = 50_000
+    for start in range(0, n, chunk):
+        rows = min(chunk, n - start)
+        vectors = centres[rng.integers(0, clusters, rows)]
+        vectors += 0.5 * rng.standard_normal((rows, dim), dtype=np.float32)
+        store.add_embeddings(zip([""] * rows, vectors), ids=[str(start + i) for i in range(rows)])
+    return store
+
+
+def run(store, queries, k, **search_kwargs):
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        hits = store.similarity_search_by_vector(query, k=k, **search_kwargs)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append({doc.id for doc in hits})
+    return results, np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--synthetic", type=int, help="use N synthetic vectors instead of the saved index")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--offline", action="store_true", help="embed queries with fake embeddings")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--nlist", type=int, default=0, help="IVF lists (0 = 4*sqrt(n))")
+    parser.add_argument("--nprobe", default="1,2,4,8,16,32")
+    parser.add_argument("--repeat", type=int, default=20, help="passes over the query set for latency")
+    args = parser.parse_args()
+
+    if args.offline:
+        embedding = DeterministicFakeEmbedding(size=args.dim)
+    else:
+        from ecommbot.clients import embeddings
+        embedding = embeddings()
+
+    if args.synthetic:
+        store = synthetic_store(args.synthetic, args.dim, embedding)
+    else:
+        from ecommbot.clients import LOCAL_INDEX_PATH
+        store = LocalVectorStore.load(LOCAL_INDEX_PATH, embedding)
+    if not len(store):
+        raise SystemExit("The corpus is empty: ingest with VECTOR_BACKEND=local or pass --synthetic N")
+
+    questions = load_questions()
+    queries = np.asarray(embedding.embed_documents(questions), dtype=np.float32)
+    queries = np.tile(queries, (args.repeat, 1))
+
+    start = time.perf_counter()
+    store.build_ann_index(nlist=args.nlist or None)
+    print(f"{len(store):,} vectors, {len(questions)} questions x {args.repeat}; "
+          f"IVF with {store.ann_index.nlist} lists trained in {time.perf_counter() - start:.1f}s")
+
+    exact, p50, p99 = run(store, queries, args.k, exact=True)
+    print(f"  exact        recall@{args.k} 1.000   p50 {p50:8.3f} ms   p99 {p99:8.3f} ms")
+    for nprobe in map(int, args.nprobe.split(",")):
+        approx, p50, p99 = run(store, queries, args.k, nprobe=nprobe)
+        recall = np.mean([len(a & e) / len(e) for a, e in zip(approx, exact)])
+        print(f"  nprobe={nprobe:<5} recall@{args.k} {recall:.3f}   p50 {p50:8.3f} ms   p99 {p99:8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Query-type classification throughput: one LLM call per query versus batched classification.
+
+The "sequential" path is classify_query_type called once per query, as the
+testset enrichment used to do. The "batched" path is classify_queries, which
+puts --per-prompt queries in each prompt and keeps --concurrency requests in
+flight. The LLM is a stub that labels queries with the keyword heuristics
+after --llm-latency seconds and fails a --failure-rate share of requests, so
+the retry and fallback paths run too. Queries are the synthetic testset
+questions, repeated with a numeric suffix up to --queries. The sequential
+path is timed on --sequential-sample queries and extrapolated.
+
+Usage:
+    python benchmarks/bench_classifier.py --queries 1000 --per-prompt 20 --concurrency 8
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+import time
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from common import ROOT_DIR, load_questions
+
+sys.path.insert(0, os.path.join(ROOT_DIR, "data-generator"))
+
+from query_classifier import QueryClassifier  # noqa: E402
+
+NUMBERED_RE = re.compile(r"^\d+\. (.*)$", re.MULTILINE)
+SINGLE_RE = re.compile(r"Classify this query: '(.*)'$", re.DOTALL)
+
+
+class StubClassifierModel(BaseChatModel):
+    """Chat model that labels queries with the keyword heuristics after a fixed delay."""
+
+    latency: float = 0.3
+    failure_rate: float = 0.0
+    seed: int = 0
+    calls: int = 0
+
+    @property
+    def _llm_type(self):
+        return "stub-classifier"
+
+    def _reply(self, messages):
+        self.calls += 1
+        if random.Random(self.seed + self.calls).random() < self.failure_rate:
+            raise RuntimeError("stub classifier failure")
+        text = messages[-1].content
+        queries = NUMBERED_RE.findall(text)
+        if queries:
+            labels = [QueryClassifier._simple_fallback_classification(query) for query in queries]
+            content = json.dumps(labels)
+        else:
+            content = QueryClassifier._simple_fallback_classification(SINGLE_RE.search(text).group(1))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        return self._reply(messages)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        return self._reply(messages)
+
+
+def make_queries(n):
+    questions = load_questions()
+    return [f"{questions[i % len(questions)]} ({i // len(questions)})" for i in range(n)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--per-prompt", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--llm-latency", type=float, default=0.3)
+    parser.add_argument("--failure-rate", type=float, default=0.05)
+    parser.add_argument("--sequential-sample", type=int, default=10)
+    args = parser.parse_args()
+
+    queries = make_queries(args.queries)
+    expected = [QueryClassifier._simple_fallback_classification(query) for query in queries]
+    print(f"{len(queries)} queries, LLM latency {args.llm_latency * 1000:.0f} ms, "
+          f"failure rate {args.failure_rate:.0%}")
+
+    llm = StubClassifierModel(latency=args.llm_latency)
+    classifier = QueryClassifier(llm)
+    sample = queries[:args.sequential_sample]
+    start = time.perf_counter()
+    for query in sample:
+        classifier.classify_query_type(query)
+    elapsed = (time.perf_counter() - start) / len(sample) * len(queries)
+    print(f"  sequential  {elapsed:8.2f} s (extrapolated from {len(sample)} queries), {len(queries)} LLM calls")
+
+    for name in ("batch", "abatch"):
+        llm = StubClassifierModel(latency=args.llm_latency, failure_rate=args.failure_rate)
+        classifier = QueryClassifier(llm)
+        start = time.perf_counter()
+        if name == "batch":
+            labels = classifier.classify_queries(queries, args.concurrency, args.per_prompt)
+        else:
+            labels = asyncio.run(classifier.aclassify_queries(queries, args.concurrency, args.per_prompt))
+        elapsed = time.perf_counter() - start
+        correct = sum(label == want for label, want in zip(labels, expected))
+        print(f"  {name:<10}  {elapsed:8.2f} s, {llm.calls} LLM calls, {correct}/{len(queries)} labels as expected")
+
+        # Second pass: memo hits, plus a retry of the queries that fell back to the heuristics
+        calls = llm.calls
+        start = time.perf_counter()
+        classifier.classify_queries(queries)
+        print(f"  {'again':<10}  {time.perf_counter() - start:8.4f} s, {llm.calls - calls} LLM calls")
+
+
+if __name__ == "__main__":
+    main()
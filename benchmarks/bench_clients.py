@@ -0,0 +1,173 @@
+"""
+HTTP connection reuse: clients created per call versus the shared client registry.
+
+A local stand-in for the OpenAI API answers chat completions and embeddings
+after --latency seconds. It counts the TCP connections it accepts and
+delays the first response on each new connection by --connect-latency
+seconds, the cost of a TCP and TLS handshake to a remote API. --requests
+requests are sent from --concurrency threads in each scenario:
+
+- "per call": a new ChatOpenAI / OpenAIEmbeddings for every request, as code
+  that builds its own client does;
+- "registry": ecommbot.clients.chat_model() / embeddings(), shared by all
+  threads on one pooled, keep-alive HTTP client (the embeddings reuse the
+  connections the chat scenario opened);
+- "registry async": chat_model().ainvoke over --async-rounds successive
+  event loops (one asyncio.run each), which get one connection pool each.
+
+The embedding texts are unique, so the embedding cache never answers.
+Astra is not covered: its client cannot be pointed at a stand-in, but the
+registry reuses the store object, and with it astrapy's connection pool.
+
+Usage:
+    python benchmarks/bench_clients.py --requests 200 --concurrency 8 --connect-latency 0.05
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+# The registry's embeddings sit behind the on-disk embedding cache; keep it out of the working tree
+os.environ.setdefault("EMBEDDING_CACHE_PATH", os.path.join(tempfile.mkdtemp(prefix="bench_clients_"), "e.sqlite"))
+
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings  # noqa: E402
+
+from ecommbot.clients import chat_model, embeddings  # noqa: E402
+
+EMBEDDING_DIM = 8
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Minimal OpenAI chat-completions and embeddings endpoints, with HTTP/1.1 keep-alive."""
+
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+        self.fresh = True
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        delay = self.server.latency + (self.server.connect_latency if self.fresh else 0.0)
+        self.fresh = False
+        time.sleep(delay)
+        with self.server.lock:
+            self.server.requests += 1
+        if self.path.endswith("/embeddings"):
+            inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+            payload = {"object": "list", "model": body["model"],
+                       "data": [{"object": "embedding", "index": i, "embedding": [0.1] * EMBEDDING_DIM}
+                                for i in range(len(inputs))],
+                       "usage": {"prompt_tokens": 1, "total_tokens": 1}}
+        else:
+            payload = {"id": "stand-in", "object": "chat.completion", "created": 0, "model": body["model"],
+                       "choices": [{"index": 0, "finish_reason": "stop",
+                                    "message": {"role": "assistant", "content": "ok"}}],
+                       "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}}
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(latency, connect_latency):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    server.daemon_threads = True
+    server.latency, server.connect_latency = latency, connect_latency
+    server.lock = threading.Lock()
+    server.connections = server.requests = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run(server, n_requests, concurrency, call):
+    """Latencies of ``n_requests`` calls from ``concurrency`` threads, and the connections they opened."""
+    connections = server.connections
+    counter = itertools.count()
+
+    def one(_):
+        start = time.perf_counter()
+        call(next(counter))
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(one, range(n_requests)))
+    return np.array(latencies) * 1000, server.connections - connections
+
+
+def report(name, latencies, connections, n_requests):
+    p50, p95 = np.percentile(latencies, [50, 95])
+    print(f"  {name:<26} p50 {p50:7.1f} ms  p95 {p95:7.1f} ms  {connections:4d} connections "
+          f"for {n_requests} requests")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.02, help="stand-in response time, in seconds")
+    parser.add_argument("--connect-latency", type=float, default=0.05,
+                        help="extra delay on a new connection (handshake), in seconds")
+    parser.add_argument("--async-rounds", type=int, default=4)
+    args = parser.parse_args()
+
+    server = start_server(args.latency, args.connect_latency)
+    settings = {"base_url": f"http://127.0.0.1:{server.server_address[1]}/v1", "api_key": "sk-stand-in"}
+    embedding_settings = {**settings, "model": "text-embedding-3-small", "check_embedding_ctx_length": False}
+    print(f"{args.requests} requests per scenario from {args.concurrency} threads, stand-in latency "
+          f"{args.latency * 1000:.0f} ms, new-connection cost {args.connect_latency * 1000:.0f} ms")
+
+    scenarios = [
+        ("chat, per call", lambda i: ChatOpenAI(**settings).invoke(f"question {i}")),
+        ("chat, registry", lambda i: chat_model(**settings).invoke(f"question {i}")),
+        ("embeddings, per call", lambda i: OpenAIEmbeddings(**embedding_settings).embed_query(f"per call {i}")),
+        ("embeddings, registry", lambda i: embeddings(**embedding_settings).embed_query(f"registry {i}")),
+    ]
+    for name, call in scenarios:
+        latencies, connections = run(server, args.requests, args.concurrency, call)
+        report(name, latencies, connections, args.requests)
+
+    llm = chat_model(**settings)
+    per_round = max(1, args.requests // args.async_rounds)
+
+    async def round_trip(i):
+        start = time.perf_counter()
+        await llm.ainvoke(f"async question {i}")
+        return time.perf_counter() - start
+
+    async def one_round(offset):
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def limited(i):
+            async with semaphore:
+                return await round_trip(i)
+
+        return await asyncio.gather(*(limited(offset + i) for i in range(per_round)))
+
+    connections = server.connections
+    latencies = []
+    for r in range(args.async_rounds):
+        latencies += asyncio.run(one_round(r * per_round))
+    report("chat, registry async", np.array(latencies) * 1000, server.connections - connections,
+           per_round * args.async_rounds)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Request coalescing: a flash-sale burst of the same question, with and without single-flight.
+
+--burst copies of one question (varying only in case, spacing and the
+trailing question mark) are sent at once, from threads (``invoke`` and
+``stream``) and on one event loop (``ainvoke`` and ``astream``), to the
+chain built by generation() over a local index with fake vectors and a
+stub LLM that replies after --llm-latency. The semantic cache is off, so
+every answer comes from the chain. For each mode it reports latency, the
+LLM calls made and the coalescing counters exported at /metrics.
+
+Usage:
+    python benchmarks/bench_coalescing.py --burst 50 --llm-latency 0.5
+"""
+
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from common import SlowFakeEmbeddings, StubChatModel, review_store
+from ecommbot.coalescing import COALESCE_LLM_CALLS_SAVED, COALESCED_REQUESTS
+from ecommbot.retrieval_generation import generation
+
+QUESTION = "can you tell me the best bluetooth buds?"
+
+
+def variants(n):
+    forms = [QUESTION, QUESTION.upper(), f"  {QUESTION[:-1]}", QUESTION.replace(" ", "  ")]
+    return [forms[i % len(forms)] for i in range(n)]
+
+
+def threaded(chain, questions, streaming):
+    def ask(question):
+        start = time.perf_counter()
+        if streaming:
+            answer = "".join(chain.stream(question))
+        else:
+            answer = chain.invoke(question)
+        return time.perf_counter() - start, answer
+
+    with ThreadPoolExecutor(max_workers=len(questions)) as pool:
+        return list(pool.map(ask, questions))
+
+
+def asynchronous(chain, questions, streaming):
+    async def ask(question):
+        start = time.perf_counter()
+        if streaming:
+            answer = "".join([chunk async for chunk in chain.astream(question)])
+        else:
+            answer = await chain.ainvoke(question)
+        return time.perf_counter() - start, answer
+
+    async def burst():
+        return await asyncio.gather(*(ask(question) for question in questions))
+
+    return asyncio.run(burst())
+
+
+MODES = {
+    "invoke": lambda chain, questions: threaded(chain, questions, streaming=False),
+    "stream": lambda chain, questions: threaded(chain, questions, streaming=True),
+    "ainvoke": lambda chain, questions: asynchronous(chain, questions, streaming=False),
+    "astream": lambda chain, questions: asynchronous(chain, questions, streaming=True),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--burst", type=int, default=50, help="identical questions sent at once")
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--embedding-latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    store = review_store(SlowFakeEmbeddings(size=64, latency=args.embedding_latency))
+    questions = variants(args.burst)
+    print(f"{args.burst} identical questions at once, stub LLM latency {args.llm_latency * 1000:.0f} ms")
+    for mode, send in MODES.items():
+        for coalesce in (False, True):
+            llm = StubChatModel(latency=args.llm_latency)
+            chain = generation(store, llm=llm, semantic_cache=False, trace_sample_rate=0.0, coalesce=coalesce)
+            coalesced, saved = COALESCED_REQUESTS.value, COALESCE_LLM_CALLS_SAVED.value
+            results = send(chain, questions)
+            latencies = np.array([latency for latency, _ in results]) * 1000
+            assert len({answer for _, answer in results}) == 1
+            p50, p95 = np.percentile(latencies, [50, 95])
+            print(f"  {mode:<8} {'single-flight' if coalesce else 'off':<14} p50 {p50:7.1f} ms  p95 {p95:7.1f} ms  "
+                  f"LLM calls {llm.calls:3d}  coalesced {COALESCED_REQUESTS.value - coalesced:3.0f}  "
+                  f"LLM calls saved {COALESCE_LLM_CALLS_SAVED.value - saved:3.0f}")
+
+
+if __name__ == "__main__":
+    main()
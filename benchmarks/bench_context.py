@@ -0,0 +1,89 @@
+"""
+Prompt size and end-to-end latency: raw Document context versus the packed context.
+
+Questions come from the synthetic testset. The "raw" chain puts the retrieved
+Documents straight into PRODUCT_BOT_TEMPLATE, as generation() used to; the
+"packed" chain is generation() with its context-assembly stage. Both use the
+same retriever over a local index of fake vectors. Prompt tokens are counted
+with the tiktoken encoding from ecommbot.context. By default the LLM is a stub
+whose time to first token grows with the prompt length (--prompt-token-latency);
+--live sends the prompts to ChatOpenAI instead.
+
+Usage:
+    python benchmarks/bench_context.py --corpus synthetic --budget 300
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableParallel, RunnablePassthrough
+
+from common import ROOT_DIR, SlowFakeEmbeddings, StubChatModel, load_questions, review_store
+from ecommbot.context import count_tokens
+from ecommbot.retrieval_generation import PRODUCT_BOT_TEMPLATE, build_retriever, context_assembler, generation
+
+CORPORA = {
+    "flipkart": {},
+    "synthetic": {"data_path": os.path.join(ROOT_DIR, "data", "product_reviews.csv"),
+                  "content_column": "review_text", "metadata_columns": {"product_name": "product"}},
+}
+
+
+def measure(chain, prompt_inputs, prompt, questions, repeat):
+    tokens = [count_tokens(prompt.format(**prompt_inputs.invoke(q))) for q in questions]
+    latencies = []
+    for _ in range(repeat):
+        for question in questions:
+            start = time.perf_counter()
+            chain.invoke(question)
+            latencies.append((time.perf_counter() - start) * 1000)
+    return np.mean(tokens), np.max(tokens), np.percentile(latencies, 50), np.percentile(latencies, 95)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", choices=sorted(CORPORA), default="synthetic")
+    parser.add_argument("--mode", default="vector", help="retrieval mode passed to build_retriever")
+    parser.add_argument("--budget", type=int, default=600, help="context token budget")
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--prompt-token-latency", type=float, default=0.0005,
+                        help="stub prefill cost per prompt token, in seconds")
+    parser.add_argument("--live", action="store_true", help="use ChatOpenAI instead of the stub")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    store = review_store(SlowFakeEmbeddings(size=256, latency=0.0), **CORPORA[args.corpus])
+    if args.live:
+        from ecommbot.clients import chat_model
+        llm = chat_model()
+    else:
+        llm = StubChatModel(latency=args.llm_latency, prompt_token_latency=args.prompt_token_latency)
+    questions = load_questions()
+    prompt = ChatPromptTemplate.from_template(PRODUCT_BOT_TEMPLATE)
+    retriever = build_retriever(store, k=3, mode=args.mode)
+
+    raw_inputs = RunnableParallel(context=retriever, question=RunnablePassthrough())
+    raw_chain = raw_inputs | prompt | llm | StrOutputParser()
+    packed_inputs = RunnableParallel(docs=retriever, question=RunnablePassthrough()) | context_assembler(args.budget)
+    packed_chain = generation(store, llm=llm, semantic_cache=False, trace_sample_rate=0,
+                              context_max_tokens=args.budget)
+
+    print(f"{len(questions)} questions x {args.repeat}, corpus {args.corpus}, mode {args.mode}, "
+          f"budget {args.budget} tokens, {'ChatOpenAI' if args.live else 'stub LLM'}")
+    results = {}
+    for name, chain, inputs in (("raw", raw_chain, raw_inputs), ("packed", packed_chain, packed_inputs)):
+        results[name] = measure(chain, inputs, prompt, questions, args.repeat)
+        mean_tokens, max_tokens, p50, p95 = results[name]
+        print(f"  {name:<7} prompt tokens mean {mean_tokens:7.1f} max {max_tokens:5.0f}   "
+              f"latency p50 {p50:7.1f} ms p95 {p95:7.1f} ms")
+    tokens = results["packed"][0] / results["raw"][0] - 1
+    latency = results["packed"][2] / results["raw"][2] - 1
+    print(f"  prompt tokens {tokens:+.0%}, p50 latency {latency:+.0%}")
+
+
+if __name__ == "__main__":
+    main()
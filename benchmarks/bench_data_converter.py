@@ -0,0 +1,96 @@
+"""
+Benchmark the streaming review converter against the original iterrows implementation.
+
+Each mode runs in a fresh subprocess so peak RSS is measured independently.
+
+Usage:
+    python benchmarks/bench_data_converter.py --rows 500000 --batch-size 1000
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+from langchain_core.documents import Document
+
+from ecommbot.data_converter import DEFAULT_DATA_PATH, iter_document_batches
+
+
+def legacy_dataconveter(path):
+    """The original converter: full read_csv, iterrows, two intermediate lists."""
+    product_data = pd.read_csv(path)
+    data = product_data[["product_title", "review"]]
+    product_list = []
+    for index, row in data.iterrows():
+        product_list.append({'product_name': row['product_title'], 'review': row['review']})
+    docs = []
+    for entry in product_list:
+        docs.append(Document(page_content=entry['review'], metadata={"product_name": entry['product_name']}))
+    return docs
+
+
+def build_csv(rows, path):
+    """Replicate the bundled Flipkart sample until it has ``rows`` rows."""
+    sample = pd.read_csv(DEFAULT_DATA_PATH)
+    repeats = -(-rows // len(sample))
+    pd.concat([sample] * repeats, ignore_index=True).iloc[:rows].to_csv(path, index=False)
+
+
+def peak_rss_mb():
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_mode(mode, path, batch_size):
+    start = time.perf_counter()
+    if mode == "legacy":
+        count = len(legacy_dataconveter(path))
+    else:
+        count = 0
+        for batch in iter_document_batches(path, batch_size=batch_size):
+            count += len(batch)
+    elapsed = time.perf_counter() - start
+    print(json.dumps({
+        "mode": mode,
+        "rows": count,
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": round(count / elapsed),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--mode", choices=["legacy", "streaming"], help=argparse.SUPPRESS)
+    parser.add_argument("--csv", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args.csv, args.batch_size)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "reviews.csv")
+        build_csv(args.rows, csv_path)
+        print(f"Benchmarking {args.rows} rows (batch size {args.batch_size})")
+        for mode in ("legacy", "streaming"):
+            out = subprocess.run(
+                [sys.executable, __file__, "--mode", mode, "--csv", csv_path,
+                 "--batch-size", str(args.batch_size)],
+                check=True, capture_output=True, text=True,
+            )
+            result = json.loads(out.stdout.strip().splitlines()[-1])
+            print(f"  {mode:<10} {result['rows_per_sec']:>10,} rows/sec   "
+                  f"peak RSS {result['peak_rss_mb']:>8.1f} MB   ({result['seconds']}s)")
+
+
+if __name__ == "__main__":
+    main()
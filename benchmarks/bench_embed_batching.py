@@ -0,0 +1,137 @@
+"""
+Micro-batched query embedding: throughput and latency under synthetic load.
+
+--clients concurrent clients each embed distinct questions back to back,
+from threads (``embed_query``) or on one event loop (``aembed_query``). The
+backend is a fake embeddings API taking --latency per call plus
+--per-text-latency per text, which serves at most --backend-concurrency
+calls at a time (the HTTP pool or rate limit in front of a real API).
+Questions are embedded one call each, then through MicroBatchEmbeddings
+at every --max-wait-ms value. A single client run shows what the adaptive
+wait costs at low traffic.
+
+Usage:
+    python benchmarks/bench_embed_batching.py --clients 64 --queries 2000 --max-wait-ms 2,5,10
+"""
+
+import argparse
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from pydantic import PrivateAttr
+
+from common import SlowFakeEmbeddings
+from ecommbot.embedding_batcher import MicroBatchEmbeddings
+
+
+class LimitedEmbeddings(SlowFakeEmbeddings):
+    """Fake embeddings API that serves at most ``concurrency`` calls at a time."""
+
+    concurrency: int = 4
+    _slots: threading.BoundedSemaphore = PrivateAttr()
+    _async_slots: dict = PrivateAttr(default_factory=dict)
+
+    def model_post_init(self, context):
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+
+    def embed_documents(self, texts):
+        with self._slots:
+            return super().embed_documents(texts)
+
+    def embed_query(self, text):
+        with self._slots:
+            return super().embed_query(text)
+
+    def _loop_slots(self):
+        loop = asyncio.get_running_loop()
+        if loop not in self._async_slots:
+            self._async_slots = {loop: asyncio.Semaphore(self.concurrency)}
+        return self._async_slots[loop]
+
+    async def aembed_documents(self, texts):
+        async with self._loop_slots():
+            return await super().aembed_documents(texts)
+
+    async def aembed_query(self, text):
+        async with self._loop_slots():
+            return await super().aembed_query(text)
+
+
+def threaded(embedder, questions, clients):
+    def ask(question):
+        start = time.perf_counter()
+        embedder.embed_query(question)
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        return list(pool.map(ask, questions))
+
+
+def asynchronous(embedder, questions, clients):
+    async def run():
+        slots = asyncio.Semaphore(clients)
+
+        async def ask(question):
+            async with slots:
+                start = time.perf_counter()
+                await embedder.aembed_query(question)
+                return time.perf_counter() - start
+
+        return await asyncio.gather(*(ask(question) for question in questions))
+
+    return asyncio.run(run())
+
+
+def measure(name, embedder, backend, questions, clients, mode):
+    calls = backend.calls
+    start = time.perf_counter()
+    latencies = np.array((threaded if mode == "threads" else asynchronous)(embedder, questions, clients)) * 1000
+    elapsed = time.perf_counter() - start
+    calls = backend.calls - calls
+    p50, p95 = np.percentile(latencies, [50, 95])
+    print(f"  {name:<22} {len(questions) / elapsed:8.1f} queries/s  p50 {p50:7.1f} ms  p95 {p95:7.1f} ms  "
+          f"{calls:5d} API calls ({len(questions) / max(calls, 1):5.1f} per call)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--mode", choices=["threads", "asyncio"], default="threads")
+    parser.add_argument("--latency", type=float, default=0.05, help="embeddings API time per call, in seconds")
+    parser.add_argument("--per-text-latency", type=float, default=0.0002)
+    parser.add_argument("--backend-concurrency", type=int, default=4)
+    parser.add_argument("--max-batch-size", type=int, default=64)
+    parser.add_argument("--max-wait-ms", default="2,5,10")
+    args = parser.parse_args()
+
+    def backend():
+        return LimitedEmbeddings(size=64, latency=args.latency, per_text_latency=args.per_text_latency,
+                                 concurrency=args.backend_concurrency)
+
+    def batcher(api, max_wait_ms):
+        return MicroBatchEmbeddings(api, max_batch_size=args.max_batch_size, max_wait=max_wait_ms / 1000)
+
+    questions = [f"question {i} about bluetooth earbuds" for i in range(args.queries)]
+    waits = [float(wait) for wait in args.max_wait_ms.split(",")]
+    print(f"{args.queries} questions from {args.clients} {args.mode} clients; API {args.latency * 1000:.0f} ms "
+          f"per call, {args.backend_concurrency} calls at a time")
+    api = backend()
+    measure("one call per query", api, api, questions, args.clients, args.mode)
+    for wait in waits:
+        api = backend()
+        measure(f"batched, wait {wait:g} ms", batcher(api, wait), api, questions, args.clients, args.mode)
+
+    sample = questions[:max(20, args.queries // 50)]
+    print(f"single client, {len(sample)} questions:")
+    api = backend()
+    measure("one call per query", api, api, sample, 1, args.mode)
+    api = backend()
+    measure(f"batched, wait {max(waits):g} ms", batcher(api, max(waits)), api, sample, 1, args.mode)
+
+
+if __name__ == "__main__":
+    main()
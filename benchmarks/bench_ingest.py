@@ -0,0 +1,59 @@
+"""
+Offline throughput benchmark for the batched ingestion pipeline.
+
+Runs BatchIngestor against an InMemoryVectorStore with fake embeddings that
+simulate API latency, for several batch sizes and worker counts.
+
+Usage:
+    python benchmarks/bench_ingest.py --docs 5000 --latency 0.2
+"""
+
+import argparse
+import itertools
+
+from langchain_core.vectorstores import InMemoryVectorStore
+
+from common import SlowFakeEmbeddings
+from ecommbot.data_converter import iter_document_batches
+from ecommbot.ingest_pipeline import BatchIngestor
+
+
+def corpus(n_docs):
+    """Cycle the bundled reviews until ``n_docs`` documents are produced."""
+    docs = itertools.chain.from_iterable(itertools.repeat(
+        [doc for batch in iter_document_batches() for doc in batch]))
+    batch = []
+    for doc in itertools.islice(docs, n_docs):
+        batch.append(doc)
+        if len(batch) == 1000:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=5000)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per embedding call")
+    parser.add_argument("--batch-sizes", default="64,256")
+    parser.add_argument("--workers", default="1,4,8")
+    args = parser.parse_args()
+
+    print(f"Ingesting {args.docs} docs, {args.latency}s per embedding call")
+    for batch_size in map(int, args.batch_sizes.split(",")):
+        for workers in map(int, args.workers.split(",")):
+            embedding = SlowFakeEmbeddings(size=256, latency=args.latency)
+            ingestor = BatchIngestor(
+                InMemoryVectorStore(embedding),
+                batch_size=batch_size,
+                max_workers=workers,
+                report_every=float("inf"),
+            )
+            stats = ingestor.run(corpus(args.docs))
+            print(f"  batch={batch_size:<5} workers={workers:<3} "
+                  f"{stats.docs_per_sec:>10.1f} docs/sec  ({embedding.calls} embedding calls)")
+
+
+if __name__ == "__main__":
+    main()
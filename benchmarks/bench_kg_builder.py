@@ -0,0 +1,139 @@
+"""
+Knowledge-graph document building: per-product / per-category DataFrame scans versus one aggregation pass.
+
+"legacy" rebuilds the documents the way DocumentProcessor used to: it
+iterates over a groupby for the product documents and filters the whole
+DataFrame with a boolean mask for each category document. "aggregated" is
+the current DocumentProcessor, which computes every product and category
+statistic once in ProductAggregates.from_dataframe and writes the nodes from
+the results. Both run on a synthetic catalogue with --reviews reviews per
+product, and their page contents are checked to be identical. Legacy runs
+are skipped above --legacy-max products.
+
+Usage:
+    python benchmarks/bench_kg_builder.py --products 1000,10000,100000
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from common import ROOT_DIR
+
+sys.path.insert(0, os.path.join(ROOT_DIR, "data-generator"))
+
+from document_processor import DocumentProcessor  # noqa: E402
+from ragas.testset.graph import KnowledgeGraph, Node, NodeType  # noqa: E402
+
+FEATURES = np.array(["battery life", "camera", "display", "sound quality", "build quality", "charging speed",
+                     "design", "price", "connectivity", "comfort"])
+SENTIMENTS = np.array(["positive", "neutral", "negative"])
+
+
+def synthetic_catalogue(n_products, reviews=5, n_categories=50, seed=0):
+    """Reviews table with the columns of data/product_reviews.csv."""
+    rng = np.random.default_rng(seed)
+    n = n_products * reviews
+    products = rng.integers(0, n_products, n)
+    return pd.DataFrame({
+        "review_id": [f"REV{i}" for i in range(n)],
+        "product": [f"Product {i}" for i in products],
+        "category": [f"Category {i % n_categories}" for i in products],
+        "rating": rng.integers(1, 6, n),
+        "review_text": [f"Review {i}: works as described." for i in range(n)],
+        "feature_mentioned": FEATURES[rng.integers(0, len(FEATURES), n)],
+        "attribute_mentioned": FEATURES[rng.integers(0, len(FEATURES), n)],
+        "sentiment": SENTIMENTS[rng.integers(0, len(SENTIMENTS), n)],
+    })
+
+
+def legacy_build(df, unique_categories):
+    """Product and category documents built with a groupby loop and a mask per category."""
+    kg = KnowledgeGraph()
+    for product_name, product_reviews in df.groupby('product'):
+        category = product_reviews.iloc[0]['category']
+        all_reviews = product_reviews['review_text'].tolist()
+        all_features = product_reviews['feature_mentioned'].unique().tolist()
+        all_attributes = product_reviews['attribute_mentioned'].unique().tolist()
+        avg_rating = product_reviews['rating'].mean()
+        doc_content = f"""Product: {product_name}
+                                Category: {category}
+                                Average Rating: {avg_rating:.1f}/5
+                                Total Reviews: {len(product_reviews)}
+
+                                Key Features: {', '.join(all_features)}
+                                Key Attributes: {', '.join(all_attributes)}
+
+                                Customer Reviews:
+                                {chr(10).join([f"- {review}" for review in all_reviews[:5]])}
+
+                                Product Summary:
+                                This {category.lower()} product has received {len(product_reviews)} reviews with an average rating of {avg_rating:.1f} stars. 
+                                Customers frequently mention features like {', '.join(all_features[:3])} and appreciate attributes such as {', '.join(all_attributes[:3])}.
+                                """
+        kg.nodes.append(Node(type=NodeType.DOCUMENT, properties={
+            "page_content": doc_content,
+            "document_metadata": {"product": product_name, "category": category, "rating": avg_rating,
+                                  "review_count": len(product_reviews), "features": all_features,
+                                  "attributes": all_attributes}}))
+    for category in unique_categories:
+        category_products = df[df['category'] == category]
+        category_features = category_products['feature_mentioned'].unique().tolist()
+        category_content = f"""Category Overview: {category}
+                    Available Products: {', '.join(category_products['product'].unique())}
+                    Common Features: {', '.join(category_features)}
+                    Average Category Rating: {category_products['rating'].mean():.1f}/5
+
+                    {category} products in our catalog offer various features and capabilities to meet different customer needs.
+                    Popular features in this category include {', '.join(category_features[:5])}.
+                    """
+        kg.nodes.append(Node(type=NodeType.DOCUMENT, properties={
+            "page_content": category_content,
+            "document_metadata": {"type": "category_overview", "category": category,
+                                  "product_count": len(category_products['product'].unique()),
+                                  "features": category_features}}))
+    return kg
+
+
+def aggregated_build(df, unique_products, unique_categories):
+    processor = DocumentProcessor(df, unique_products, unique_categories)
+    return processor.build_knowledge_graph()
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", default="1000,10000,100000", help="comma-separated catalogue sizes")
+    parser.add_argument("--reviews", type=int, default=5, help="reviews per product")
+    parser.add_argument("--categories", type=int, default=50)
+    parser.add_argument("--legacy-max", type=int, default=10000)
+    args = parser.parse_args()
+
+    for n_products in (int(n) for n in args.products.split(",")):
+        df = synthetic_catalogue(n_products, args.reviews, args.categories)
+        unique_products = df['product'].unique().tolist()
+        unique_categories = df['category'].unique().tolist()
+        kg, aggregated = timed(aggregated_build, df, unique_products, unique_categories)
+        line = f"  {n_products:>7} products, {len(df):>7} reviews: aggregated {aggregated:7.2f} s"
+        if n_products <= args.legacy_max:
+            legacy_kg, legacy = timed(legacy_build, df, unique_categories)
+            same = ([node.properties["page_content"] for node in kg.nodes]
+                    == [node.properties["page_content"] for node in legacy_kg.nodes])
+            line += f"   legacy {legacy:7.2f} s   {legacy / aggregated:5.1f}x   identical: {same}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Latency benchmark for exact k=3 search in the local NumPy vector store.
+
+Random unit vectors stand in for review embeddings. Note the memory cost:
+1M vectors at 1536 dimensions is about 6 GB of float32.
+
+Usage:
+    python benchmarks/bench_local_search.py --sizes 10000,100000,1000000 --dim 1536
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from ecommbot.local_vectorstore import LocalVectorStore
+
+
+def build_store(n, dim, n_products, rng, chunk=50_000):
+    store = LocalVectorStore(embedding=None, capacity=n)
+    for start in range(0, n, chunk):
+        rows = min(chunk, n - start)
+        vectors = rng.standard_normal((rows, dim), dtype=np.float32)
+        store.add_embeddings(
+            zip([""] * rows, vectors),
+            metadatas=[{"product_name": f"product-{(start + i) % n_products}"} for i in range(rows)],
+            ids=[str(start + i) for i in range(rows)],
+        )
+    return store
+
+
+def measure(search, queries):
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        search(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+    print(f"k={args.k}, dim={args.dim}, {args.queries} queries; latencies in ms (p50 / p99)")
+    for n in map(int, args.sizes.split(",")):
+        store = build_store(n, args.dim, args.products, rng)
+        p50, p99 = measure(lambda q: store.similarity_search_by_vector(q, k=args.k), queries)
+        fp50, fp99 = measure(lambda q: store.similarity_search_by_vector(
+            q, k=args.k, filter={"product_name": "product-7"}), queries)
+        print(f"  n={n:>9,}   unfiltered {p50:8.3f} / {p99:8.3f}   "
+              f"product_name filter {fp50:8.3f} / {fp99:8.3f}")
+        del store
+
+
+if __name__ == "__main__":
+    main()
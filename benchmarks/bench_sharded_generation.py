@@ -0,0 +1,108 @@
+"""
+Sharded testset generation: throughput, retries and checkpoint reuse, offline.
+
+The knowledge graph is built from data/product_reviews.csv without the LLM
+transforms. The shard generator is a stub: it sleeps --query-latency per
+query (a stand-in for the LLM round trips of one Ragas query), writes a
+query about a random document of its shard, and fails a whole shard
+attempt with probability --failure-rate. The script first generates the
+testset as a single shard in one worker, then with --shards shards on
+--workers processes. It then reruns the sharded plan to show that completed
+shards are reused from their checkpoints. Each worker process pays a few
+seconds of imports (Ragas, LangChain) once, so the speedup needs enough
+queries per worker and enough CPU cores for the workers to start in parallel.
+
+Usage:
+    python benchmarks/bench_sharded_generation.py --testset-size 1000 --shards 16 --workers 4
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from common import ROOT_DIR
+
+sys.path.insert(0, os.path.join(ROOT_DIR, "data-generator"))
+
+from document_processor import DocumentProcessor  # noqa: E402
+from sharded_generation import generate_sharded, iter_shard_rows  # noqa: E402
+
+
+class StubShardGenerator:
+    """Shard generator that fabricates queries from the shard's documents after a fixed delay."""
+
+    def __init__(self, query_latency=0.05, failure_rate=0.0):
+        self.query_latency = query_latency
+        self.failure_rate = failure_rate
+
+    def generate(self, kg, testset_size, seed):
+        rng = random.Random(f"{seed}-{os.getpid()}-{time.time()}")
+        if rng.random() < self.failure_rate:
+            raise RuntimeError("stub generation failure")
+        for i in range(testset_size):
+            time.sleep(self.query_latency)
+            node = kg.nodes[rng.randrange(len(kg.nodes))]
+            title = node.properties["page_content"].strip().splitlines()[0]
+            yield {"user_input": f"What do customers say about {title}? (#{seed}-{i})",
+                   "reference_contexts": [node.properties["page_content"]],
+                   "reference": title, "synthesizer_name": "stub"}
+
+
+def build_graph():
+    df = pd.read_csv(os.path.join(ROOT_DIR, "data", "product_reviews.csv"))
+    processor = DocumentProcessor(df, df["product"].unique().tolist(), df["category"].unique().tolist())
+    with contextlib.redirect_stdout(io.StringIO()):
+        return processor.build_knowledge_graph()
+
+
+def run(kg, args, work_dir, shards, workers, failure_rate):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()) as log:
+        paths, failed = generate_sharded(
+            kg, args.testset_size, work_dir, shards, workers,
+            generator_spec="bench_sharded_generation:StubShardGenerator",
+            generator_kwargs={"query_latency": args.query_latency, "failure_rate": failure_rate},
+            max_attempts=args.max_attempts)
+    elapsed = time.perf_counter() - start
+    rows = sum(len(chunk) for chunk in iter_shard_rows(paths))
+    retries = log.getvalue().count("retrying")
+    return elapsed, rows, retries, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--testset-size", type=int, default=1000)
+    parser.add_argument("--shards", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--query-latency", type=float, default=0.05)
+    parser.add_argument("--failure-rate", type=float, default=0.2)
+    parser.add_argument("--max-attempts", type=int, default=5)
+    args = parser.parse_args()
+
+    kg = build_graph()
+    work_root = tempfile.mkdtemp(prefix="testset_shards_")
+    print(f"{args.testset_size} queries from {len(kg.nodes)} documents, "
+          f"stub latency {args.query_latency * 1000:.0f} ms/query")
+    try:
+        for name, work_dir, shards, workers, failure_rate in (
+                ("1 shard", os.path.join(work_root, "single"), 1, 1, 0.0),
+                (f"{args.shards} shards", os.path.join(work_root, "sharded"), args.shards, args.workers,
+                 args.failure_rate),
+                ("rerun", os.path.join(work_root, "sharded"), args.shards, args.workers, args.failure_rate)):
+            elapsed, rows, retries, failed = run(kg, args, work_dir, shards, workers, failure_rate)
+            print(f"  {name:<10} {elapsed:7.2f} s   {rows} queries   {retries} shard retries   "
+                  f"failed shards: {failed or 'none'}")
+    finally:
+        shutil.rmtree(work_root)
+
+
+if __name__ == "__main__":
+    main()
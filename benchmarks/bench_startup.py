@@ -0,0 +1,155 @@
+"""
+App start-up time: import cost (from ``python -X importtime``) and time until a worker can answer.
+
+"imports" parses the -X importtime log of a fresh interpreter importing
+app.py, and of one importing what app.py used to import at module level
+(retrieval_generation, ingest and server, with LangChain OpenAI, Astra,
+pandas and scikit-learn at their top level). It prints the total and the
+slowest modules by cumulative time.
+
+"workers" starts --workers worker processes the way each APP_INIT mode
+does and reports the time from process start until each worker's chain is
+built: "lazy" and "eager" import and build everything in every worker
+(lazy at the first request, eager at import), "prefork" preloads once in
+a parent process and forks the workers, which then only build their
+clients. Everything runs offline on a local index of
+data/flipkart_product_review.csv with fake vectors, in a temporary
+directory; the OpenAI clients are created but never called.
+
+Usage:
+    python benchmarks/bench_startup.py --workers 4 --top 15
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from common import ROOT_DIR, TESTSET_PATH, review_store
+from ecommbot.bm25_index import BM25Index
+from ecommbot.data_converter import iter_document_batches
+from ecommbot.ingest import METADATA_COLUMNS
+from ecommbot.product_aggregates import FLIPKART_COLUMNS, ProductAggregates
+
+# What importing app.py used to pull in: the chain modules and, at their top level, these libraries
+EAGER_IMPORTS = ("import ecommbot.retrieval_generation, ecommbot.ingest, ecommbot.server, langchain_openai, "
+                 "langchain_astradb, pandas, sklearn.feature_extraction.text, sklearn.linear_model, "
+                 "sklearn.pipeline")
+
+# Run in a fresh interpreter per mode; prints one JSON line per worker
+WORKER_SCRIPT = """
+import json, os, sys, time
+start = time.perf_counter()
+mode, workers = os.environ["APP_INIT"], int(sys.argv[1])
+
+def ready():
+    from ecommbot.startup import chain
+    chain.warmup()
+    return time.perf_counter() - start
+
+if mode == "prefork":
+    import app
+    preloaded = time.perf_counter() - start
+    pids = []
+    for _ in range(workers):
+        r, w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            from ecommbot.startup import warm_worker
+            fork_start = time.perf_counter()
+            warm_worker()
+            os.write(w, json.dumps([preloaded, time.perf_counter() - fork_start]).encode())
+            os._exit(0)
+        os.close(w)
+        pids.append((pid, r))
+    for pid, r in pids:
+        os.waitpid(pid, 0)
+        preloaded, built = json.loads(os.read(r, 4096))
+        print(json.dumps({"import": preloaded, "ready": preloaded + built, "worker_build": built}))
+else:
+    import app
+    imported = time.perf_counter() - start
+    print(json.dumps({"import": imported, "ready": ready(), "worker_build": None}))
+"""
+
+
+def build_fixture(work_dir):
+    """Local vector index, BM25 index and product statistics of the Flipkart reviews, as ingest would write."""
+    index_path = os.path.join(work_dir, "local_index")
+    store = review_store(DeterministicFakeEmbedding(size=1536), metadata_columns=METADATA_COLUMNS)
+    store.save(index_path)
+    bm25_path = os.path.join(work_dir, "bm25_index")
+    BM25Index.build(iter_document_batches(metadata_columns=METADATA_COLUMNS), bm25_path)
+    aggregates_path = os.path.join(work_dir, "product_aggregates.sqlite")
+    ProductAggregates.from_csv(os.path.join(ROOT_DIR, "data", "flipkart_product_review.csv"),
+                               FLIPKART_COLUMNS).save(aggregates_path)
+    return {
+        "VECTOR_BACKEND": "local",
+        "LOCAL_INDEX_PATH": index_path,
+        "BM25_INDEX_PATH": bm25_path,
+        "PRODUCT_AGGREGATES_PATH": aggregates_path,
+        "EMBEDDING_CACHE_PATH": os.path.join(work_dir, "embeddings.sqlite"),
+        "INTENT_TRAINING_PATH": TESTSET_PATH,
+        "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "sk-offline"),
+        "PYTHONPATH": os.pathsep.join(filter(None, [ROOT_DIR, os.environ.get("PYTHONPATH")])),
+    }
+
+
+def importtime(code, env):
+    """``{module: (self_us, cumulative_us)}`` from ``python -X importtime -c code``."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT_DIR, env=env,
+                            capture_output=True, text=True, check=True)
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = (int(self_us), int(cumulative))
+    return modules
+
+
+def report_imports(name, modules, top):
+    total = sum(self_us for self_us, _ in modules.values())
+    print(f"  {name:<8} {total / 1e6:6.2f} s, {len(modules)} modules; slowest (cumulative):")
+    for module, (_, cumulative) in sorted(modules.items(), key=lambda item: -item[1][1])[:top]:
+        print(f"    {cumulative / 1e3:8.1f} ms  {module}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--top", type=int, default=10, help="slowest modules to list")
+    parser.add_argument("--modes", default="lazy,eager,prefork")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench_startup_") as work_dir:
+        env = {**os.environ, **build_fixture(work_dir), "APP_INIT": "lazy"}
+        print("imports (python -X importtime):")
+        report_imports("app.py", importtime("import app", env), args.top)
+        report_imports("eager", importtime(EAGER_IMPORTS, env), args.top)
+
+        print(f"workers ready ({args.workers} workers, seconds from process start):")
+        for mode in args.modes.split(","):
+            runs = []
+            for _ in range(1 if mode == "prefork" else args.workers):
+                result = subprocess.run([sys.executable, "-c", WORKER_SCRIPT, str(args.workers)], cwd=ROOT_DIR,
+                                        env={**env, "APP_INIT": mode}, capture_output=True, text=True,
+                                        check=True)
+                runs += [json.loads(line) for line in result.stdout.splitlines()]
+            imports = max(run["import"] for run in runs)
+            ready = [run["ready"] for run in runs]
+            # Without fork, every worker does all of the work; with it, the preload is done once
+            if mode == "prefork":
+                cpu = runs[0]["import"] + sum(run["worker_build"] for run in runs)
+            else:
+                cpu = sum(ready)
+            print(f"  {mode:<8} import {imports:6.2f} s   ready max {max(ready):6.2f} s   "
+                  f"total start-up work {cpu:6.2f} s")
+
+
+if __name__ == "__main__":
+    main()
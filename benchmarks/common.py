@@ -0,0 +1,135 @@
+"""
+Offline stand-ins shared by the benchmark scripts.
+"""
+
+import asyncio
+import json
+import os
+import time
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from ecommbot.context import count_tokens
+from ecommbot.data_converter import iter_document_batches
+from ecommbot.local_vectorstore import LocalVectorStore
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TESTSET_PATH = os.path.join(ROOT_DIR, "data-generator", "ragas_synthetic_testset.json")
+
+
+def load_testset(path=TESTSET_PATH):
+    """Items of a synthetic testset written by data-generator: the .json file, or the .jsonl of a sharded run."""
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            return [json.loads(line) for line in f if line.strip()]
+        return json.load(f)["synthetic_testset"]
+
+
+def load_questions(path=TESTSET_PATH):
+    """Questions of the synthetic testset written by data-generator."""
+    return [item["query"] for item in load_testset(path)]
+
+
+class SlowFakeEmbeddings(DeterministicFakeEmbedding):
+    """Deterministic fake embeddings that sleep like a remote embedding API.
+
+    Each call costs ``latency`` seconds plus ``per_text_latency`` per input text.
+    """
+
+    latency: float = 0.05
+    per_text_latency: float = 0.0
+    calls: int = 0
+
+    def _delay(self, n_texts):
+        self.calls += 1
+        return self.latency + self.per_text_latency * n_texts
+
+    def embed_documents(self, texts):
+        time.sleep(self._delay(len(texts)))
+        return super().embed_documents(texts)
+
+    def embed_query(self, text):
+        time.sleep(self._delay(1))
+        return super().embed_query(text)
+
+    async def aembed_documents(self, texts):
+        await asyncio.sleep(self._delay(len(texts)))
+        return super().embed_documents(texts)
+
+    async def aembed_query(self, text):
+        await asyncio.sleep(self._delay(1))
+        return super().embed_query(text)
+
+
+class StubChatModel(BaseChatModel):
+    """Chat model that answers with a canned reply after a fixed delay.
+
+    ``latency`` is the time to the first token, plus ``prompt_token_latency``
+    per prompt token (prefill); the rest of the reply is streamed word by
+    word, ``token_latency`` seconds apart.
+    """
+
+    reply: str = "The BoAt Rockerz 235v2 is a good budget choice with strong bass and long battery life."
+    latency: float = 0.5
+    prompt_token_latency: float = 0.0
+    token_latency: float = 0.0
+    calls: int = 0
+
+    @property
+    def _llm_type(self):
+        return "stub-chat"
+
+    def _first_token_delay(self, messages):
+        if not self.prompt_token_latency:
+            return self.latency
+        prompt_tokens = sum(count_tokens(message.content) for message in messages)
+        return self.latency + self.prompt_token_latency * prompt_tokens
+
+    def _tokens(self):
+        words = self.reply.split(" ")
+        return [word if i == 0 else f" {word}" for i, word in enumerate(words)]
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        time.sleep(self._first_token_delay(messages) + self.token_latency * len(self._tokens()))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.reply))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self._first_token_delay(messages) + self.token_latency * len(self._tokens()))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.reply))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        time.sleep(self._first_token_delay(messages))
+        for token in self._tokens():
+            time.sleep(self.token_latency)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self._first_token_delay(messages))
+        for token in self._tokens():
+            await asyncio.sleep(self.token_latency)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+
+def review_store(embedding, data_path=None, **converter_kwargs):
+    """LocalVectorStore over the bundled reviews, embedded with fake vectors at no cost."""
+    fake = DeterministicFakeEmbedding(size=embedding.size)
+    store = LocalVectorStore(embedding)
+    batches = iter_document_batches(data_path, **converter_kwargs) if data_path else iter_document_batches()
+    for docs in batches:
+        texts = [doc.page_content for doc in docs]
+        store.add_embeddings(zip(texts, fake.embed_documents(texts)),
+                             metadatas=[doc.metadata for doc in docs])
+    return store
@@ -0,0 +1,73 @@
+"""
+Accuracy and latency of the local intent classifier against the LLM labels.
+
+The labels are the query_type values the data generator's LLM classifier
+wrote into the synthetic testset. Accuracy is measured leave-one-out: each
+labelled query is predicted by a model trained on all the others (plus the
+seed examples), so no query is scored by a model that saw it. The keyword
+fallback of QueryClassifier is reported as a baseline. Latency is for single
+queries, as the chat path calls it.
+
+Usage:
+    python benchmarks/eval_intent.py --testset data-generator/ragas_synthetic_testset.json
+"""
+
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+
+import numpy as np
+
+from common import ROOT_DIR, TESTSET_PATH
+
+sys.path.insert(0, os.path.join(ROOT_DIR, "data-generator"))
+
+from ecommbot.intent_classifier import INTENTS, IntentClassifier, load_labelled_queries  # noqa: E402
+from query_classifier import QueryClassifier  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--testset", default=TESTSET_PATH)
+    parser.add_argument("--no-seeds", action="store_true", help="train on the testset labels only")
+    parser.add_argument("--repeat", type=int, default=200, help="timed predictions per query")
+    args = parser.parse_args()
+
+    queries, labels = load_labelled_queries(args.testset)
+    if not queries:
+        sys.exit(f"no labelled queries in {args.testset}")
+    print(f"{len(queries)} labelled queries: " + ", ".join(f"{n} {intent}" for intent, n in Counter(labels).items()))
+
+    predictions = []
+    for i in range(len(queries)):
+        model = IntentClassifier.train(queries[:i] + queries[i + 1:], labels[:i] + labels[i + 1:],
+                                       seeds=not args.no_seeds)
+        predictions.append(model.predict(queries[i])[0])
+    baseline = [QueryClassifier._simple_fallback_classification(query) for query in queries]
+
+    for name, predicted in (("local model", predictions), ("keywords", baseline)):
+        correct = [p == label for p, label in zip(predicted, labels)]
+        per_intent = "  ".join(f"{intent} {np.mean([c for c, l in zip(correct, labels) if l == intent]):.0%}"
+                               for intent in INTENTS if intent in labels)
+        print(f"  {name:<12} accuracy {np.mean(correct):6.1%}   {per_intent}")
+
+    print("  confusion (rows: LLM label, columns: local model)")
+    print("    " + "".join(f"{intent:>18}" for intent in INTENTS))
+    for label in INTENTS:
+        counts = Counter(p for p, l in zip(predictions, labels) if l == label)
+        print(f"    {label:<18}" + "".join(f"{counts[intent]:>18}" for intent in INTENTS))
+
+    model = IntentClassifier.train(queries, labels, seeds=not args.no_seeds)
+    latencies = []
+    for _ in range(args.repeat):
+        for query in queries:
+            start = time.perf_counter()
+            model.predict(query)
+            latencies.append((time.perf_counter() - start) * 1e6)
+    print(f"  latency p50 {np.percentile(latencies, 50):.0f} us, p99 {np.percentile(latencies, 99):.0f} us")
+
+
+if __name__ == "__main__":
+    main()
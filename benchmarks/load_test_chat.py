@@ -0,0 +1,162 @@
+"""
+Load test for the /get chat endpoint: threaded Flask versus the ASGI app.
+
+Both servers run the real chain from generation(). The retriever sits on a
+local index whose query embedding sleeps for --retriever-latency, and the LLM
+is a stub that replies after --llm-latency. Each server runs in its own
+subprocess, and a pool of client threads posts questions with keep-alive
+connections. The Flask server gets a fixed pool of --flask-threads request
+threads, like a threaded production WSGI server.
+
+Usage:
+    python benchmarks/load_test_chat.py --requests 400 --concurrency 64 --workers 2
+"""
+
+import argparse
+import http.client
+import logging
+import os
+import subprocess
+import sys
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+
+from common import SlowFakeEmbeddings, StubChatModel, review_store  # noqa: E402
+
+QUESTIONS = [
+    "can you tell me the best bluetooth buds?",
+    "low budget sound basshead",
+    "which headset has the longest battery life?",
+    "is the realme buds q good for calls?",
+]
+
+
+def stub_chain():
+    from ecommbot.retrieval_generation import generation
+    store = review_store(SlowFakeEmbeddings(
+        size=64, latency=float(os.environ["LOADTEST_RETRIEVER_LATENCY"])))
+    llm = StubChatModel(latency=float(os.environ["LOADTEST_LLM_LATENCY"]))
+    return generation(store, llm=llm, semantic_cache=False)
+
+
+def flask_app():
+    from ecommbot.server import create_app
+    return create_app(stub_chain())
+
+
+def asgi_app():
+    from ecommbot.async_server import create_async_app
+    return create_async_app(stub_chain())
+
+
+def serve(mode, port, workers, threads):
+    if mode == "flask":
+        from werkzeug.serving import BaseWSGIServer
+
+        class PooledWSGIServer(BaseWSGIServer):
+            """Werkzeug server that handles connections on a fixed-size thread pool."""
+
+            def process_request(self, request, client_address):
+                pool.submit(self.handle_connection, request, client_address)
+
+            def handle_connection(self, request, client_address):
+                try:
+                    self.finish_request(request, client_address)
+                except Exception:
+                    self.handle_error(request, client_address)
+                finally:
+                    self.shutdown_request(request)
+
+        pool = ThreadPoolExecutor(max_workers=threads)
+        logging.getLogger("werkzeug").setLevel(logging.WARNING)
+        PooledWSGIServer("127.0.0.1", port, flask_app()).serve_forever()
+    else:
+        import uvicorn
+        uvicorn.run("load_test_chat:asgi_app", factory=True, host="127.0.0.1", port=port,
+                    workers=workers, app_dir=BENCH_DIR, log_level="warning")
+
+
+def wait_until_ready(port, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/")
+            conn.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"server on port {port} did not start")
+
+
+def load(port, n_requests, concurrency):
+    per_worker = -(-n_requests // concurrency)
+
+    def worker(worker_id):
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+        latencies = []
+        for i in range(per_worker):
+            body = urllib.parse.urlencode({"msg": QUESTIONS[(worker_id + i) % len(QUESTIONS)]})
+            start = time.perf_counter()
+            conn.request("POST", "/get", body, {"Content-Type": "application/x-www-form-urlencoded"})
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                raise RuntimeError(f"HTTP {response.status}")
+            latencies.append(time.perf_counter() - start)
+        conn.close()
+        return latencies
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = [lat for result in pool.map(worker, range(concurrency)) for lat in result]
+    elapsed = time.perf_counter() - start
+    latencies = np.array(latencies) * 1000
+    return len(latencies) / elapsed, np.percentile(latencies, [50, 95, 99])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--retriever-latency", type=float, default=0.05)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--workers", type=int, default=2, help="ASGI worker processes")
+    parser.add_argument("--flask-threads", type=int, default=8, help="Flask request threads")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--modes", default="flask,asgi")
+    parser.add_argument("--serve", choices=["flask", "asgi"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    os.environ.setdefault("LOADTEST_RETRIEVER_LATENCY", str(args.retriever_latency))
+    os.environ.setdefault("LOADTEST_LLM_LATENCY", str(args.llm_latency))
+    if args.serve:
+        serve(args.serve, args.port, args.workers, args.flask_threads)
+        return
+
+    print(f"{args.requests} requests, concurrency {args.concurrency}, "
+          f"retriever {args.retriever_latency}s, LLM {args.llm_latency}s, "
+          f"{args.flask_threads} Flask threads, {args.workers} ASGI workers")
+    for mode in args.modes.split(","):
+        server = subprocess.Popen(
+            [sys.executable, __file__, "--serve", mode, "--port", str(args.port),
+             "--workers", str(args.workers), "--flask-threads", str(args.flask_threads)],
+            env=os.environ.copy(), stdout=subprocess.DEVNULL,
+        )
+        try:
+            wait_until_ready(args.port)
+            rps, (p50, p95, p99) = load(args.port, args.requests, args.concurrency)
+            print(f"  {mode:<6} {rps:8.1f} req/s   p50 {p50:7.0f} ms   p95 {p95:7.0f} ms   p99 {p99:7.0f} ms")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+"""
+Offline RAG evaluation: replay the synthetic testset and write a report that can be compared across commits.
+
+Every testset query runs, --concurrency at a time, either through the chain
+of generation() (--target chain) or through its retriever only (--target
+retrieval). For each query the report records the latency, the prompt and
+completion tokens of the LLM call, the context tokens, and the products of
+the retrieved reviews. A query is a hit when one of them is among the
+query's related_products; recall is the share of related_products
+retrieved. Questions answered from the product statistics (no retrieval, no
+LLM call) are counted as structured and left out of the hit rate.
+
+By default everything is offline and deterministic. The corpus is
+data/product_reviews.csv, the reviews the testset was generated from,
+embedded with fake vectors. The BM25 index and product statistics are built
+from it in a temporary directory, and the LLM is a stub that replies after
+--llm-latency plus --prompt-token-latency per prompt token. Fake vectors
+carry no meaning, so the hit rate measures the product filter and the BM25
+side of retrieval; a change in it between two commits is a change in
+retrieval code. --live evaluates the ingested store with ChatOpenAI
+instead.
+
+--output writes the JSON report. --compare checks it against an earlier
+report and exits with status 1 when p50/p95 latency or mean prompt tokens
+grew by more than --max-regression, or the hit rate or recall dropped by
+more than --max-quality-drop, so a CI job can fail on it.
+
+Usage:
+    python benchmarks/run_rag_eval.py --output rag_eval.json
+    python benchmarks/run_rag_eval.py --target retrieval --mode products --compare rag_eval.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from threading import Lock
+
+import numpy as np
+from langchain_core.callbacks import BaseCallbackHandler
+
+from common import ROOT_DIR, TESTSET_PATH, SlowFakeEmbeddings, StubChatModel, load_testset, review_store
+from ecommbot.bm25_index import BM25Index
+from ecommbot.context import CONTEXT_MAX_TOKENS, assemble_context, count_tokens
+from ecommbot.data_converter import iter_document_batches
+from ecommbot.intent_classifier import IntentClassifier
+from ecommbot.product_aggregates import ProductAggregates
+from ecommbot.retrieval_generation import RETRIEVAL_MODE, build_retriever, generation
+
+CORPUS = {"data_path": os.path.join(ROOT_DIR, "data", "product_reviews.csv"),
+          "content_column": "review_text", "metadata_columns": {"product_name": "product"}}
+
+# Summary metric -> direction that counts as a regression
+LOWER_IS_BETTER = ("latency_p50_ms", "latency_p95_ms", "prompt_tokens_mean")
+HIGHER_IS_BETTER = ("hit_rate", "recall")
+
+
+class QueryRecorder(BaseCallbackHandler):
+    """Collects the retrieved documents and token counts of one query; create one per query."""
+
+    run_inline = True
+
+    def __init__(self):
+        self.docs = None
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.llm_calls = 0
+        self._lock = Lock()
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, **kwargs):
+        if kwargs.get("name") == "pack_context" and isinstance(inputs, dict):
+            self.docs = inputs.get("docs")
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+        with self._lock:
+            self.llm_calls += 1
+            self.prompt_tokens += sum(count_tokens(str(message.content)) for batch in messages for message in batch)
+
+    def on_llm_end(self, response, *, run_id, parent_run_id=None, **kwargs):
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        text = "".join(generation.text for generations in response.generations for generation in generations)
+        with self._lock:
+            self.completion_tokens += usage.get("completion_tokens") or count_tokens(text)
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def offline_setup(args, work_dir):
+    """Fake-vector store, BM25 index and product statistics over the testset's source reviews."""
+    store = review_store(SlowFakeEmbeddings(size=args.dim, latency=args.embedding_latency), **CORPUS)
+    bm25_path = os.path.join(work_dir, "bm25")
+    BM25Index.build(iter_document_batches(CORPUS["data_path"], CORPUS["content_column"],
+                                          CORPUS["metadata_columns"]), bm25_path)
+    aggregates = None
+    if not args.no_structured:
+        aggregates = ProductAggregates.from_csv(CORPUS["data_path"])
+    llm = StubChatModel(latency=args.llm_latency, prompt_token_latency=args.prompt_token_latency)
+    return store, bm25_path, aggregates, llm
+
+
+def live_setup(args):
+    from ecommbot.bm25_index import BM25_INDEX_PATH
+    from ecommbot.clients import chat_model, vector_store
+    from ecommbot.product_aggregates import PRODUCT_AGGREGATES_PATH
+    store = vector_store()
+    aggregates = None
+    if not args.no_structured and ProductAggregates.exists(PRODUCT_AGGREGATES_PATH):
+        aggregates = ProductAggregates.load(PRODUCT_AGGREGATES_PATH)
+    return store, BM25_INDEX_PATH, aggregates, chat_model()
+
+
+def build_runner(args, store, bm25_path, aggregates, llm):
+    """``run(query) -> record`` for the selected target."""
+    if args.target == "retrieval":
+        matcher = aggregates.matcher if aggregates is not None else None
+        retriever = build_retriever(store, k=3, mode=args.mode, bm25_path=bm25_path, matcher=matcher)
+
+        def run(query):
+            start = time.perf_counter()
+            docs = retriever.invoke(query)
+            latency = time.perf_counter() - start
+            context = assemble_context(docs, query, args.context_max_tokens)
+            return {"latency_ms": latency * 1000, "docs": docs, "context_tokens": count_tokens(context),
+                    "prompt_tokens": 0, "completion_tokens": 0, "llm_calls": 0}
+
+        return run
+
+    intents = None
+    if aggregates is not None and not args.no_intents:
+        intents = IntentClassifier.from_testset(TESTSET_PATH)
+    chain = generation(store, llm=llm, semantic_cache=args.semantic_cache, trace_sample_rate=0,
+                       context_max_tokens=args.context_max_tokens, aggregates=aggregates, intents=intents,
+                       retrieval_mode=args.mode, bm25_path=bm25_path)
+
+    def run(query):
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        chain.invoke(query, config={"callbacks": [recorder]})
+        latency = time.perf_counter() - start
+        context_tokens = None
+        if recorder.docs is not None:
+            context_tokens = count_tokens(assemble_context(recorder.docs, query, args.context_max_tokens))
+        return {"latency_ms": latency * 1000, "docs": recorder.docs, "context_tokens": context_tokens,
+                "prompt_tokens": recorder.prompt_tokens, "completion_tokens": recorder.completion_tokens,
+                "llm_calls": recorder.llm_calls}
+
+    return run
+
+
+def evaluate(run, items, concurrency, repeat):
+    """One record per testset item (the latency is the median over ``repeat`` runs), and the wall time."""
+    def one(item):
+        records = []
+        for _ in range(repeat):
+            try:
+                records.append(run(item["query"]))
+            except Exception as e:
+                return {"query": item["query"], "error": f"{type(e).__name__}: {e}"}
+        record = records[-1]
+        docs = record.pop("docs")
+        related = list(item.get("related_products") or [])
+        record = {"query": item["query"], "query_type": item.get("query_type"), "related_products": related,
+                  **record, "latency_ms": float(np.median([r["latency_ms"] for r in records]))}
+        if docs is None:
+            record["structured"] = True
+            return record
+        retrieved = list(dict.fromkeys(doc.metadata.get("product_name") for doc in docs))
+        record["retrieved_products"] = retrieved
+        if related:
+            found = set(retrieved) & set(related)
+            record["hit"] = bool(found)
+            record["recall"] = len(found) / len(set(related))
+        return record
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        records = list(pool.map(one, items))
+    return records, time.perf_counter() - start
+
+
+def summarize(records, elapsed, repeat):
+    ok = [r for r in records if "error" not in r]
+    latencies = np.array([r["latency_ms"] for r in ok]) if ok else np.zeros(1)
+    llm = [r for r in ok if r["llm_calls"]]
+    scored = [r for r in ok if "hit" in r]
+    contexts = [r["context_tokens"] for r in ok if r.get("context_tokens") is not None]
+    return {
+        "queries": len(records),
+        "errors": len(records) - len(ok),
+        "structured": sum(1 for r in ok if r.get("structured")),
+        "scored": len(scored),
+        "hit_rate": float(np.mean([r["hit"] for r in scored])) if scored else None,
+        "recall": float(np.mean([r["recall"] for r in scored])) if scored else None,
+        "latency_p50_ms": float(np.percentile(latencies, 50)),
+        "latency_p95_ms": float(np.percentile(latencies, 95)),
+        "latency_p99_ms": float(np.percentile(latencies, 99)),
+        "latency_mean_ms": float(latencies.mean()),
+        "queries_per_sec": len(records) * repeat / elapsed,
+        "llm_calls": sum(r["llm_calls"] for r in ok),
+        "prompt_tokens_total": sum(r["prompt_tokens"] for r in ok),
+        "prompt_tokens_mean": float(np.mean([r["prompt_tokens"] for r in llm])) if llm else 0.0,
+        "completion_tokens_total": sum(r["completion_tokens"] for r in ok),
+        "context_tokens_mean": float(np.mean(contexts)) if contexts else 0.0,
+    }
+
+
+def compare(summary, baseline, max_regression, max_quality_drop):
+    """Print each tracked metric against ``baseline``; return the names of the regressed ones."""
+    regressions = []
+    for name in LOWER_IS_BETTER + HIGHER_IS_BETTER:
+        new, old = summary.get(name), baseline.get(name)
+        if new is None or old is None:
+            continue
+        if name in LOWER_IS_BETTER:
+            change = (new - old) / old if old else 0.0
+            regressed = change > max_regression
+            delta = f"{change:+.1%}"
+        else:
+            regressed = old - new > max_quality_drop
+            delta = f"{new - old:+.3f}"
+        if regressed:
+            regressions.append(name)
+        print(f"  {name:<20} {old:10.3f} -> {new:10.3f}   {delta:>8}{'   REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--testset", default=TESTSET_PATH, help="testset .json, or .jsonl from a sharded run")
+    parser.add_argument("--target", choices=["chain", "retrieval"], default="chain")
+    parser.add_argument("--mode", default=RETRIEVAL_MODE, help="retrieval mode passed to build_retriever")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=1, help="runs per query; the median latency is kept")
+    parser.add_argument("--context-max-tokens", type=int, default=CONTEXT_MAX_TOKENS)
+    parser.add_argument("--no-structured", action="store_true", help="no product-statistics answers or filter")
+    parser.add_argument("--no-intents", action="store_true", help="no intent routing of category questions")
+    parser.add_argument("--semantic-cache", action="store_true")
+    parser.add_argument("--dim", type=int, default=256, help="fake embedding size")
+    parser.add_argument("--embedding-latency", type=float, default=0.0)
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--prompt-token-latency", type=float, default=0.0)
+    parser.add_argument("--live", action="store_true", help="ingested store and ChatOpenAI instead of stubs")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--compare", help="baseline JSON report")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="allowed relative growth of latency and prompt tokens")
+    parser.add_argument("--max-quality-drop", type=float, default=0.0,
+                        help="allowed absolute drop of hit rate and recall")
+    args = parser.parse_args()
+
+    items = load_testset(args.testset)
+    with tempfile.TemporaryDirectory(prefix="rag_eval_") as work_dir:
+        with contextlib.redirect_stdout(io.StringIO()):
+            store, bm25_path, aggregates, llm = live_setup(args) if args.live else offline_setup(args, work_dir)
+        run = build_runner(args, store, bm25_path, aggregates, llm)
+        print(f"{len(items)} queries x {args.repeat}, target {args.target}, mode {args.mode}, "
+              f"concurrency {args.concurrency}, {'live' if args.live else 'offline'}")
+        records, elapsed = evaluate(run, items, args.concurrency, args.repeat)
+
+    summary = summarize(records, elapsed, args.repeat)
+    print(f"  latency p50 {summary['latency_p50_ms']:.1f} ms  p95 {summary['latency_p95_ms']:.1f} ms  "
+          f"p99 {summary['latency_p99_ms']:.1f} ms  {summary['queries_per_sec']:.1f} queries/s")
+    quality = "n/a" if summary["hit_rate"] is None else \
+        f"{summary['hit_rate']:.3f} (recall {summary['recall']:.3f}, {summary['scored']} scored)"
+    print(f"  hit rate {quality}  structured {summary['structured']}  errors {summary['errors']}")
+    print(f"  prompt tokens mean {summary['prompt_tokens_mean']:.1f}  "
+          f"completion tokens {summary['completion_tokens_total']}  context tokens mean "
+          f"{summary['context_tokens_mean']:.1f}")
+
+    report = {
+        "revision": git_revision(),
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "summary": summary,
+        "queries": records,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"  report written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"compared with {args.compare} (revision {baseline.get('revision')}):")
+        if compare(summary, baseline["summary"], args.max_regression, args.max_quality_drop):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,16 +2,96 @@
 Document processing and knowledge graph creation for product reviews
 """
 
-from langchain.schema import Document
+import hashlib
+import json
+import os
+from dotenv import load_dotenv
+import ragas
+from ragas.run_config import RunConfig
 from ragas.testset.graph import KnowledgeGraph, Node, NodeType
 from ragas.testset.transforms import apply_transforms
 from ragas.testset.transforms import HeadlinesExtractor, HeadlineSplitter, KeyphrasesExtractor
+from ecommbot.product_aggregates import ProductAggregates
+
+load_dotenv()
+
+# Transformed per-document subgraphs, and concurrent LLM calls while transforming
+KG_CACHE_DIR = os.getenv("KG_CACHE_DIR", ".cache/kg_transforms")
+KG_TRANSFORM_MAX_WORKERS = int(os.getenv("KG_TRANSFORM_MAX_WORKERS", "16"))
+
+
+def transform_config(transforms, generator_llm):
+    """
+    JSON-serializable description of the transforms and the model behind them
+    
+    Args:
+        transforms (list): Ragas transforms, in order
+        generator_llm: The LangChain LLM wrapper for Ragas
+        
+    Returns:
+        dict: Ragas version, model name, and each transform's class and scalar settings
+    """
+    llm = getattr(generator_llm, "langchain_llm", generator_llm)
+    return {
+        "ragas": ragas.__version__,
+        "llm": getattr(llm, "model_name", None) or type(llm).__name__,
+        "transforms": [
+            [type(transform).__name__,
+             {k: v for k, v in sorted(vars(transform).items()) if isinstance(v, (str, int, float, bool))}]
+            for transform in transforms
+        ],
+    }
+
+
+def node_cache_key(node, config):
+    """Hash of a document node's content and metadata together with the transform config"""
+    payload = json.dumps(
+        {"config": config, "type": node.type.value,
+         "page_content": node.properties.get("page_content"),
+         "metadata": node.properties.get("document_metadata")},
+        sort_keys=True, default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def split_by_document(kg, root_ids):
+    """
+    Split a transformed graph into one subgraph per source document
+    
+    Args:
+        kg (KnowledgeGraph): Graph whose document nodes are ``root_ids``
+        root_ids (list): IDs of the document nodes, in order
+        
+    Returns:
+        list: KnowledgeGraph per document: the document node, the nodes reachable
+        from it (e.g. its chunks) and the relationships among them
+    """
+    children = {}
+    for rel in kg.relationships:
+        children.setdefault(rel.source.id, []).append(rel.target.id)
+    owner = {}
+    for root_id in root_ids:
+        stack = [root_id]
+        while stack:
+            node_id = stack.pop()
+            if node_id in owner:
+                continue
+            owner[node_id] = root_id
+            stack.extend(children.get(node_id, []))
+    subgraphs = {root_id: KnowledgeGraph() for root_id in root_ids}
+    for node in kg.nodes:
+        if node.id in owner:
+            subgraphs[owner[node.id]].nodes.append(node)
+    for rel in kg.relationships:
+        if rel.source.id in owner:
+            subgraphs[owner[rel.source.id]].relationships.append(rel)
+    return [subgraphs[root_id] for root_id in root_ids]
 
 
 class DocumentProcessor:
     """Handles document creation and knowledge graph construction"""
     
-    def __init__(self, products_df, unique_products, unique_categories):
+    def __init__(self, products_df, unique_products, unique_categories, aggregates=None):
         """
         Initialize the document processor
         
@@ -19,34 +99,32 @@ class DocumentProcessor:
             products_df (pd.DataFrame): Product reviews dataframe
             unique_products (list): List of unique product names
             unique_categories (list): List of unique categories
+            aggregates (ProductAggregates): Precomputed product statistics; built from products_df if omitted
         """
         self.products_df = products_df
         self.unique_products = unique_products
         self.unique_categories = unique_categories
+        self.aggregates = aggregates or ProductAggregates.from_dataframe(products_df)
         self.kg = KnowledgeGraph()
     
     def create_product_documents(self):
         """Create individual product documents from reviews"""
         print("Creating product documents for knowledge graph...")
         
-        # Group reviews by product to create comprehensive product documents
-        grouped_reviews = self.products_df.groupby('product')
-        
-        for product_name, product_reviews in grouped_reviews:
-            product_info = product_reviews.iloc[0]
-            category = product_info['category']
-            
-            # Aggregate all review data for this product
-            all_reviews = product_reviews['review_text'].tolist()
-            all_features = product_reviews['feature_mentioned'].unique().tolist()
-            all_attributes = product_reviews['attribute_mentioned'].unique().tolist()
-            avg_rating = product_reviews['rating'].mean()
+        # Per-product statistics come precomputed from the aggregate store
+        for product_name, stats in self.aggregates.products.items():
+            category = stats['category']
+            review_count = stats['review_count']
+            all_reviews = stats['sample_reviews']
+            all_features = stats['features']
+            all_attributes = stats['attributes']
+            avg_rating = stats['average_rating']
             
             # Create structured document content with all product information
             doc_content = f"""Product: {product_name}
                                 Category: {category}
                                 Average Rating: {avg_rating:.1f}/5
-                                Total Reviews: {len(product_reviews)}
+                                Total Reviews: {review_count}
 
                                 Key Features: {', '.join(all_features)}
                                 Key Attributes: {', '.join(all_attributes)}
@@ -55,30 +133,24 @@ class DocumentProcessor:
                                 {chr(10).join([f"- {review}" for review in all_reviews[:5]])}
 
                                 Product Summary:
-                                This {category.lower()} product has received {len(product_reviews)} reviews with an average rating of {avg_rating:.1f} stars. 
+                                This {category.lower()} product has received {review_count} reviews with an average rating of {avg_rating:.1f} stars. 
                                 Customers frequently mention features like {', '.join(all_features[:3])} and appreciate attributes such as {', '.join(all_attributes[:3])}.
                                 """
             
-            # Create LangChain document with metadata for enhanced context
-            doc = Document(
-                page_content=doc_content,
-                metadata={
-                    "product": product_name,
-                    "category": category,
-                    "rating": avg_rating,
-                    "review_count": len(product_reviews),
-                    "features": all_features,
-                    "attributes": all_attributes
-                }
-            )
-            
             # Add to knowledge graph as a document node
             self.kg.nodes.append(
                 Node(
                     type=NodeType.DOCUMENT,
                     properties={
-                        "page_content": doc.page_content,
-                        "document_metadata": doc.metadata
+                        "page_content": doc_content,
+                        "document_metadata": {
+                            "product": product_name,
+                            "category": category,
+                            "rating": avg_rating,
+                            "review_count": review_count,
+                            "features": all_features,
+                            "attributes": all_attributes
+                        }
                     }
                 )
             )
@@ -88,36 +160,34 @@ class DocumentProcessor:
         print("Creating category documents for knowledge graph...")
         
         for category in self.unique_categories:
-            category_products = self.products_df[self.products_df['category'] == category]
-            category_features = category_products['feature_mentioned'].unique().tolist()
+            category_stats = self.aggregates.category(category)
+            if category_stats is None:
+                # Blank or NaN categories are left out of the aggregates
+                continue
+            category_features = category_stats['features']
             
             # Category-level summary document
             category_content = f"""Category Overview: {category}
-                    Available Products: {', '.join(category_products['product'].unique())}
+                    Available Products: {', '.join(category_stats['products'])}
                     Common Features: {', '.join(category_features)}
-                    Average Category Rating: {category_products['rating'].mean():.1f}/5
+                    Average Category Rating: {category_stats['average_rating']:.1f}/5
 
                     {category} products in our catalog offer various features and capabilities to meet different customer needs.
                     Popular features in this category include {', '.join(category_features[:5])}.
                     """
             
-            category_doc = Document(
-                page_content=category_content,
-                metadata={
-                    "type": "category_overview",
-                    "category": category,
-                    "product_count": len(category_products['product'].unique()),
-                    "features": category_features
-                }
-            )
-            
             # Add category document to knowledge graph
             self.kg.nodes.append(
                 Node(
                     type=NodeType.DOCUMENT,
                     properties={
-                        "page_content": category_doc.page_content,
-                        "document_metadata": category_doc.metadata
+                        "page_content": category_content,
+                        "document_metadata": {
+                            "type": "category_overview",
+                            "category": category,
+                            "product_count": len(category_stats['products']),
+                            "features": category_features
+                        }
                     }
                 )
             )
@@ -129,12 +199,21 @@ class DocumentProcessor:
         print(f"Created {len(self.kg.nodes)} documents in knowledge graph")
         return self.kg
     
-    def apply_knowledge_graph_transforms(self, generator_llm):
+    def apply_knowledge_graph_transforms(self, generator_llm, cache_dir=KG_CACHE_DIR,
+                                         max_workers=KG_TRANSFORM_MAX_WORKERS):
         """
         Apply Ragas transforms to enhance the knowledge graph
         
+        Each document's transformed subgraph (the document node with its extracted
+        properties, its chunks and their relationships) is saved under
+        ``cache_dir``, keyed by a hash of the document and the transform
+        config. Documents seen before are loaded from there; only new or
+        changed documents go through the LLM.
+        
         Args:
             generator_llm: The LangChain LLM wrapper for Ragas
+            cache_dir (str): Directory of cached subgraphs; None disables the cache
+            max_workers (int): Maximum concurrent transform calls
         """
         print("Applying knowledge graph transformations...")
         
@@ -148,9 +227,47 @@ class DocumentProcessor:
             headline_splitter,     # Split into manageable chunks
             keyphrase_extractor    # Extract semantic keyphrases
         ]
+        extracted = [t.property_name for t in transforms if hasattr(t, "property_name")]
         
-        # Apply all transforms to enhance the knowledge graph
-        apply_transforms(self.kg, transforms=transforms)
+        config = transform_config(transforms, generator_llm)
+        documents = list(self.kg.nodes)
+        keys = [node_cache_key(node, config) for node in documents]
+        subgraphs = [None] * len(documents)
+        pending = KnowledgeGraph()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        for i, (node, key) in enumerate(zip(documents, keys)):
+            path = os.path.join(cache_dir, f"{key}.json") if cache_dir else None
+            if path and os.path.exists(path):
+                subgraphs[i] = KnowledgeGraph.load(path)
+            else:
+                pending.nodes.append(node)
+        print(f"Knowledge graph cache: {len(documents) - len(pending.nodes)} of {len(documents)} documents "
+              f"reused, transforming {len(pending.nodes)} with up to {max_workers} concurrent calls")
+        
+        if pending.nodes:
+            # Apply all transforms to the new or changed documents (Ragas shows a progress bar per transform)
+            pending_ids = [node.id for node in pending.nodes]
+            apply_transforms(pending, transforms=transforms, run_config=RunConfig(max_workers=max_workers))
+            transformed = iter(split_by_document(pending, pending_ids))
+            saved = 0
+            for i, key in enumerate(keys):
+                if subgraphs[i] is not None:
+                    continue
+                subgraph = subgraphs[i] = next(transformed)
+                # Documents whose extraction failed are left out of the cache and retried next run
+                if cache_dir and all(documents[i].get_property(name) is not None for name in extracted):
+                    path = os.path.join(cache_dir, f"{key}.json")
+                    subgraph.save(f"{path}.tmp")
+                    os.replace(f"{path}.tmp", path)
+                    saved += 1
+            if cache_dir:
+                print(f"Cached {saved} of {len(pending_ids)} transformed documents in {cache_dir}")
+        
+        self.kg = KnowledgeGraph()
+        for subgraph in subgraphs:
+            self.kg.nodes.extend(subgraph.nodes)
+            self.kg.relationships.extend(subgraph.relationships)
         print(f"Knowledge graph now has {len(self.kg.nodes)} nodes after transforms")
         
         return self.kg
@@ -164,11 +281,10 @@ class DocumentProcessor:
         sample_products = self.unique_products[:10]
         
         for product_name in sample_products:
-            product_data = self.products_df[self.products_df['product'] == product_name]
-            if not product_data.empty:
-                product_info = product_data.iloc[0]
-                category = product_info['category']
-                avg_rating = product_data['rating'].mean()
+            stats = self.aggregates.product(product_name)
+            if stats is not None:
+                category = stats['category']
+                avg_rating = stats['average_rating']
                 
                 # Create minimal but sufficient content
                 simple_content = f"""Product: {product_name}
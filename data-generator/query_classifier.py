@@ -3,16 +3,55 @@ Query classification and enhancement utilities for e-commerce synthetic data
 """
 
 import json
-from langchain_openai import ChatOpenAI
+import os
+from dotenv import load_dotenv
 from langchain.schema import HumanMessage, SystemMessage
+from ecommbot.clients import chat_model
+from ecommbot.entity_matcher import EntityMatcher
+from ecommbot.product_aggregates import ProductAggregates
+
+load_dotenv()
+
+# Concurrent classification requests, and queries classified per request
+CLASSIFY_MAX_CONCURRENCY = int(os.getenv("CLASSIFY_MAX_CONCURRENCY", "8"))
+CLASSIFY_QUERIES_PER_PROMPT = int(os.getenv("CLASSIFY_QUERIES_PER_PROMPT", "20"))
+
+VALID_TYPES = ("category_queries", "feature_queries", "product_queries")
+
+CLASSIFIER_PROMPT = """You are an expert e-commerce query classifier. Classify the following query into one of these categories:
+
+1. "category_queries" - Questions about product categories, general recommendations, or browsing multiple products
+   Examples: "What are the best laptops?", "Show me smartphones", "Which category should I choose?"
+
+2. "feature_queries" - Questions about specific product features, specifications, or capabilities
+   Examples: "How's the battery life?", "What about the camera quality?", "Is the microphone good?"
+
+3. "product_queries" - Questions about specific products, reviews, opinions, or individual product details
+   Examples: "What do people think about iPhone?", "Is this product worth it?", "Tell me about this laptop"
+
+Respond with ONLY the category name (category_queries, feature_queries, or product_queries)."""
+
+BATCH_CLASSIFIER_PROMPT = CLASSIFIER_PROMPT.replace("the following query", "each of the following queries").replace(
+    "Respond with ONLY the category name (category_queries, feature_queries, or product_queries).",
+    "Respond with ONLY a JSON array holding one category name (category_queries, feature_queries, or "
+    "product_queries) per query, in the order the queries are numbered.")
+
+
+def _normalize_query(query):
+    return " ".join(query.lower().split())
 
 
 class QueryClassifier:
-    """Handles query classification and context enhancement using LLM-based classification"""
+    """Handles query classification and context enhancement using LLM-based classification
+    
+    Classifications are memoized by normalized query text, so repeated queries
+    cost one LLM call per classifier.
+    """
     
     def __init__(self, llm=None):
         """Initialize with optional LLM for classification"""
-        self.llm = llm or ChatOpenAI(model="gpt-4o-mini", temperature=0.1)
+        self.llm = llm or chat_model(model="gpt-4o-mini", temperature=0.1)
+        self._cache = {}
     
     def classify_query_type(self, query):
         """
@@ -24,42 +63,110 @@ class QueryClassifier:
         Returns:
             str: Query type classification
         """
-        system_prompt = """You are an expert e-commerce query classifier. Classify the following query into one of these categories:
-
-1. "category_queries" - Questions about product categories, general recommendations, or browsing multiple products
-   Examples: "What are the best laptops?", "Show me smartphones", "Which category should I choose?"
-
-2. "feature_queries" - Questions about specific product features, specifications, or capabilities
-   Examples: "How's the battery life?", "What about the camera quality?", "Is the microphone good?"
-
-3. "product_queries" - Questions about specific products, reviews, opinions, or individual product details
-   Examples: "What do people think about iPhone?", "Is this product worth it?", "Tell me about this laptop"
-
-Respond with ONLY the category name (category_queries, feature_queries, or product_queries)."""
-
-        messages = [
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=f"Classify this query: '{query}'")
-        ]
+        return self.classify_queries([query], queries_per_prompt=1)[0]
+    
+    def classify_queries(self, queries, max_concurrency=None, queries_per_prompt=None):
+        """
+        Classify many queries, several per prompt and several prompts at a time
         
-        try:
-            response = self.llm(messages)
-            classification = response.content.strip().lower()
+        Queries already classified are answered from the memo. The rest are
+        sent in prompts of ``queries_per_prompt`` numbered queries through
+        ``llm.batch`` with at most ``max_concurrency`` requests in flight. Queries
+        whose prompt fails or returns an unusable answer are retried one per
+        prompt; only queries that still fail get the keyword fallback.
+        
+        Args:
+            queries (list): User queries to classify
+            max_concurrency (int): Maximum concurrent LLM requests
+            queries_per_prompt (int): Queries classified per LLM request
             
-            # Validate response
-            valid_types = ["category_queries", "feature_queries", "product_queries"]
-            if classification in valid_types:
-                return classification
-            else:
-                # Fallback to product queries if unclear
-                return "product_queries"
-                
-        except Exception as e:
-            print(f"Error in LLM classification: {e}")
-            # Simple fallback classification
-            return self._simple_fallback_classification(query)
+        Returns:
+            list: Query type classification for each query, in order
+        """
+        config = {"max_concurrency": max_concurrency or CLASSIFY_MAX_CONCURRENCY}
+        size = queries_per_prompt or CLASSIFY_QUERIES_PER_PROMPT
+        pending = self._pending(queries)
+        while pending:
+            groups = self._groups(pending, size)
+            responses = self.llm.batch([self._messages(group) for group in groups], config, return_exceptions=True)
+            pending = self._store(groups, responses)
+            if size == 1:
+                break
+            size = 1
+        return self._results(queries)
+    
+    async def aclassify_queries(self, queries, max_concurrency=None, queries_per_prompt=None):
+        """Async variant of ``classify_queries``, using ``llm.abatch``"""
+        config = {"max_concurrency": max_concurrency or CLASSIFY_MAX_CONCURRENCY}
+        size = queries_per_prompt or CLASSIFY_QUERIES_PER_PROMPT
+        pending = self._pending(queries)
+        while pending:
+            groups = self._groups(pending, size)
+            responses = await self.llm.abatch([self._messages(group) for group in groups], config,
+                                              return_exceptions=True)
+            pending = self._store(groups, responses)
+            if size == 1:
+                break
+            size = 1
+        return self._results(queries)
+    
+    def _pending(self, queries):
+        """Distinct queries (first spelling of each normalized text) that are not memoized yet"""
+        pending = {}
+        for query in queries:
+            key = _normalize_query(query)
+            if key not in self._cache:
+                pending.setdefault(key, query)
+        return list(pending.values())
     
-    def _simple_fallback_classification(self, query):
+    @staticmethod
+    def _groups(queries, size):
+        return [queries[i:i + size] for i in range(0, len(queries), size)]
+    
+    @staticmethod
+    def _messages(group):
+        if len(group) == 1:
+            return [SystemMessage(content=CLASSIFIER_PROMPT),
+                    HumanMessage(content=f"Classify this query: '{group[0]}'")]
+        numbered = "\n".join(f"{i}. {query}" for i, query in enumerate(group, 1))
+        return [SystemMessage(content=BATCH_CLASSIFIER_PROMPT),
+                HumanMessage(content=f"Classify these {len(group)} queries:\n{numbered}")]
+    
+    @staticmethod
+    def _parse(group, content):
+        """Labels for ``group`` from a response, or raise ValueError"""
+        content = content.strip().lower()
+        if len(group) == 1:
+            # Fallback to product queries if unclear
+            return [content if content in VALID_TYPES else "product_queries"]
+        labels = json.loads(content[content.index("["):content.rindex("]") + 1])
+        if not isinstance(labels, list) or len(labels) != len(group):
+            raise ValueError(f"expected {len(group)} labels, got {labels!r}")
+        return [label if label in VALID_TYPES else "product_queries" for label in labels]
+    
+    def _store(self, groups, responses):
+        """Memoize parsed labels; return the queries whose request or answer failed"""
+        failed = []
+        for group, response in zip(groups, responses):
+            try:
+                if isinstance(response, Exception):
+                    raise response
+                labels = self._parse(group, response.content)
+            except Exception as e:
+                print(f"Error in LLM classification: {e}")
+                failed.extend(group)
+                continue
+            for query, label in zip(group, labels):
+                self._cache[_normalize_query(query)] = label
+        return failed
+    
+    def _results(self, queries):
+        # Queries with no memoized label failed every round: use the keyword heuristics
+        return [self._cache.get(_normalize_query(query)) or self._simple_fallback_classification(query)
+                for query in queries]
+    
+    @staticmethod
+    def _simple_fallback_classification(query):
         """Simple fallback classification if LLM fails"""
         query_lower = query.lower()
         
@@ -75,7 +182,8 @@ Respond with ONLY the category name (category_queries, feature_queries, or produ
         return "product_queries"
     
     @staticmethod
-    def enhance_testset_with_ecommerce_context(testset_df, products_df, unique_products, unique_categories, llm=None):
+    def enhance_testset_with_ecommerce_context(testset_df, products_df, unique_products, unique_categories, llm=None,
+                                               aggregates=None):
         """
         Add e-commerce specific context to the generated testset
         
@@ -85,6 +193,7 @@ Respond with ONLY the category name (category_queries, feature_queries, or produ
             unique_products (list): List of unique product names
             unique_categories (list): List of unique categories
             llm: Optional LLM for classification
+            aggregates (ProductAggregates): Precomputed product statistics; built from products_df if omitted
             
         Returns:
             list: Enhanced testset with e-commerce context
@@ -92,7 +201,17 @@ Respond with ONLY the category name (category_queries, feature_queries, or produ
         enhanced_testset = []
         classifier = QueryClassifier(llm) if llm else QueryClassifier()
         
-        for _, row in testset_df.iterrows():
+        # Classify every query up front, batched and concurrent
+        query_types = classifier.classify_queries(testset_df['user_input'].tolist())
+        aggregates = aggregates or ProductAggregates.from_dataframe(products_df)
+        
+        # Build the name matchers once; each text is then scanned in a single pass
+        product_matcher = EntityMatcher(unique_products)
+        category_matcher = EntityMatcher(unique_categories)
+        product_rank = {product: i for i, product in enumerate(unique_products)}
+        category_rank = {category: i for i, category in enumerate(unique_categories)}
+        
+        for (_, row), query_type in zip(testset_df.iterrows(), query_types):
             query = row['user_input']
             context = row['reference_contexts'][0] if row['reference_contexts'] else ""
             
@@ -101,52 +220,43 @@ Respond with ONLY the category name (category_queries, feature_queries, or produ
             matched_category = "General"
             product_properties = {}
             
-            # Search for product mentions in query and context
-            for product in unique_products:
-                if product.lower() in context.lower() or product.lower() in query.lower():
-                    matched_products.append(product)
+            # Search for product mentions in query and context, keeping catalogue order
+            mentioned = set(product_matcher.find(context)) | set(product_matcher.find(query))
+            matched_products = sorted(mentioned, key=product_rank.get)
             
             # Determine the most relevant category
-            for category in unique_categories:
-                if category.lower() in context.lower() or category.lower() in query.lower():
-                    matched_category = category
-                    break
+            mentioned = set(category_matcher.find(context)) | set(category_matcher.find(query))
+            if mentioned:
+                matched_category = min(mentioned, key=category_rank.get)
             
             # Extract product properties for matched products
             if matched_products:
                 primary_product = matched_products[0]
-                product_data = products_df[products_df['product'] == primary_product]
-                if not product_data.empty:
+                stats = aggregates.product(primary_product)
+                if stats is not None:
                     product_properties = {
                         "product_name": primary_product,
-                        "category": product_data.iloc[0]['category'],
-                        "average_rating": product_data['rating'].mean(),
-                        "total_reviews": len(product_data),
-                        "features": product_data['feature_mentioned'].unique().tolist(),
-                        "attributes": product_data['attribute_mentioned'].unique().tolist(),
-                        "sentiment_distribution": {
-                            "positive": len(product_data[product_data['sentiment'] == 'positive']),
-                            "neutral": len(product_data[product_data['sentiment'] == 'neutral']),
-                            "negative": len(product_data[product_data['sentiment'] == 'negative'])
-                        }
+                        "category": stats['category'],
+                        "average_rating": stats['average_rating'],
+                        "total_reviews": stats['review_count'],
+                        "features": stats['features'],
+                        "attributes": stats['attributes'],
+                        "sentiment_distribution": stats['sentiment_distribution']
                     }
             
             # For category queries, get category-level properties
             elif matched_category != "General":
-                category_data = products_df[products_df['category'] == matched_category]
-                if not category_data.empty:
+                stats = aggregates.category(matched_category)
+                if stats is not None:
                     product_properties = {
                         "category": matched_category,
-                        "products_in_category": category_data['product'].unique().tolist(),
-                        "average_category_rating": category_data['rating'].mean(),
-                        "total_category_reviews": len(category_data),
-                        "common_features": category_data['feature_mentioned'].unique().tolist(),
-                        "common_attributes": category_data['attribute_mentioned'].unique().tolist()
+                        "products_in_category": stats['products'],
+                        "average_category_rating": stats['average_rating'],
+                        "total_category_reviews": stats['review_count'],
+                        "common_features": stats['features'],
+                        "common_attributes": stats['attributes']
                     }
             
-            # Use LLM-based classification
-            query_type = classifier.classify_query_type(query)
-            
             # Create enriched query object with product properties
             enhanced_query = {
                 "query": query,
@@ -3,16 +3,20 @@ Ragas-based Synthetic Data Generator for E-commerce Queries
 Generates human-like product queries using Ragas framework based on the product_reviews.csv dataset
 """
 
+import argparse
+import json
 import pandas as pd
 import os
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langchain.schema import Document
+from ecommbot.clients import chat_model, embeddings
+from ecommbot.product_aggregates import ProductAggregates
 
 # Ragas imports
 from ragas.llms import LangchainLLMWrapper
 from ragas.embeddings import LangchainEmbeddingsWrapper
 from ragas.testset.graph import KnowledgeGraph, Node, NodeType
+from ragas.run_config import RunConfig
 from ragas.testset.synthesizers.single_hop.specific import SingleHopSpecificQuerySynthesizer
 from ragas.testset import TestsetGenerator
 
@@ -21,18 +25,74 @@ from personas import EcommercePersonas
 from data_loader import DataLoader
 from document_processor import DocumentProcessor
 from query_classifier import QueryClassifier
+from sharded_generation import GENERATION_SHARDS, GENERATION_WORKERS, generate_sharded, iter_shard_rows
 
 load_dotenv()
 
+
+def build_query_distribution(llm):
+    """Query synthesizers with their share of the testset"""
+    return [
+        (
+            SingleHopSpecificQuerySynthesizer(
+                llm=llm, 
+                property_name="headlines"  # Focus on extracted headlines
+            ),
+            0.5,  # 50% of queries from headlines
+        ),
+        (
+            SingleHopSpecificQuerySynthesizer(
+                llm=llm, 
+                property_name="keyphrases"  # Focus on extracted keyphrases
+            ),
+            0.5,  # 50% of queries from keyphrases
+        ),
+    ]
+
+
+class RagasShardGenerator:
+    """Generates the queries of one knowledge-graph shard; built once per worker process"""
+    
+    def __init__(self, model="gpt-4o-mini", embedding_model="text-embedding-3-small"):
+        # Ragas changes the wrapped model's temperature per call, so it gets its own instance (on the shared pool)
+        self.llm = LangchainLLMWrapper(chat_model(shared=False, model=model, temperature=0.7))
+        self.embeddings = LangchainEmbeddingsWrapper(embeddings(model=embedding_model))
+        self.personas = EcommercePersonas.get_ragas_personas()
+    
+    def generate(self, kg, testset_size, seed):
+        """
+        Generate queries from one shard
+        
+        Args:
+            kg (KnowledgeGraph): Transformed shard of the knowledge graph
+            testset_size (int): Number of queries for this shard
+            seed (int): Random seed for this shard
+            
+        Returns:
+            list: Testset rows as dictionaries
+        """
+        generator = TestsetGenerator(
+            llm=self.llm,
+            embedding_model=self.embeddings,
+            knowledge_graph=kg,
+            persona_list=self.personas,
+        )
+        testset = generator.generate(
+            testset_size=testset_size,
+            query_distribution=build_query_distribution(self.llm),
+            run_config=RunConfig(seed=seed),
+        )
+        return testset.to_pandas().to_dict("records")
+
 class RagasSyntheticDataGenerator:
     def __init__(self):
         """Initialize the Ragas-based synthetic data generator"""
         # Initialize LLM and embeddings - core AI models for generation
-        self.generator_llm = LangchainLLMWrapper(ChatOpenAI(model="gpt-4o-mini", temperature=0.7))
-        self.generator_embeddings = LangchainEmbeddingsWrapper(OpenAIEmbeddings(model="text-embedding-3-small"))
+        self.generator_llm = LangchainLLMWrapper(chat_model(shared=False, model="gpt-4o-mini", temperature=0.7))
+        self.generator_embeddings = LangchainEmbeddingsWrapper(embeddings(model="text-embedding-3-small"))
         
         # Initialize OpenAI LLM for query classification
-        self.openai_llm = ChatOpenAI(model="gpt-4o-mini", temperature=0.1)
+        self.openai_llm = chat_model(model="gpt-4o-mini", temperature=0.1)
         
         # Initialize data pipeline using new modules
         self.data_loader = DataLoader()
@@ -44,8 +104,13 @@ class RagasSyntheticDataGenerator:
         # Load data
         self.load_product_data()
         
+        # Per-product and per-category statistics, computed once and shared by all consumers
+        self.aggregates = ProductAggregates.from_dataframe(self.products_df)
+        
         # Initialize document processor and personas
-        self.doc_processor = DocumentProcessor(self.products_df, self.unique_products, self.unique_categories)
+        self.doc_processor = DocumentProcessor(
+            self.products_df, self.unique_products, self.unique_categories, aggregates=self.aggregates
+        )
         self.personas = EcommercePersonas.get_ragas_personas()
         
         # Build knowledge graph
@@ -59,24 +124,7 @@ class RagasSyntheticDataGenerator:
     
     def setup_query_distribution(self):
         """Set up query synthesizers with distribution"""
-        query_distribution = [
-            (
-                SingleHopSpecificQuerySynthesizer(
-                    llm=self.generator_llm, 
-                    property_name="headlines"  # Focus on extracted headlines
-                ),
-                0.5,  # 50% of queries from headlines
-            ),
-            (
-                SingleHopSpecificQuerySynthesizer(
-                    llm=self.generator_llm, 
-                    property_name="keyphrases"  # Focus on extracted keyphrases
-                ),
-                0.5,  # 50% of queries from keyphrases
-            ),
-        ]
-        
-        return query_distribution
+        return build_query_distribution(self.generator_llm)
     
     def generate_synthetic_testset(self, testset_size=20):
         """Generate synthetic test set using Ragas"""
@@ -141,10 +189,46 @@ class RagasSyntheticDataGenerator:
                     print(f"All generation methods failed: {e3}")
                     return None
     
+    def generate_sharded_testset(self, testset_size, output_file="ragas_synthetic_testset.jsonl",
+                                 work_dir=".cache/testset_shards", shards=GENERATION_SHARDS,
+                                 workers=GENERATION_WORKERS, **kwargs):
+        """
+        Generate a large testset in parallel shards and stream it to a JSONL file
+        
+        Shards are checkpointed in ``work_dir``, so rerunning after a failure
+        only generates the missing shards. The shard outputs are enhanced with
+        e-commerce context a chunk at a time and appended to ``output_file``,
+        one query per line.
+        
+        Args:
+            testset_size (int): Total number of queries
+            output_file (str): JSONL output path
+            work_dir (str): Shard checkpoint directory
+            shards (int): Number of knowledge-graph shards
+            workers (int): Worker processes
+            **kwargs: Passed to ``generate_sharded`` (e.g. generator_spec, max_attempts)
+            
+        Returns:
+            tuple: (output path, number of queries written, list of failed shard indices)
+        """
+        self.kg = self.doc_processor.apply_knowledge_graph_transforms(self.generator_llm)
+        paths, failed = generate_sharded(self.kg, testset_size, work_dir, shards, workers, **kwargs)
+        
+        written = 0
+        tmp_file = f"{output_file}.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            for chunk in iter_shard_rows(paths):
+                for query in self.enhance_testset_with_ecommerce_context(pd.DataFrame(chunk)):
+                    f.write(json.dumps(query, ensure_ascii=False, default=str) + "\n")
+                    written += 1
+        os.replace(tmp_file, output_file)
+        return output_file, written, failed
+    
     def enhance_testset_with_ecommerce_context(self, testset_df):
         """Add e-commerce specific context to the generated testset using QueryClassifier"""
         return QueryClassifier.enhance_testset_with_ecommerce_context(
-            testset_df, self.products_df, self.unique_products, self.unique_categories, llm=self.openai_llm
+            testset_df, self.products_df, self.unique_products, self.unique_categories, llm=self.openai_llm,
+            aggregates=self.aggregates
         )
     
     def save_synthetic_testset(self, enhanced_testset, filename="ragas_synthetic_testset.json"):
@@ -163,6 +247,14 @@ class RagasSyntheticDataGenerator:
 
 def main():
     """Main function to generate synthetic data using Ragas"""
+    parser = argparse.ArgumentParser(description="Generate a synthetic e-commerce testset with Ragas")
+    parser.add_argument("--testset-size", type=int, default=10, help="number of queries to generate")
+    parser.add_argument("--shards", type=int, default=0,
+                        help="split generation into this many shards run in worker processes (0: single run)")
+    parser.add_argument("--workers", type=int, default=GENERATION_WORKERS, help="worker processes for --shards")
+    parser.add_argument("--output", default="ragas_synthetic_testset.jsonl", help="JSONL output for --shards")
+    args = parser.parse_args()
+    
     print("Starting Ragas-based Synthetic Data Generation...")
     print("=" * 60)
     
@@ -170,8 +262,18 @@ def main():
         # Initialize the main generator class
         generator = RagasSyntheticDataGenerator()
         
+        if args.shards:
+            output_file, written, failed = generator.generate_sharded_testset(
+                args.testset_size, args.output, shards=args.shards, workers=args.workers
+            )
+            print(f"\nSuccessfully generated {written} synthetic queries")
+            print(f"Results saved to: {output_file}")
+            if failed:
+                print(f"Shards {failed} failed; rerun the same command to retry only those")
+            return
+        
         # Generate synthetic testset with specified size
-        testset_df = generator.generate_synthetic_testset(testset_size=10)
+        testset_df = generator.generate_synthetic_testset(testset_size=args.testset_size)
         
         if testset_df is not None and not testset_df.empty:
             # Enhance with e-commerce specific metadata
@@ -0,0 +1,193 @@
+"""
+Sharded synthetic testset generation for large evaluation sets
+
+The transformed knowledge graph is split into shards of whole documents
+(each document node with its chunks). Every shard is saved to disk and
+generated in a worker process by a shard generator, given as a
+"module:Class" spec so that each worker builds its own LLM clients. A
+completed shard is written as JSONL and atomically renamed into place; a
+rerun with the same plan skips it, and a failed shard is retried on its
+own. The shard files are then read back one chunk at a time, so no stage
+holds the whole testset in memory.
+"""
+
+import hashlib
+import importlib
+import json
+import multiprocessing
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dotenv import load_dotenv
+from ragas.testset.graph import KnowledgeGraph, NodeType
+from document_processor import split_by_document
+
+load_dotenv()
+
+GENERATION_SHARDS = int(os.getenv("GENERATION_SHARDS", "8"))
+GENERATION_WORKERS = int(os.getenv("GENERATION_WORKERS", "4"))
+GENERATION_MAX_ATTEMPTS = int(os.getenv("GENERATION_MAX_ATTEMPTS", "3"))
+DEFAULT_SHARD_GENERATOR = "ragas_synthetic_generator:RagasShardGenerator"
+
+
+def shard_knowledge_graph(kg, n_shards):
+    """
+    Split a knowledge graph into shards of whole documents
+
+    Args:
+        kg (KnowledgeGraph): Transformed knowledge graph
+        n_shards (int): Number of shards
+
+    Returns:
+        list: Non-empty KnowledgeGraph shards; documents are dealt round-robin
+    """
+    root_ids = list(dict.fromkeys(node.id for node in kg.nodes if node.type == NodeType.DOCUMENT))
+    shards = [KnowledgeGraph() for _ in range(min(n_shards, len(root_ids)))]
+    for i, subgraph in enumerate(split_by_document(kg, root_ids)):
+        shards[i % len(shards)].nodes.extend(subgraph.nodes)
+        shards[i % len(shards)].relationships.extend(subgraph.relationships)
+    return shards
+
+
+def shard_sizes(testset_size, n_shards):
+    """Split ``testset_size`` queries as evenly as possible over ``n_shards``"""
+    return [testset_size // n_shards + (i < testset_size % n_shards) for i in range(n_shards)]
+
+
+def plan_key(shards, testset_size, generator_spec, generator_kwargs):
+    """Hash of everything that decides a shard's output, so stale checkpoints are not reused"""
+    digest = hashlib.sha256(json.dumps(
+        [testset_size, generator_spec, generator_kwargs], sort_keys=True, default=str).encode("utf-8"))
+    for shard in shards:
+        for node in shard.nodes:
+            digest.update(str(node.properties.get("page_content")).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+_generators = {}
+
+
+def _shard_generator(spec, kwargs):
+    """Shard generator for ``spec``, built once per worker process"""
+    key = (spec, json.dumps(kwargs, sort_keys=True))
+    if key not in _generators:
+        module, name = spec.split(":")
+        _generators[key] = getattr(importlib.import_module(module), name)(**kwargs)
+    return _generators[key]
+
+
+def run_shard(spec, kwargs, kg_path, output_path, testset_size, seed):
+    """
+    Generate one shard and write its rows to ``output_path`` as JSONL
+
+    Rows are written as the generator yields them, to a temporary file that
+    replaces ``output_path`` only once the shard is complete.
+
+    Returns:
+        int: Number of rows written
+    """
+    generator = _shard_generator(spec, kwargs)
+    kg = KnowledgeGraph.load(kg_path)
+    count = 0
+    tmp_path = f"{output_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for row in generator.generate(kg, testset_size, seed):
+            f.write(json.dumps(row, ensure_ascii=False, default=str) + "\n")
+            count += 1
+    os.replace(tmp_path, output_path)
+    return count
+
+
+def generate_sharded(kg, testset_size, work_dir, n_shards=GENERATION_SHARDS, workers=GENERATION_WORKERS,
+                     generator_spec=DEFAULT_SHARD_GENERATOR, generator_kwargs=None,
+                     max_attempts=GENERATION_MAX_ATTEMPTS, seed=42):
+    """
+    Generate a testset shard by shard in worker processes
+
+    Args:
+        kg (KnowledgeGraph): Transformed knowledge graph
+        testset_size (int): Total number of queries
+        work_dir (str): Directory for shard graphs and checkpointed shard outputs
+        n_shards (int): Number of shards
+        workers (int): Worker processes
+        generator_spec (str): "module:Class" of the shard generator; instances
+            provide ``generate(kg, testset_size, seed)`` yielding row dicts
+        generator_kwargs (dict): Keyword arguments for the shard generator
+        max_attempts (int): Attempts per shard before giving up on it
+        seed (int): Base seed; shard i uses ``seed + i``
+
+    Returns:
+        tuple: (list of completed shard output paths in shard order, list of failed shard indices)
+    """
+    generator_kwargs = generator_kwargs or {}
+    shards = shard_knowledge_graph(kg, n_shards)
+    sizes = shard_sizes(testset_size, len(shards))
+
+    # A different graph, size or generator invalidates earlier checkpoints
+    key = plan_key(shards, testset_size, generator_spec, generator_kwargs)
+    plan_path = os.path.join(work_dir, "plan.json")
+    if os.path.exists(plan_path):
+        with open(plan_path, encoding="utf-8") as f:
+            if json.load(f).get("key") != key:
+                print(f"Generation plan changed, discarding checkpoints in {work_dir}")
+                shutil.rmtree(work_dir)
+    os.makedirs(work_dir, exist_ok=True)
+    with open(plan_path, "w", encoding="utf-8") as f:
+        json.dump({"key": key, "testset_size": testset_size, "shards": len(shards)}, f)
+
+    outputs = [os.path.join(work_dir, f"shard-{i:04d}.jsonl") for i in range(len(shards))]
+    pending = []
+    for i, shard in enumerate(shards):
+        if os.path.exists(outputs[i]) or sizes[i] == 0:
+            continue
+        kg_path = os.path.join(work_dir, f"shard-{i:04d}.kg.json")
+        if not os.path.exists(kg_path):
+            shard.save(kg_path)
+        pending.append(i)
+    print(f"Generating {testset_size} queries in {len(shards)} shards: {len(shards) - len(pending)} "
+          f"already done, {len(pending)} to run on {workers} workers")
+
+    attempts = dict.fromkeys(pending, 0)
+    failed = []
+    # Fresh interpreters: forking a process that has started asyncio loops or HTTP clients is unsafe
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        def submit(i):
+            attempts[i] += 1
+            kg_path = os.path.join(work_dir, f"shard-{i:04d}.kg.json")
+            return pool.submit(run_shard, generator_spec, generator_kwargs, kg_path, outputs[i], sizes[i],
+                               seed + i)
+
+        futures = {submit(i): i for i in pending}
+        done = 0
+        while futures:
+            future = next(as_completed(futures))
+            i = futures.pop(future)
+            try:
+                count = future.result()
+            except Exception as e:
+                if attempts[i] < max_attempts:
+                    print(f"Shard {i} failed (attempt {attempts[i]}/{max_attempts}): {e}; retrying")
+                    futures[submit(i)] = i
+                else:
+                    print(f"Shard {i} failed after {max_attempts} attempts: {e}")
+                    failed.append(i)
+                continue
+            done += 1
+            print(f"Shard {i} done: {count} queries ({done}/{len(pending)})")
+
+    return [path for path in outputs if os.path.exists(path)], sorted(failed)
+
+
+def iter_shard_rows(paths, chunk_size=500):
+    """Yield lists of at most ``chunk_size`` rows read from the shard JSONL files, in order"""
+    chunk = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                chunk.append(json.loads(line))
+                if len(chunk) == chunk_size:
+                    yield chunk
+                    chunk = []
+    if chunk:
+        yield chunk
@@ -3,7 +3,7 @@ AstraDB Database Inspector
 This script helps you explore what's stored in your AstraDB database
 """
 
-from ecommbot.ingest import ingestdata
+from ecommbot.clients import ASTRA_COLLECTION, vector_store
 from dotenv import load_dotenv
 import os
 
@@ -16,7 +16,7 @@ def inspect_database():
     
     # Connect to vector store
     try:
-        vstore = ingestdata("done")  # Connect without inserting new data
+        vstore = vector_store()  # Connect without inserting new data
         print("✅ Successfully connected to AstraDB")
     except Exception as e:
         print(f"❌ Connection failed: {e}")
@@ -26,7 +26,7 @@ def inspect_database():
     print(f"\n📊 Database Configuration:")
     print(f"   • API Endpoint: {os.getenv('ASTRA_DB_API_ENDPOINT')}")
     print(f"   • Keyspace: {os.getenv('ASTRA_DB_KEYSPACE')}")
-    print(f"   • Collection: chatbotecomm")
+    print(f"   • Collection: {ASTRA_COLLECTION}")
     
     # Test search functionality
     print(f"\n🔎 Testing Search Functionality:")
@@ -71,10 +71,10 @@ def get_collection_stats():
     print(f"\n📈 Collection Statistics:")
     
     try:
-        vstore = ingestdata("done")
+        vstore = vector_store()
         
         # Try to get collection info (this might vary based on AstraDB version)
-        print("   • Collection Name: chatbotecomm")
+        print(f"   • Collection Name: {ASTRA_COLLECTION}")
         print("   • Vector Dimension: 1536 (OpenAI ada-002 embeddings)")
         print("   • Data Type: Product reviews with vector embeddings")
         
@@ -103,6 +103,6 @@ if __name__ == "__main__":
     
     print(f"\n💡 Tips:")
     print(f"   • Check AstraDB Console for visual interface")
-    print(f"   • Collection 'chatbotecomm' contains your product data")
+    print(f"   • Collection '{ASTRA_COLLECTION}' contains your product data")
     print(f"   • Each document has product_name metadata and review content")
     print(f"   • Vector embeddings enable semantic search")
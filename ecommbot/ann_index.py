@@ -0,0 +1,117 @@
+"""
+Inverted-file (IVF) approximate nearest-neighbour index over unit vectors.
+
+Training runs spherical k-means on a sample to get ``nlist`` coarse centroids.
+Every vector is then assigned to its nearest centroid, and the vectors are
+stored grouped by list in one contiguous matrix (CSR layout: ``offsets[i]`` to
+``offsets[i + 1]`` is list ``i``). A query scores the centroids, scans the
+``nprobe`` closest lists, and returns the top-k by exact dot product within
+those lists. All arrays are saved as ``.npy`` files and memory-mapped on load.
+"""
+
+import os
+
+import numpy as np
+
+_ASSIGN_CHUNK = 65_536
+
+
+def top_k(scores, k):
+    """Indices of the ``k`` highest scores, best first."""
+    if k >= len(scores):
+        return np.argsort(-scores)
+    candidates = np.argpartition(-scores, k)[:k]
+    return candidates[np.argsort(-scores[candidates])]
+
+
+def _assign(vectors, centroids):
+    labels = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), _ASSIGN_CHUNK):
+        labels[start:start + _ASSIGN_CHUNK] = np.argmax(
+            vectors[start:start + _ASSIGN_CHUNK] @ centroids.T, axis=1)
+    return labels
+
+
+def spherical_kmeans(vectors, nlist, n_iter=20, seed=0):
+    """Cluster unit vectors by cosine similarity; returns unit-norm centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+    for _ in range(n_iter):
+        labels = _assign(vectors, centroids)
+        counts = np.bincount(labels, minlength=nlist)
+        nonempty = np.flatnonzero(counts)
+        starts = (np.cumsum(counts) - counts)[nonempty]
+        sums = np.zeros_like(centroids)
+        sums[nonempty] = np.add.reduceat(vectors[np.argsort(labels, kind="stable")], starts, axis=0)
+        empty = counts == 0
+        # Re-seed empty clusters from random points so every list stays useful
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()), replace=False)]
+        centroids = sums / np.linalg.norm(sums, axis=1, keepdims=True)
+    return centroids.astype(np.float32)
+
+
+class IVFIndex:
+    """Inverted lists of row ids and their vectors, grouped by coarse centroid."""
+
+    FILES = ("centroids", "offsets", "rows", "vectors")
+
+    def __init__(self, centroids, offsets, rows, vectors):
+        self.centroids = centroids
+        self.offsets = offsets
+        self.rows = rows
+        self.vectors = vectors
+
+    @property
+    def nlist(self):
+        return len(self.centroids)
+
+    def __len__(self):
+        return len(self.rows)
+
+    @classmethod
+    def train(cls, vectors, nlist=None, n_iter=20, sample_size=100_000, seed=0):
+        """Build an index over ``vectors`` (unit-norm float32, one row per document).
+
+        Args:
+            nlist (int): Number of inverted lists; defaults to ``4 * sqrt(n)``.
+            sample_size (int): Vectors used for k-means; all vectors are assigned.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        n = len(vectors)
+        nlist = min(nlist or max(1, int(4 * np.sqrt(n))), n)
+        rng = np.random.default_rng(seed)
+        sample = vectors if n <= sample_size else vectors[np.sort(rng.choice(n, sample_size, replace=False))]
+        centroids = spherical_kmeans(sample, nlist, n_iter=n_iter, seed=seed)
+
+        labels = _assign(vectors, centroids)
+        order = np.argsort(labels, kind="stable").astype(np.int64)
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        np.cumsum(np.bincount(labels, minlength=nlist), out=offsets[1:])
+        return cls(centroids, offsets, order, vectors[order])
+
+    def search(self, query, k=4, nprobe=8):
+        """Approximate top-k; returns (row ids, scores), best first."""
+        query = np.asarray(query, dtype=np.float32)
+        probes = top_k(self.centroids @ query, min(nprobe, self.nlist))
+        segments = [(self.offsets[p], self.offsets[p + 1]) for p in probes]
+        rows = np.concatenate([self.rows[start:end] for start, end in segments])
+        scores = np.concatenate([self.vectors[start:end] @ query for start, end in segments])
+        best = top_k(scores, k)
+        return rows[best], scores[best]
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        for name in self.FILES:
+            tmp_path = os.path.join(path, f"{name}.npy.tmp")
+            with open(tmp_path, "wb") as f:
+                np.save(f, getattr(self, name))
+            os.replace(tmp_path, os.path.join(path, f"{name}.npy"))
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        return cls(*(np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r" if mmap else None)
+                     for name in cls.FILES))
+
+    @staticmethod
+    def exists(path):
+        return os.path.exists(os.path.join(path, "offsets.npy"))
@@ -0,0 +1,67 @@
+"""
+ASGI front-end for the chat chain.
+
+Requests are served on an event loop and call ``chain.ainvoke``. Each chain
+call makes exactly one LLM request, so a semaphore around it caps in-flight
+LLM calls per worker process. Run it under an ASGI server with several workers:
+
+    uvicorn app_async:app --workers 4
+"""
+
+import asyncio
+import os
+
+from dotenv import load_dotenv
+from quart import Quart, Response, render_template, request
+
+from ecommbot.metrics import REGISTRY
+from ecommbot.server import (
+    METRICS_CONTENT_TYPE, SSE_HEADERS, STATIC_FOLDER, TEMPLATE_FOLDER, StreamTimer, logger, sse_event,
+)
+
+load_dotenv()
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+
+
+def create_async_app(chain, max_concurrency=LLM_MAX_CONCURRENCY):
+    app = Quart(__name__, template_folder=TEMPLATE_FOLDER, static_folder=STATIC_FOLDER)
+    llm_slots = asyncio.Semaphore(max_concurrency)
+
+    @app.route("/")
+    async def index():
+        return await render_template('chat.html')
+
+    @app.route("/get", methods=["GET", "POST"])
+    async def chat():
+        msg = (await request.form)["msg"]
+        async with llm_slots:
+            result = await chain.ainvoke(msg)
+        logger.debug("response: %r", result)
+        return str(result)
+
+    @app.route("/metrics")
+    async def metrics():
+        return Response(REGISTRY.render(), content_type=METRICS_CONTENT_TYPE)
+
+    @app.route("/stream", methods=["POST"])
+    async def chat_stream():
+        msg = (await request.form)["msg"]
+
+        async def generate():
+            timer = StreamTimer()
+            try:
+                async with llm_slots:
+                    async for token in chain.astream(msg):
+                        if token:
+                            timer.token()
+                            yield sse_event({"token": token})
+            except Exception:
+                logger.exception("streaming failed")
+                yield sse_event({"error": "Sorry, something went wrong."}, event="error")
+            yield sse_event({}, event="done")
+            timer.log(msg)
+
+        return Response(generate(), mimetype="text/event-stream", headers=SSE_HEADERS)
+
+    return app
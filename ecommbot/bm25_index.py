@@ -0,0 +1,191 @@
+"""
+Okapi BM25 index over review text and product titles, and reciprocal-rank fusion.
+
+The index is built once at ingest time and stored as flat arrays in CSR
+layout: ``offsets[t]`` to ``offsets[t + 1]`` are the postings of term ``t``,
+with one document number and one precomputed BM25 weight per posting. A query
+gathers the postings of its terms and sums weights per document, so scoring
+touches only documents that share a term with the query. The arrays are
+memory-mapped on load. Document text is read back from ``documents.jsonl`` by
+byte offset, only for the hits.
+"""
+
+import json
+import os
+import re
+import threading
+from collections import Counter
+
+import numpy as np
+from dotenv import load_dotenv
+from langchain_core.documents import Document
+
+from ecommbot.ann_index import top_k
+
+load_dotenv()
+
+BM25_INDEX_PATH = os.getenv("BM25_INDEX_PATH", ".cache/bm25_index")
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    """Lowercase alphanumeric runs, so model numbers like ``235v2`` stay one token."""
+    return TOKEN_RE.findall(text.lower())
+
+
+def _replace_file(path, write, mode="wb"):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, mode) as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+class BM25Index:
+    """Array-backed inverted index; build with ``build`` and open with ``load``."""
+
+    ARRAYS = ("offsets", "postings", "weights", "doc_offsets")
+
+    def __init__(self, path, vocabulary, offsets, postings, weights, doc_offsets):
+        self.path = path
+        self.vocabulary = vocabulary
+        self.offsets = offsets
+        self.postings = postings
+        self.weights = weights
+        self.doc_offsets = doc_offsets
+
+    def __len__(self):
+        return len(self.doc_offsets)
+
+    @staticmethod
+    def document_text(doc):
+        """Text indexed for ``doc``: product title followed by the review."""
+        return f"{doc.metadata.get('product_name', '')} {doc.page_content}"
+
+    @classmethod
+    def build(cls, batches, path, k1=1.2, b=0.75):
+        """Index a stream of Document batches into the directory ``path``.
+
+        Args:
+            batches: Iterable of Document lists, e.g. from ``iter_document_batches``.
+            k1 (float): Term-frequency saturation.
+            b (float): Document-length normalization.
+        """
+        os.makedirs(path, exist_ok=True)
+        vocabulary = {}
+        term_ids, doc_nums, freqs, lengths, doc_offsets = [], [], [], [], []
+
+        def write_documents(f):
+            for docs in batches:
+                for doc in docs:
+                    counts = Counter(tokenize(cls.document_text(doc)))
+                    doc_num = len(lengths)
+                    for term, count in counts.items():
+                        term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+                        doc_nums.append(doc_num)
+                        freqs.append(count)
+                    lengths.append(sum(counts.values()))
+                    doc_offsets.append(f.tell())
+                    record = {"id": doc.id, "text": doc.page_content, "metadata": doc.metadata}
+                    f.write(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+
+        _replace_file(os.path.join(path, "documents.jsonl"), write_documents)
+
+        term_ids = np.array(term_ids, dtype=np.int32)
+        doc_nums = np.array(doc_nums, dtype=np.int32)
+        freqs = np.array(freqs, dtype=np.float32)
+        lengths = np.array(lengths, dtype=np.float32)
+        n_docs, n_terms = len(lengths), len(vocabulary)
+
+        df = np.bincount(term_ids, minlength=n_terms)
+        idf = np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        norm = k1 * (1 - b + b * lengths / max(lengths.mean() if n_docs else 1.0, 1e-9))
+        weights = idf[term_ids] * freqs * (k1 + 1) / (freqs + norm[doc_nums])
+
+        order = np.argsort(term_ids, kind="stable")
+        offsets = np.zeros(n_terms + 1, dtype=np.int64)
+        np.cumsum(df, out=offsets[1:])
+        index = cls(path, vocabulary, offsets, doc_nums[order], weights[order].astype(np.float32),
+                    np.array(doc_offsets, dtype=np.int64))
+        index.save()
+        return index
+
+    def save(self):
+        for name in self.ARRAYS:
+            _replace_file(os.path.join(self.path, f"{name}.npy"),
+                          lambda f: np.save(f, getattr(self, name)))
+        _replace_file(os.path.join(self.path, "vocabulary.json"),
+                      lambda f: json.dump(self.vocabulary, f, ensure_ascii=False), mode="w")
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        with open(os.path.join(path, "vocabulary.json"), encoding="utf-8") as f:
+            vocabulary = json.load(f)
+        arrays = [np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r" if mmap else None)
+                  for name in cls.ARRAYS]
+        return cls(path, vocabulary, *arrays)
+
+    @staticmethod
+    def exists(path):
+        return os.path.exists(os.path.join(path, "vocabulary.json"))
+
+    def search_with_scores(self, query, k=4):
+        """Return ``(document numbers, BM25 scores)`` of the top-k matches, best first."""
+        terms = [self.vocabulary[t] for t in set(tokenize(query)) if t in self.vocabulary]
+        if not terms:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+        docs = np.concatenate([self.postings[self.offsets[t]:self.offsets[t + 1]] for t in terms])
+        weights = np.concatenate([self.weights[self.offsets[t]:self.offsets[t + 1]] for t in terms])
+        hits, inverse = np.unique(docs, return_inverse=True)
+        scores = np.bincount(inverse, weights=weights)
+        best = top_k(scores, k)
+        return hits[best], scores[best]
+
+    def documents(self, doc_nums):
+        docs = []
+        with open(os.path.join(self.path, "documents.jsonl"), "rb") as f:
+            for doc_num in doc_nums:
+                f.seek(self.doc_offsets[doc_num])
+                record = json.loads(f.readline())
+                docs.append(Document(id=record["id"], page_content=record["text"],
+                                     metadata=record["metadata"]))
+        return docs
+
+    def search(self, query, k=4):
+        return self.documents(self.search_with_scores(query, k)[0])
+
+
+class LazyBM25Index:
+    """Opens the index at ``path`` on first search, so startup pays nothing for it."""
+
+    def __init__(self, path):
+        self.path = path
+        self._index = None
+        self._lock = threading.Lock()
+
+    @property
+    def index(self):
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    self._index = BM25Index.load(self.path)
+        return self._index
+
+    def search(self, query, k=4):
+        return self.index.search(query, k)
+
+
+def reciprocal_rank_fusion(result_lists, k=4, c=60):
+    """Merge ranked Document lists by summing ``1 / (c + rank)`` per document.
+
+    Documents are matched on product title and review text, since the vector
+    store may not return document ids.
+    """
+    scores, docs = {}, {}
+    for results in result_lists:
+        for rank, doc in enumerate(results):
+            key = (doc.metadata.get("product_name"), doc.page_content)
+            docs.setdefault(key, doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (c + rank + 1)
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    return [docs[key] for key in ranked[:k]]
@@ -0,0 +1,195 @@
+"""
+Process-wide registry of the network clients: vector store, embeddings and chat model.
+
+Clients are created on first use, under a lock, and then reused by every
+caller in the process, so their connections stay open between requests.
+The OpenAI chat and embedding clients send through one pooled
+``httpx.Client`` per process (httpx clients are thread-safe) and one pooled
+``httpx.AsyncClient`` per event loop (an async connection belongs to the
+loop that opened it). The pool size, keep-alive and timeouts are read from
+the environment. The AstraDB store is created once per process: astrapy
+keeps its own keep-alive pool for each store, so reusing the store reuses
+its connections, and ``ASTRA_*_TIMEOUT_MS`` bound its requests. A forked
+child starts with an empty registry, because the parent's sockets must not
+be shared across processes.
+"""
+
+import asyncio
+import json
+import os
+import threading
+import weakref
+
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "astra")
+LOCAL_INDEX_PATH = os.getenv("LOCAL_INDEX_PATH", ".cache/local_index")
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "8"))
+ASTRA_DB_API_ENDPOINT = os.getenv("ASTRA_DB_API_ENDPOINT")
+ASTRA_DB_APPLICATION_TOKEN = os.getenv("ASTRA_DB_APPLICATION_TOKEN")
+ASTRA_DB_KEYSPACE = os.getenv("ASTRA_DB_KEYSPACE")
+ASTRA_COLLECTION = os.getenv("ASTRA_COLLECTION", "chatbotecomm")
+ASTRA_REQUEST_TIMEOUT_MS = int(os.getenv("ASTRA_REQUEST_TIMEOUT_MS", "10000"))
+ASTRA_METHOD_TIMEOUT_MS = int(os.getenv("ASTRA_METHOD_TIMEOUT_MS", "30000"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "60"))
+HTTP_POOL_TIMEOUT = float(os.getenv("HTTP_POOL_TIMEOUT", "10"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+
+
+def http_limits():
+    return httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS,
+                        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY)
+
+
+def http_timeout():
+    return httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT, pool=HTTP_POOL_TIMEOUT)
+
+
+class LoopLocalAsyncClient(httpx.AsyncClient):
+    """``httpx.AsyncClient`` that sends through a separate pooled client for each event loop.
+
+    One instance can be given to clients that are shared by several event
+    loops (threads, successive ``asyncio.run`` calls). Without it, a
+    connection opened on one loop would be reused on another.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._kwargs = kwargs
+        self._clients = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def _client(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._clients.get(loop)
+            if client is None:
+                client = self._clients[loop] = httpx.AsyncClient(**self._kwargs)
+        return client
+
+    async def send(self, request, **kwargs):
+        return await self._client().send(request, **kwargs)
+
+    async def aclose(self):
+        """Close the running loop's connections."""
+        with self._lock:
+            client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+        await super().aclose()
+
+
+class ClientRegistry:
+    """Clients keyed by name and settings, each created once per process."""
+
+    def __init__(self):
+        self._clients = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, factory):
+        """The client for ``key``, created with ``factory()`` if this process has none yet."""
+        client = self._clients.get(key)
+        if client is None:
+            # One lock per key: a factory may itself ask for other clients (e.g. the HTTP pool)
+            with self._lock:
+                lock = self._locks.setdefault(key, threading.Lock())
+            with lock:
+                client = self._clients.get(key)
+                if client is None:
+                    client = self._clients[key] = factory()
+        return client
+
+    def clear(self):
+        """Forget every client without closing it (used in a forked child)."""
+        self._clients = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def close(self):
+        """Close the pooled sync HTTP connections and forget every client."""
+        for client in self._clients.values():
+            if isinstance(client, httpx.Client):
+                client.close()
+        self.clear()
+
+
+CLIENTS = ClientRegistry()
+os.register_at_fork(after_in_child=CLIENTS.clear)
+
+
+def _key(name, settings):
+    return name, json.dumps(settings, sort_keys=True, default=str)
+
+
+def http_client():
+    """The process's pooled sync HTTP client."""
+    return CLIENTS.get("http", lambda: httpx.Client(limits=http_limits(), timeout=http_timeout()))
+
+
+def async_http_client():
+    """The process's pooled async HTTP client (one connection pool per event loop)."""
+    return CLIENTS.get("async_http", lambda: LoopLocalAsyncClient(limits=http_limits(), timeout=http_timeout()))
+
+
+def _openai_options():
+    return {"http_client": http_client(), "http_async_client": async_http_client(),
+            "max_retries": OPENAI_MAX_RETRIES, "timeout": http_timeout()}
+
+
+def chat_model(shared=True, **kwargs):
+    """``ChatOpenAI(**kwargs)`` on the pooled HTTP clients.
+
+    With ``shared``, callers asking for the same settings get the same
+    instance. Pass ``shared=False`` for wrappers that change attributes of
+    the model while using it (Ragas sets ``temperature`` per call); the new
+    instance still uses the pooled connections.
+    """
+    def build():
+        from langchain_openai import ChatOpenAI
+        return ChatOpenAI(**_openai_options(), **kwargs)
+
+    return CLIENTS.get(_key("chat_model", kwargs), build) if shared else build()
+
+
+def embeddings(**kwargs):
+    """Shared ``OpenAIEmbeddings(**kwargs)`` on the pooled HTTP clients, behind the embedding cache."""
+    def build():
+        from langchain_openai import OpenAIEmbeddings
+
+        from ecommbot.embedding_cache import CachedEmbeddings
+        return CachedEmbeddings(OpenAIEmbeddings(**_openai_options(), **kwargs))
+
+    return CLIENTS.get(_key("embeddings", kwargs), build)
+
+
+def _create_vector_store():
+    if VECTOR_BACKEND == "local":
+        from ecommbot.local_vectorstore import LocalVectorStore
+        return LocalVectorStore.load(LOCAL_INDEX_PATH, embeddings(), nprobe=IVF_NPROBE)
+    if VECTOR_BACKEND != "astra":
+        raise ValueError(f"Unknown VECTOR_BACKEND {VECTOR_BACKEND!r}, expected 'astra' or 'local'")
+    from astrapy.api_options import APIOptions, TimeoutOptions
+    from langchain_astradb import AstraDBVectorStore
+    return AstraDBVectorStore(
+        embedding=embeddings(),
+        collection_name=ASTRA_COLLECTION,
+        api_endpoint=ASTRA_DB_API_ENDPOINT,
+        token=ASTRA_DB_APPLICATION_TOKEN,
+        namespace=ASTRA_DB_KEYSPACE,
+        api_options=APIOptions(timeout_options=TimeoutOptions(
+            request_timeout_ms=ASTRA_REQUEST_TIMEOUT_MS, general_method_timeout_ms=ASTRA_METHOD_TIMEOUT_MS)),
+    )
+
+
+def vector_store():
+    """The process's vector store for ``VECTOR_BACKEND``, with the shared embeddings."""
+    return CLIENTS.get("vector_store", _create_vector_store)
@@ -0,0 +1,268 @@
+"""
+Single-flight coalescing of identical concurrent chat questions.
+
+When the same question (after normalizing case, whitespace and trailing
+punctuation) arrives while an earlier copy is still being answered, the new
+request does not run retrieval and generation again: it waits for the
+in-flight run and gets the same answer. Streamed answers are shared chunk by
+chunk, so a request that joins late first receives the chunks already
+produced and then follows the rest live. Threaded callers (``invoke`` /
+``stream``) share flights across threads; asyncio callers (``ainvoke`` /
+``astream``) share flights within their event loop.
+
+The run that starts a flight keeps going when the request that started it
+goes away, as long as other requests wait on it. The callbacks and config of
+that first request are the ones the run uses.
+"""
+
+import asyncio
+import threading
+import weakref
+
+from langchain_core.runnables import Runnable
+
+from ecommbot.metrics import REGISTRY
+
+COALESCED_REQUESTS = REGISTRY.counter(
+    "coalesced_requests_total", "Chat requests that waited on an identical in-flight request")
+COALESCE_LLM_CALLS_SAVED = REGISTRY.counter(
+    "coalesce_llm_calls_saved_total", "Retrieval and LLM calls avoided by sharing an in-flight answer")
+
+
+def normalize_question(question):
+    """Key under which identical questions are coalesced."""
+    return " ".join(question.casefold().split()).rstrip("?!. ")
+
+
+class Flight:
+    """Answer chunks of one in-flight run, read by every request waiting on it."""
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.waiting = 1
+
+    def _take(self, seen):
+        """Chunks after the first ``seen``, and whether the run is over."""
+        return self.chunks[seen:], self.done
+
+
+class ThreadFlight(Flight):
+    def __init__(self):
+        super().__init__()
+        self._changed = threading.Condition()
+
+    def add(self, chunk):
+        with self._changed:
+            self.chunks.append(chunk)
+            self._changed.notify_all()
+
+    def finish(self, error=None):
+        with self._changed:
+            self.done, self.error = True, error
+            self._changed.notify_all()
+
+    def follow(self):
+        seen = 0
+        while True:
+            with self._changed:
+                self._changed.wait_for(lambda: len(self.chunks) > seen or self.done)
+                chunks, done = self._take(seen)
+            seen += len(chunks)
+            yield from chunks
+            if done:
+                if self.error is not None:
+                    raise self.error
+                return
+
+
+class AsyncFlight(Flight):
+    def __init__(self):
+        super().__init__()
+        self._changed = asyncio.Condition()
+        self.task = None
+
+    async def add(self, chunk):
+        async with self._changed:
+            self.chunks.append(chunk)
+            self._changed.notify_all()
+
+    async def finish(self, error=None):
+        async with self._changed:
+            self.done, self.error = True, error
+            self._changed.notify_all()
+
+    async def follow(self):
+        seen = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: len(self.chunks) > seen or self.done)
+                chunks, done = self._take(seen)
+            seen += len(chunks)
+            for chunk in chunks:
+                yield chunk
+            if done:
+                if self.error is not None:
+                    raise self.error
+                return
+
+
+class CoalescingChain(Runnable):
+    """Wrap a question -> answer chain so identical concurrent questions share one run of it."""
+
+    def __init__(self, chain):
+        self.chain = chain
+        self._flights = {}  # normalized question -> ThreadFlight
+        self._lock = threading.Lock()
+        self._loop_flights = weakref.WeakKeyDictionary()  # event loop -> {normalized question: AsyncFlight}
+
+    # Threaded serving
+
+    def _join(self, key):
+        """``(flight, leads)``: the flight to read the answer from, and whether this request runs it."""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.waiting += 1
+                COALESCED_REQUESTS.inc()
+                return flight, False
+            flight = self._flights[key] = ThreadFlight()
+            return flight, True
+
+    def _leave(self, key, flight, leads):
+        """Stop waiting on ``flight``; returns True when nobody else is waiting on it."""
+        with self._lock:
+            flight.waiting -= 1
+            if not leads and flight.done and flight.error is None:
+                COALESCE_LLM_CALLS_SAVED.inc()
+            if flight.waiting == 0 and self._flights.get(key) is flight:
+                # Nobody is left to read the answer, so no new request may join it either
+                del self._flights[key]
+            return flight.waiting == 0
+
+    def _land(self, key, flight, error=None):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.finish(error)
+
+    def _lead(self, key, flight, run):
+        """Run the flight: yield the chunks of ``run()`` to the caller and publish them to the waiting requests."""
+        left = False
+        try:
+            for chunk in run():
+                flight.add(chunk)
+                if not left:
+                    try:
+                        yield chunk
+                    except GeneratorExit:
+                        # The caller went away: finish the run only for the requests still waiting on it
+                        left = True
+                        if self._leave(key, flight, leads=True):
+                            raise
+        except BaseException as error:
+            self._land(key, flight, error)
+            raise
+        self._land(key, flight)
+        if not left:
+            self._leave(key, flight, leads=True)
+
+    def invoke(self, input, config=None, **kwargs):
+        if not isinstance(input, str):
+            return self.chain.invoke(input, config, **kwargs)
+        key = normalize_question(input)
+        flight, leads = self._join(key)
+        if leads:
+            return "".join(self._lead(key, flight, lambda: [self.chain.invoke(input, config, **kwargs)]))
+        try:
+            return "".join(flight.follow())
+        finally:
+            self._leave(key, flight, leads)
+
+    def stream(self, input, config=None, **kwargs):
+        if not isinstance(input, str):
+            yield from self.chain.stream(input, config, **kwargs)
+            return
+        key = normalize_question(input)
+        flight, leads = self._join(key)
+        if leads:
+            yield from self._lead(key, flight, lambda: self.chain.stream(input, config, **kwargs))
+            return
+        try:
+            yield from flight.follow()
+        finally:
+            self._leave(key, flight, leads)
+
+    # Asyncio serving
+
+    def _loop_table(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            flights = self._loop_flights.get(loop)
+            if flights is None:
+                flights = self._loop_flights[loop] = {}
+        return flights
+
+    @staticmethod
+    def _drop(flights, key, flight):
+        # A newer flight may have taken the key since this one was abandoned
+        if flights.get(key) is flight:
+            del flights[key]
+
+    async def _run(self, flights, key, flight, run):
+        try:
+            async for chunk in run():
+                await flight.add(chunk)
+        except asyncio.CancelledError:
+            self._drop(flights, key, flight)
+            await flight.finish(RuntimeError("coalesced run was cancelled"))
+            raise
+        except Exception as error:
+            # Raised to every waiting request by AsyncFlight.follow
+            self._drop(flights, key, flight)
+            await flight.finish(error)
+            return
+        self._drop(flights, key, flight)
+        await flight.finish()
+
+    async def _coalesce(self, input, run):
+        flights = self._loop_table()
+        key = normalize_question(input)
+        flight = flights.get(key)
+        leads = flight is None
+        if leads:
+            # The run is its own task, so it survives the cancellation of the request that started it
+            flight = flights[key] = AsyncFlight()
+            flight.task = asyncio.ensure_future(self._run(flights, key, flight, run))
+        else:
+            flight.waiting += 1
+            COALESCED_REQUESTS.inc()
+        try:
+            async for chunk in flight.follow():
+                yield chunk
+        finally:
+            flight.waiting -= 1
+            if not leads and flight.done and flight.error is None:
+                COALESCE_LLM_CALLS_SAVED.inc()
+            if flight.waiting == 0 and not flight.done:
+                # Nobody is left to read the answer
+                self._drop(flights, key, flight)
+                flight.task.cancel()
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        if not isinstance(input, str):
+            return await self.chain.ainvoke(input, config, **kwargs)
+
+        async def run():
+            yield await self.chain.ainvoke(input, config, **kwargs)
+
+        return "".join([chunk async for chunk in self._coalesce(input, run)])
+
+    async def astream(self, input, config=None, **kwargs):
+        if not isinstance(input, str):
+            async for chunk in self.chain.astream(input, config, **kwargs):
+                yield chunk
+            return
+        async for chunk in self._coalesce(input, lambda: self.chain.astream(input, config, **kwargs)):
+            yield chunk
@@ -0,0 +1,149 @@
+"""
+Assembly of the ``{context}`` block of the chat prompt under a token budget.
+
+Retrieved reviews are grouped by product and written as compact
+``Product: ...`` blocks instead of the repr of a list of Documents. A review
+longer than ``REVIEW_MAX_TOKENS`` is cut down to its sentences that share the
+most terms with the question, and the whole block is kept within
+``CONTEXT_MAX_TOKENS``. Tokens are counted with the tiktoken encoding used by
+OpenAI chat models.
+"""
+
+import logging
+import os
+import re
+import threading
+
+import tiktoken
+from dotenv import load_dotenv
+
+from ecommbot.bm25_index import tokenize
+
+load_dotenv()
+
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "600"))
+REVIEW_MAX_TOKENS = int(os.getenv("REVIEW_MAX_TOKENS", "120"))
+CONTEXT_TOKENIZER = os.getenv("CONTEXT_TOKENIZER", "cl100k_base")
+
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+|\.{2,}\s*|\n+")
+STOPWORDS = frozenset("""
+    a an and are as at be but by can do does for from has have how i in is it its me my of on or
+    so than that the this to was what which who why will with you your
+""".split())
+
+logger = logging.getLogger(__name__)
+
+_encodings = {}
+_encodings_lock = threading.Lock()
+
+
+def estimate_tokens(text):
+    """Rough token count (about 4 characters per token for English text)."""
+    return (len(text) + 3) // 4
+
+
+def _encoding(name=CONTEXT_TOKENIZER):
+    """The tiktoken encoding ``name``, loaded once per process (None when unavailable)."""
+    if name in _encodings:
+        return _encodings[name]
+    # Concurrent first requests would otherwise each load the BPE ranks
+    with _encodings_lock:
+        if name not in _encodings:
+            try:
+                _encodings[name] = tiktoken.get_encoding(name)
+            except Exception:
+                # tiktoken downloads its BPE files on first use; without network or a cache, estimate
+                logger.warning("tiktoken encoding %r unavailable, estimating token counts", name)
+                _encodings[name] = None
+        return _encodings[name]
+
+
+def count_tokens(text):
+    encoding = _encoding()
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text, max_tokens):
+    """Cut ``text`` to at most ``max_tokens`` tokens, on a token boundary (a character count when estimating)."""
+    encoding = _encoding()
+    if encoding is None:
+        return text[:max_tokens * 4].rstrip()
+    tokens = encoding.encode(text, disallowed_special=())
+    return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens]).rstrip()
+
+
+def split_sentences(text):
+    return [sentence.strip() for sentence in SENTENCE_RE.split(text) if sentence and sentence.strip()]
+
+
+def relevant_excerpt(text, question, max_tokens=REVIEW_MAX_TOKENS):
+    """Return ``text`` if it fits in ``max_tokens``, else its most question-relevant sentences.
+
+    Sentences are ranked by how many distinct question terms (other than
+    stopwords) they contain (earlier sentences win ties), added while they
+    fit, and emitted in their original order joined by " ... ". Text without
+    any sentence is truncated instead.
+    """
+    text = " ".join(text.split())
+    if count_tokens(text) <= max_tokens:
+        return text
+    terms = set(tokenize(question)) - STOPWORDS
+    sentences = split_sentences(text)
+    if not sentences:
+        return truncate_tokens(text, max_tokens)
+    ranked = sorted(range(len(sentences)),
+                    key=lambda i: (-len(terms.intersection(tokenize(sentences[i]))), i))
+    kept, used = [], 0
+    for i in ranked:
+        cost = count_tokens(sentences[i])
+        if used + cost > max_tokens:
+            continue
+        kept.append(i)
+        used += cost
+    if not kept:
+        return truncate_tokens(sentences[ranked[0]], max_tokens)
+    return " ... ".join(sentences[i] for i in sorted(kept))
+
+
+def group_by_product(docs):
+    """``(product_name, [Document, ...])`` pairs in order of each product's first appearance."""
+    groups = {}
+    for doc in docs:
+        groups.setdefault(doc.metadata.get("product_name", ""), []).append(doc)
+    return list(groups.items())
+
+
+def pack_product_context(groups, max_tokens=CONTEXT_MAX_TOKENS, count_tokens=count_tokens,
+                         question=None, review_max_tokens=REVIEW_MAX_TOKENS):
+    """Format ``(product_name, [Document, ...])`` groups as compact text within ``max_tokens``.
+
+    Reviews are admitted round-robin across products (every product's best
+    review before any product's second), so a tight budget still covers all
+    products. Reviews that do not fit are skipped. With ``question``, long
+    reviews are first cut to their relevant sentences.
+    """
+    kept = {product: [] for product, _ in groups}
+    used = 0
+    for rank in range(max((len(docs) for _, docs in groups), default=0)):
+        for product, docs in groups:
+            if rank >= len(docs):
+                continue
+            review = docs[rank].page_content
+            if question is not None:
+                review = relevant_excerpt(review, question, review_max_tokens)
+            line = f"- {' '.join(review.split())}"
+            cost = count_tokens(line) + (0 if kept[product] else count_tokens(f"Product: {product}"))
+            if used + cost > max_tokens:
+                continue
+            kept[product].append(line)
+            used += cost
+    return "\n\n".join(f"Product: {product}\n" + "\n".join(lines)
+                       for product, lines in kept.items() if lines)
+
+
+def assemble_context(docs, question, max_tokens=CONTEXT_MAX_TOKENS, review_max_tokens=REVIEW_MAX_TOKENS):
+    """Context text for ``question`` from retrieved Documents, best first."""
+    return pack_product_context(group_by_product(docs), max_tokens, question=question,
+                                review_max_tokens=review_max_tokens)
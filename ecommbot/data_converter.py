@@ -1,30 +1,47 @@
+import os
+from itertools import chain
 
-import pandas as pd
 from langchain_core.documents import Document
 
+DEFAULT_DATA_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "data",
+    "flipkart_product_review.csv",
+)
+DEFAULT_CONTENT_COLUMN = "review"
+DEFAULT_METADATA_COLUMNS = {"product_name": "product_title"}
+DEFAULT_BATCH_SIZE = 1000
 
-def dataconveter():
-    product_data=pd.read_csv("../data/flipkart_product_review.csv")
 
-    data=product_data[["product_title","review"]]
+def iter_document_batches(path=DEFAULT_DATA_PATH, content_column=DEFAULT_CONTENT_COLUMN,
+                          metadata_columns=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Stream the review CSV as lists of at most ``batch_size`` Documents.
 
-    product_list = []
+    ``metadata_columns`` maps metadata keys to CSV columns. Only those columns
+    and ``content_column`` are parsed, and only one chunk is held in memory at
+    a time, so peak memory is bounded by the batch size, not the file size.
+    """
+    import pandas as pd
 
-    # Iterate over the rows of the DataFrame
-    for index, row in data.iterrows():
-        # Construct an object with 'product_name' and 'review' attributes
-        obj = {
-                'product_name': row['product_title'],
-                'review': row['review']
-            }
-        # Append the object to the list
-        product_list.append(obj)
+    if metadata_columns is None:
+        metadata_columns = DEFAULT_METADATA_COLUMNS
+    keys = list(metadata_columns)
+    usecols = list(dict.fromkeys([content_column, *metadata_columns.values()]))
 
-        
-            
-    docs = []
-    for entry in product_list:
-        metadata = {"product_name": entry['product_name']}
-        doc = Document(page_content=entry['review'], metadata=metadata)
-        docs.append(doc)
-    return docs
\ No newline at end of file
+    reader = pd.read_csv(path, usecols=usecols, chunksize=batch_size,
+                         dtype=str, keep_default_na=False)
+    for chunk in reader:
+        contents = chunk[content_column].tolist()
+        columns = [chunk[metadata_columns[key]].tolist() for key in keys]
+        yield [
+            Document(page_content=content, metadata=dict(zip(keys, values)))
+            for content, *values in zip(contents, *columns)
+        ]
+
+
+def dataconveter(path=DEFAULT_DATA_PATH, content_column=DEFAULT_CONTENT_COLUMN,
+                 metadata_columns=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Return every review as a single list; prefer iter_document_batches for large files."""
+    return list(chain.from_iterable(
+        iter_document_batches(path, content_column, metadata_columns, batch_size)
+    ))
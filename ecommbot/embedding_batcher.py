@@ -0,0 +1,239 @@
+"""
+Micro-batching of concurrent query embeddings.
+
+Every chat request embeds its question, which is one embeddings API call per
+request. ``MicroBatchEmbeddings`` holds questions that arrive close together
+for up to ``max_wait`` seconds and embeds them with one batch call, then hands
+each waiting request its vector. A batch is sent as soon as it holds
+``max_batch_size`` questions.
+
+The wait adapts to the load. The wrapper tracks the average gap between
+arrivals and the batch calls in flight. A question that arrives while no
+call is in flight, and when the next one is not expected within
+``max_wait``, is sent at once, so at low traffic requests pay no batching
+delay. Under load (calls in flight, or arrivals closer than ``max_wait``)
+a batch waits for about the time ``max_batch_size`` questions take to
+arrive, at most ``max_wait``. Threaded callers share batches across
+threads. Asyncio callers share batches within their event loop, sent from a
+task so a cancelled request does not hold up the others.
+"""
+
+import asyncio
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from dotenv import load_dotenv
+from langchain_core.embeddings import Embeddings
+
+from ecommbot.metrics import REGISTRY
+
+load_dotenv()
+
+EMBED_BATCHING = os.getenv("EMBED_BATCHING", "on") == "on"
+EMBED_BATCH_MAX_SIZE = int(os.getenv("EMBED_BATCH_MAX_SIZE", "64"))
+EMBED_BATCH_MAX_WAIT_MS = float(os.getenv("EMBED_BATCH_MAX_WAIT_MS", "5"))
+
+EMBED_BATCH_SIZE = REGISTRY.summary("embed_batch_size", "Questions per micro-batched embedding call")
+EMBED_BATCH_WAIT = REGISTRY.summary(
+    "embed_batch_wait_seconds", "Time the first question of a batch waited for others, in seconds")
+
+# Weight of the newest gap in the average gap between arrivals
+_GAP_SMOOTHING = 0.2
+
+
+class Batch:
+    """Questions waiting to be embedded together, and the futures of their vectors."""
+
+    def __init__(self):
+        self.texts = []
+        self.futures = []
+        self.start = time.perf_counter()
+        self.full = threading.Event()
+        self.timer = None
+
+    def unique_texts(self):
+        return list(dict.fromkeys(self.texts))
+
+    def resolve(self, vectors=None, error=None):
+        """Complete every request's future, from ``vectors`` of ``unique_texts()`` or with ``error``."""
+        EMBED_BATCH_SIZE.observe(len(self.texts))
+        by_text = dict(zip(self.unique_texts(), vectors)) if error is None else {}
+        for text, future in zip(self.texts, self.futures):
+            # An asyncio request may have been cancelled while waiting
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(list(by_text[text]))
+
+
+class MicroBatchEmbeddings(Embeddings):
+    """Wrap an Embeddings backend so concurrent ``embed_query`` calls share batch requests.
+
+    Batches go to the backend's ``embed_queries`` / ``aembed_queries`` when
+    it has them (the embedding cache, which keeps them under its query keys),
+    otherwise to ``embed_documents`` / ``aembed_documents``. Document
+    embedding is passed through unchanged. The last ``recent_size`` query
+    vectors are kept, because the semantic cache and the retriever embed the
+    same question one after the other.
+
+    Args:
+        embeddings: The backend to wrap.
+        max_batch_size (int): Questions per batch call.
+        max_wait (float): Longest time, in seconds, a question waits for others.
+        recent_size (int): Recent query vectors kept.
+    """
+
+    def __init__(self, embeddings, max_batch_size=EMBED_BATCH_MAX_SIZE, max_wait=EMBED_BATCH_MAX_WAIT_MS / 1000,
+                 recent_size=256):
+        self.embeddings = embeddings
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.recent_size = recent_size
+        self._recent = OrderedDict()
+        self._gap = float("inf")
+        self._last_arrival = None
+        self._pending = None
+        self._in_flight = 0
+        self._loop_pending = weakref.WeakKeyDictionary()  # event loop -> pending Batch
+        self._tasks = set()
+        self._lock = threading.Lock()
+
+    def _arrive(self):
+        """Record an arrival and return how long a new batch should wait for more questions."""
+        now = time.perf_counter()
+        if self._last_arrival is not None:
+            gap = now - self._last_arrival
+            self._gap = gap if self._gap == float("inf") else (
+                _GAP_SMOOTHING * gap + (1 - _GAP_SMOOTHING) * self._gap)
+        self._last_arrival = now
+        if self._gap >= self.max_wait:
+            return self.max_wait if self._in_flight else 0.0
+        return min(self.max_wait, self._gap * (self.max_batch_size - 1))
+
+    def _started(self, delta):
+        with self._lock:
+            self._in_flight += delta
+
+    def _remember(self, texts, vectors):
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                self._recent[text] = vector
+                self._recent.move_to_end(text)
+            while len(self._recent) > self.recent_size:
+                self._recent.popitem(last=False)
+
+    def _recall(self, text):
+        with self._lock:
+            vector = self._recent.get(text)
+            if vector is None:
+                return None
+            self._recent.move_to_end(text)
+            return list(vector)
+
+    def _embed_batch(self, texts):
+        embed = getattr(self.embeddings, "embed_queries", None) or self.embeddings.embed_documents
+        vectors = embed(texts)
+        self._remember(texts, vectors)
+        return vectors
+
+    async def _aembed_batch(self, texts):
+        if hasattr(self.embeddings, "aembed_queries"):
+            vectors = await self.embeddings.aembed_queries(texts)
+        else:
+            vectors = await self.embeddings.aembed_documents(texts)
+        self._remember(texts, vectors)
+        return vectors
+
+    def _add(self, batch, text, future):
+        batch.texts.append(text)
+        batch.futures.append(future)
+        return len(batch.texts) >= self.max_batch_size
+
+    def _run(self, batch):
+        EMBED_BATCH_WAIT.observe(time.perf_counter() - batch.start)
+        self._started(1)
+        try:
+            vectors = self._embed_batch(batch.unique_texts())
+        except Exception as error:
+            batch.resolve(error=error)
+        else:
+            batch.resolve(vectors)
+        finally:
+            self._started(-1)
+
+    def embed_query(self, text):
+        vector = self._recall(text)
+        if vector is not None:
+            return vector
+        future = Future()
+        with self._lock:
+            window = self._arrive()
+            batch = self._pending
+            leads = batch is None
+            if leads:
+                batch = self._pending = Batch()
+            if self._add(batch, text, future):
+                self._pending = None
+                batch.full.set()
+        if leads:
+            # The first question of a batch waits for the others, then sends them all
+            if window > 0:
+                batch.full.wait(window)
+            with self._lock:
+                if self._pending is batch:
+                    self._pending = None
+            self._run(batch)
+        return future.result()
+
+    def _flush(self, loop, batch):
+        with self._lock:
+            if self._loop_pending.get(loop) is batch:
+                del self._loop_pending[loop]
+        if batch.timer is not None:
+            batch.timer.cancel()
+        EMBED_BATCH_WAIT.observe(time.perf_counter() - batch.start)
+        task = loop.create_task(self._arun(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _arun(self, batch):
+        self._started(1)
+        try:
+            vectors = await self._aembed_batch(batch.unique_texts())
+        except Exception as error:
+            batch.resolve(error=error)
+        else:
+            batch.resolve(vectors)
+        finally:
+            self._started(-1)
+
+    async def aembed_query(self, text):
+        vector = self._recall(text)
+        if vector is not None:
+            return vector
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            window = self._arrive()
+            batch = self._loop_pending.get(loop)
+            leads = batch is None
+            if leads:
+                batch = self._loop_pending[loop] = Batch()
+            full = self._add(batch, text, future)
+        if full or window <= 0:
+            self._flush(loop, batch)
+        elif leads:
+            batch.timer = loop.call_later(window, self._flush, loop, batch)
+        return await future
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+    async def aembed_documents(self, texts):
+        return await self.embeddings.aembed_documents(texts)
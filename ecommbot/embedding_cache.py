@@ -0,0 +1,204 @@
+"""
+Persistent, content-addressed cache in front of any LangChain ``Embeddings``.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import unicodedata
+
+import numpy as np
+from dotenv import load_dotenv
+from langchain_core.embeddings import Embeddings
+
+load_dotenv()
+
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", ".cache/embeddings.sqlite")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "1000000"))
+
+_SQL_CHUNK = 500
+
+
+def normalize_text(text):
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def model_name(embeddings):
+    """Best-effort identifier of the model behind an Embeddings object."""
+    name = getattr(embeddings, "model", None) or getattr(embeddings, "model_name", None)
+    name = name or type(embeddings).__name__
+    dimensions = getattr(embeddings, "dimensions", None)
+    return f"{name}:{dimensions}" if dimensions else name
+
+
+class CachedEmbeddings(Embeddings):
+    """Wrap an Embeddings backend with an SQLite cache and LRU eviction.
+
+    Entries are keyed by model name, query/document kind and normalized text.
+    Batch calls look up every text at once and only send the misses (deduplicated)
+    to the backend in a single request. The file is opened in WAL mode so
+    several processes can share it.
+
+    Args:
+        embeddings: The backend to wrap.
+        path (str): SQLite file, or ":memory:".
+        max_entries (int): Once exceeded, the least recently used tenth is evicted.
+        namespace (str): Cache namespace; defaults to the backend's model name.
+    """
+
+    def __init__(self, embeddings, path=EMBEDDING_CACHE_PATH,
+                 max_entries=EMBEDDING_CACHE_MAX_ENTRIES, namespace=None):
+        self.embeddings = embeddings
+        self.namespace = namespace or model_name(embeddings)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.backend_calls = 0
+        self._lock = threading.Lock()
+        self._clock = 0
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key BLOB PRIMARY KEY, vector BLOB NOT NULL, last_used INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used);
+        """)
+        row = self.conn.execute("SELECT COUNT(*), MAX(last_used) FROM embeddings").fetchone()
+        self._size = row[0]
+        self._clock = row[1] or 0
+
+    def _key(self, kind, text):
+        return hashlib.sha256(f"{self.namespace}\x1f{kind}\x1f{text}".encode("utf-8")).digest()
+
+    def _lookup(self, keys):
+        found = {}
+        with self._lock:
+            self._clock += 1
+            for i in range(0, len(keys), _SQL_CHUNK):
+                chunk = keys[i:i + _SQL_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                found.update(self.conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk))
+            if found:
+                with self.conn:
+                    self.conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?",
+                                          ((self._clock, key) for key in found))
+        return {key: np.frombuffer(blob, dtype=np.float32).tolist() for key, blob in found.items()}
+
+    def _count_existing(self, keys):
+        existing = 0
+        for i in range(0, len(keys), _SQL_CHUNK):
+            chunk = keys[i:i + _SQL_CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            existing += self.conn.execute(
+                f"SELECT COUNT(*) FROM embeddings WHERE key IN ({placeholders})", chunk).fetchone()[0]
+        return existing
+
+    def _store(self, keys, vectors):
+        with self._lock:
+            self._clock += 1
+            with self.conn:
+                # Keys already present (e.g. stored by another process) are overwritten, not added
+                existing = self._count_existing(keys)
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)",
+                    ((key, vector.tobytes(), self._clock)
+                     for key, vector in zip(keys, vectors)),
+                )
+            self._size += len(keys) - existing
+            if self._size > self.max_entries:
+                self._evict()
+
+    def _evict(self):
+        target = int(self.max_entries * 0.9)
+        # Other processes sharing the file may have added or evicted entries
+        self._size = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        with self.conn:
+            self.conn.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                (max(self._size - target, 0),),
+            )
+        self._size = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def _partition(self, kind, texts):
+        """``(keys, cached, missing)``: a key per text, the cached vectors and the texts to embed by key."""
+        texts = [normalize_text(text) for text in texts]
+        keys = [self._key(kind, text) for text in texts]
+        cached = self._lookup(list(dict.fromkeys(keys)))
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached:
+                missing.setdefault(key, text)
+        return keys, cached, missing
+
+    def _complete(self, keys, cached, missing, vectors):
+        if missing:
+            vectors = [np.asarray(vector, dtype=np.float32) for vector in vectors]
+            self._store(list(missing), vectors)
+            # Return misses at the same float32 precision a later hit would have
+            cached.update((key, vector.tolist()) for key, vector in zip(missing, vectors))
+
+        with self._lock:
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+            self.backend_calls += bool(missing)
+        return [list(cached[key]) for key in keys]
+
+    def _embed(self, kind, texts):
+        keys, cached, missing = self._partition(kind, texts)
+        vectors = None
+        if missing:
+            if kind == "query" and len(missing) == 1:
+                vectors = [self.embeddings.embed_query(next(iter(missing.values())))]
+            else:
+                vectors = self.embeddings.embed_documents(list(missing.values()))
+        return self._complete(keys, cached, missing, vectors)
+
+    async def _aembed(self, kind, texts):
+        keys, cached, missing = self._partition(kind, texts)
+        vectors = None
+        if missing:
+            if kind == "query" and len(missing) == 1:
+                vectors = [await self.embeddings.aembed_query(next(iter(missing.values())))]
+            else:
+                vectors = await self.embeddings.aembed_documents(list(missing.values()))
+        return self._complete(keys, cached, missing, vectors)
+
+    def embed_documents(self, texts):
+        return self._embed("document", texts)
+
+    def embed_query(self, text):
+        return self._embed("query", [text])[0]
+
+    def embed_queries(self, texts):
+        """Embed several queries with one backend call for the misses (used by the micro-batcher)."""
+        return self._embed("query", texts)
+
+    async def aembed_documents(self, texts):
+        return await self._aembed("document", texts)
+
+    async def aembed_query(self, text):
+        return (await self._aembed("query", [text]))[0]
+
+    async def aembed_queries(self, texts):
+        """Async ``embed_queries``: the misses go to the backend's async client."""
+        return await self._aembed("query", texts)
+
+    def stats(self):
+        """Hit/miss counters for this process."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "backend_calls": self.backend_calls,
+            "entries": self._size,
+        }
@@ -0,0 +1,100 @@
+"""
+Dictionary matcher for product and category names (token trie).
+
+Names are split into lowercase word tokens and stored in a trie, built once
+from a list of names or an alias -> name mapping. Matching tokenizes the text
+once and walks the trie from each position, so the cost grows with the text
+length (times the longest name, in tokens), not with the number of names.
+Matches always cover whole words, and overlapping matches resolve to the
+leftmost, then longest.
+"""
+
+import re
+
+# Trailing words that describe the product type rather than name the product
+GENERIC_SUFFIXES = frozenset({
+    "bluetooth", "headset", "headphones", "earphones", "earbuds", "neckband", "wired",
+    "speaker", "tws", "true",
+})
+_CUT_RE = re.compile(r"\s+(?:with|-|\|)\s+|\s*\(", re.IGNORECASE)
+_TOKEN_RE = re.compile(r"\w+")
+_END = ""  # trie key marking a complete name; never a token
+
+
+def _tokens(text):
+    return _TOKEN_RE.findall(text.lower())
+
+
+def product_aliases(name):
+    """Shorter names a user might type for a long marketplace title.
+
+    "BoAt Rockerz 235v2 with ASAP charging Version 5.0 Bluetooth Headset"
+    gives "BoAt Rockerz 235v2"; aliases shorter than two words are not used.
+    """
+    aliases = []
+    for candidate in (_CUT_RE.split(name, maxsplit=1)[0], name):
+        words = candidate.split()
+        while words and words[-1].lower() in GENERIC_SUFFIXES:
+            words.pop()
+        alias = " ".join(words)
+        if len(words) >= 2 and alias != name and alias not in aliases:
+            aliases.append(alias)
+    return aliases
+
+
+class EntityMatcher:
+    """Find mentions of known names in text.
+
+    Args:
+        entities: Iterable of names, or a mapping of surface form -> canonical name.
+    """
+
+    def __init__(self, entities):
+        if not isinstance(entities, dict):
+            entities = {name: name for name in entities}
+        self._root = {}
+        for surface, canonical in entities.items():
+            tokens = _tokens(surface)
+            if not tokens:
+                continue
+            node = self._root
+            for token in tokens:
+                node = node.setdefault(token, {})
+            node[_END] = canonical
+
+    @classmethod
+    def with_aliases(cls, names):
+        """Matcher over ``names`` plus their ``product_aliases``; aliases shared by several names are dropped."""
+        owners = {}
+        for name in names:
+            for alias in product_aliases(name):
+                owners.setdefault(tuple(_tokens(alias)), set()).add(name)
+        entities = {}
+        for name in names:
+            for alias in product_aliases(name):
+                if len(owners[tuple(_tokens(alias))]) == 1:
+                    entities[alias] = name
+        # Full names win over any alias with the same tokens
+        entities.update({name: name for name in names})
+        return cls(entities)
+
+    def finditer(self, text):
+        """Yield ``(first token, end token, name)`` for leftmost-longest, non-overlapping mentions."""
+        tokens = _tokens(text)
+        i, n = 0, len(tokens)
+        while i < n:
+            node, j, match = self._root.get(tokens[i]), i + 1, None
+            while node is not None:
+                if _END in node:
+                    match = (j, node[_END])
+                node = node.get(tokens[j]) if j < n else None
+                j += 1
+            if match is None:
+                i += 1
+                continue
+            yield i, match[0], match[1]
+            i = match[0]
+
+    def find(self, text):
+        """Names mentioned in ``text``, in order of appearance, without repeats."""
+        return list(dict.fromkeys(name for _, _, name in self.finditer(text)))
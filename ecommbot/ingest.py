@@ -1,43 +1,119 @@
-from langchain_astradb import AstraDBVectorStore
-from langchain_openai import OpenAIEmbeddings
 from dotenv import load_dotenv
+import argparse
 import os
-import pandas as pd
-from ecommbot.data_converter import dataconveter
+from ecommbot.bm25_index import BM25_INDEX_PATH, BM25Index
+from ecommbot.clients import LOCAL_INDEX_PATH, embeddings, vector_store
+from ecommbot.data_converter import DEFAULT_DATA_PATH, iter_document_batches
+from ecommbot.ingest_pipeline import BatchIngestor
+from ecommbot.local_vectorstore import LocalVectorStore
+from ecommbot.manifest import INGEST_MANIFEST_PATH, IngestManifest, assign_content_ids
+from ecommbot.product_aggregates import FLIPKART_COLUMNS, PRODUCT_AGGREGATES_PATH, ProductAggregates
 
 load_dotenv()
 
-OPENAI_API_KEY=os.getenv("OPENAI_API_KEY")
-ASTRA_DB_API_ENDPOINT=os.getenv("ASTRA_DB_API_ENDPOINT")
-ASTRA_DB_APPLICATION_TOKEN=os.getenv("ASTRA_DB_APPLICATION_TOKEN")
-ASTRA_DB_KEYSPACE=os.getenv("ASTRA_DB_KEYSPACE")
+LOCAL_INDEX_TYPE=os.getenv("LOCAL_INDEX_TYPE", "flat")
+IVF_NLIST=int(os.getenv("IVF_NLIST", "0"))
+INGEST_BATCH_SIZE=int(os.getenv("INGEST_BATCH_SIZE", "256"))
+INGEST_MAX_WORKERS=int(os.getenv("INGEST_MAX_WORKERS", "4"))
+INGEST_CHECKPOINT_PATH=os.getenv("INGEST_CHECKPOINT_PATH", ".cache/ingest_checkpoint.json")
 
-embedding = OpenAIEmbeddings(api_key=OPENAI_API_KEY)
+METADATA_COLUMNS={"product_name": "product_title", "product_id": "product_id"}
+
+def _source_key(path):
+    stat = os.stat(path)
+    return f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+def _new_documents(batches, manifest):
+    """Drop documents already in the manifest (or already queued in this run)."""
+    queued = set()
+    for docs in batches:
+        ids = [doc.id for doc in docs]
+        manifest.mark_seen(ids)
+        fresh = manifest.missing(ids) - queued
+        queued.update(fresh)
+        new_docs = []
+        for doc in docs:
+            if doc.id in fresh:
+                fresh.discard(doc.id)
+                new_docs.append(doc)
+        if new_docs:
+            yield new_docs
+
+def _delete(vstore, ids, batch_size):
+    for i in range(0, len(ids), batch_size):
+        vstore.delete(ids=ids[i:i + batch_size])
+
+def ingestdata(status, data_path=DEFAULT_DATA_PATH, incremental=False, prune=True):
+    # The process-wide store: repeated calls reuse its client and open connections
+    vstore = vector_store()
+    local = isinstance(vstore, LocalVectorStore)
 
-def ingestdata(status):
-    vstore = AstraDBVectorStore(
-            embedding=embedding,
-            collection_name="chatbotecomm",
-            api_endpoint=ASTRA_DB_API_ENDPOINT,
-            token=ASTRA_DB_APPLICATION_TOKEN,
-            namespace=ASTRA_DB_KEYSPACE,
-        )
-    
     storage=status
-    
+
     if storage==None:
-        docs=dataconveter()
-        inserted_ids = vstore.add_documents(docs)
+        manifest = IngestManifest(INGEST_MANIFEST_PATH)
+        # The local index is only durable once saved, so its manifest entries wait until then
+        stored_ids = []
+
+        def record(docs):
+            ids = [doc.id for doc in docs]
+            if local:
+                stored_ids.extend(ids)
+            else:
+                manifest.add(ids)
+
+        batches = assign_content_ids(iter_document_batches(data_path, metadata_columns=METADATA_COLUMNS))
+        if incremental:
+            # The manifest is updated after every stored batch, so it doubles as the checkpoint
+            batches = _new_documents(batches, manifest)
+        ingestor = BatchIngestor(
+            vstore,
+            embedding=embeddings(),
+            batch_size=INGEST_BATCH_SIZE,
+            max_workers=INGEST_MAX_WORKERS,
+            checkpoint_path=None if incremental or local else INGEST_CHECKPOINT_PATH,
+            source_key=_source_key(data_path),
+            on_batch=record,
+        )
+        stats = ingestor.run(batches)
+        stale = manifest.unseen() if incremental and prune else []
+        _delete(vstore, stale, INGEST_BATCH_SIZE)
+        if local:
+            if LOCAL_INDEX_TYPE == "ivf" and vstore.ann_index is None and len(vstore):
+                vstore.build_ann_index(nlist=IVF_NLIST or None)
+            vstore.save(LOCAL_INDEX_PATH)
+            manifest.add(stored_ids)
+        manifest.remove(stale)
+        removed = len(stale)
+        if stats.docs or removed:
+            manifest.bump_revision()
+        print(f"Manifest holds {len(manifest)} documents ({stats.docs} upserted, {removed} removed)")
+        if stats.docs or removed or not BM25Index.exists(BM25_INDEX_PATH):
+            # Lexical index is rebuilt from the source; it needs no embeddings, so this is cheap
+            lexical = BM25Index.build(
+                assign_content_ids(iter_document_batches(data_path, metadata_columns=METADATA_COLUMNS)),
+                BM25_INDEX_PATH)
+            print(f"BM25 index holds {len(lexical)} documents, {len(lexical.vocabulary)} terms")
+        if stats.docs or removed or not ProductAggregates.exists(PRODUCT_AGGREGATES_PATH):
+            aggregates = ProductAggregates.from_csv(data_path, FLIPKART_COLUMNS)
+            aggregates.save(PRODUCT_AGGREGATES_PATH)
+            print(f"Product aggregates cover {len(aggregates)} products")
+        manifest.close()
     else:
         return vstore
-    return vstore, inserted_ids
+    return vstore, stats
 
 if __name__=='__main__':
-    vstore,inserted_ids=ingestdata(None)
-    print(f"\nInserted {len(inserted_ids)} documents.")
+    parser = argparse.ArgumentParser(description="Ingest product reviews into the vector store")
+    parser.add_argument("--data", default=DEFAULT_DATA_PATH, help="review CSV to ingest")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only embed rows missing from the manifest and delete rows gone from the CSV")
+    parser.add_argument("--no-prune", action="store_true",
+                        help="with --incremental, keep rows that disappeared from the CSV")
+    args = parser.parse_args()
+    vstore,stats=ingestdata(None, data_path=args.data, incremental=args.incremental, prune=not args.no_prune)
+    print(f"\nInserted {stats.docs} documents ({stats.docs_per_sec:.1f} docs/sec).")
+    print(f"Embedding cache: {embeddings().stats()}")
     results = vstore.similarity_search("can you tell me the low budget sound basshead.")
     for res in results:
             print(f"* {res.page_content} [{res.metadata}]")
-            
-
-   
\ No newline at end of file
@@ -0,0 +1,206 @@
+"""
+Batched, resumable bulk ingestion into a LangChain vector store.
+
+The engine only relies on two small interfaces, so it runs against AstraDB in
+production and against ``InMemoryVectorStore`` + ``DeterministicFakeEmbedding``
+offline:
+
+* vector store: ``add_documents(docs, ids=...)``, or ``add_embeddings(
+  text_embeddings, metadatas, ids)`` when vectors are computed by the engine;
+* embedder (optional): any LangChain ``Embeddings``.
+"""
+
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from itertools import chain, islice
+
+
+@dataclass
+class IngestStats:
+    docs: int = 0
+    batches: int = 0
+    skipped_batches: int = 0
+    seconds: float = 0.0
+
+    @property
+    def docs_per_sec(self):
+        return self.docs / self.seconds if self.seconds else 0.0
+
+
+class IngestCheckpoint:
+    """Durable record of which batches have been stored.
+
+    Batches can finish out of order, so progress is kept as a watermark (every
+    batch below it is done) plus the set of finished batches above it. The file
+    is rewritten atomically after every batch.
+    """
+
+    def __init__(self, path, source_key=""):
+        self.path = path
+        self.source_key = source_key
+        self.watermark = 0
+        self.completed = set()
+        self.docs = 0
+        self._load()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            state = json.load(f)
+        if state.get("source_key") != self.source_key:
+            print(f"Ignoring checkpoint {self.path}: it belongs to a different source")
+            return
+        self.watermark = state["watermark"]
+        self.completed = set(state["completed"])
+        self.docs = state["docs"]
+
+    def is_done(self, batch_index):
+        return batch_index < self.watermark or batch_index in self.completed
+
+    def mark_done(self, batch_index, n_docs):
+        self.completed.add(batch_index)
+        while self.watermark in self.completed:
+            self.completed.remove(self.watermark)
+            self.watermark += 1
+        self.docs += n_docs
+        self._save()
+
+    def _save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "source_key": self.source_key,
+                "watermark": self.watermark,
+                "completed": sorted(self.completed),
+                "docs": self.docs,
+            }, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def rebatch(batches, batch_size):
+    """Re-chunk an iterable of Document lists into lists of ``batch_size``."""
+    docs = chain.from_iterable(batches)
+    while True:
+        batch = list(islice(docs, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+class BatchIngestor:
+    """Embed and insert Document batches through a bounded worker pool.
+
+    Args:
+        vstore: Target vector store.
+        embedding: Optional embedder. Used only when the store accepts
+            precomputed vectors via ``add_embeddings``; otherwise the store
+            embeds each batch itself inside ``add_documents``.
+        batch_size (int): Documents per embed/insert call.
+        max_workers (int): Batches embedded and inserted concurrently.
+        checkpoint_path (str): JSON checkpoint file; ``None`` disables resume.
+        source_key (str): Identifies the input, so a checkpoint written for a
+            different file is not reused.
+        max_retries (int): Retries per batch before the run is aborted.
+        on_batch (callable): Called with each stored batch, from the caller's
+            thread, in completion order.
+        report_every (float): Seconds between progress lines.
+    """
+
+    def __init__(self, vstore, embedding=None, batch_size=256, max_workers=4,
+                 checkpoint_path=None, source_key="", max_retries=2, on_batch=None,
+                 report_every=5.0):
+        self.vstore = vstore
+        self.embedding = embedding
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.checkpoint = IngestCheckpoint(checkpoint_path, f"{source_key}:{batch_size}")
+        self.max_retries = max_retries
+        self.on_batch = on_batch
+        self.report_every = report_every
+
+    def _store_batch(self, docs):
+        ids = [doc.id for doc in docs]
+        if None in ids:
+            ids = None
+        for attempt in range(self.max_retries + 1):
+            try:
+                if self.embedding is not None and hasattr(self.vstore, "add_embeddings"):
+                    texts = [doc.page_content for doc in docs]
+                    vectors = self.embedding.embed_documents(texts)
+                    self.vstore.add_embeddings(
+                        list(zip(texts, vectors)),
+                        metadatas=[doc.metadata for doc in docs],
+                        ids=ids,
+                    )
+                else:
+                    self.vstore.add_documents(docs, ids=ids)
+                return docs
+            except Exception:
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(2 ** attempt)
+
+    def run(self, batches):
+        """Ingest an iterable of Document lists, skipping batches already checkpointed.
+
+        Returns:
+            IngestStats: Counts and throughput for this run.
+        """
+        stats = IngestStats()
+        start = time.perf_counter()
+        last_report = start
+        in_flight = {}
+        max_in_flight = self.max_workers * 2
+
+        def finish(future):
+            nonlocal last_report
+            batch_index = in_flight.pop(future)
+            docs = future.result()
+            self.checkpoint.mark_done(batch_index, len(docs))
+            stats.docs += len(docs)
+            stats.batches += 1
+            stats.seconds = time.perf_counter() - start
+            if self.on_batch is not None:
+                self.on_batch(docs)
+            if time.perf_counter() - last_report >= self.report_every:
+                last_report = time.perf_counter()
+                print(f"Ingested {self.checkpoint.docs} documents "
+                      f"({stats.docs_per_sec:.1f} docs/sec)")
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            try:
+                for batch_index, docs in enumerate(rebatch(batches, self.batch_size)):
+                    if self.checkpoint.is_done(batch_index):
+                        stats.skipped_batches += 1
+                        continue
+                    if len(in_flight) >= max_in_flight:
+                        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            finish(future)
+                    in_flight[pool.submit(self._store_batch, docs)] = batch_index
+                for future in list(in_flight):
+                    finish(future)
+            finally:
+                # Record whatever finished before a failure so the next run resumes there
+                for future in list(in_flight):
+                    if not future.cancel() and future.exception() is None:
+                        finish(future)
+
+        stats.seconds = time.perf_counter() - start
+        self.checkpoint.clear()
+        print(f"Ingested {stats.docs} documents in {stats.seconds:.1f}s "
+              f"({stats.docs_per_sec:.1f} docs/sec, {stats.skipped_batches} batches resumed)")
+        return stats
@@ -0,0 +1,160 @@
+"""
+Local query-intent classifier.
+
+Predicts the three intents of the data generator's QueryClassifier
+(category_queries, feature_queries, product_queries) without an LLM call:
+word and character n-gram TF-IDF features (the character n-grams absorb
+typos such as "speeker") feed a logistic regression. It is trained at
+startup, in milliseconds, on the LLM-labelled queries of the synthetic
+testset plus a few seed examples per intent. Single queries are scored
+without going through the scikit-learn pipeline (whose per-call overhead is
+a few milliseconds): the fitted analyzers, vocabularies, IDF weights and
+coefficients are applied directly, in about 0.15 ms.
+"""
+
+import json
+import math
+import os
+
+import numpy as np
+from dotenv import load_dotenv
+
+from ecommbot.metrics import REGISTRY
+
+load_dotenv()
+
+INTENT_TRAINING_PATH = os.getenv("INTENT_TRAINING_PATH", "data-generator/ragas_synthetic_testset.json")
+INTENT_MIN_CONFIDENCE = float(os.getenv("INTENT_MIN_CONFIDENCE", "0.6"))
+
+INTENTS = ("category_queries", "feature_queries", "product_queries")
+
+# Hand-labelled examples, so every intent is represented however the testset came out
+SEED_QUERIES = {
+    "category_queries": [
+        "What are the best laptops?",
+        "Show me smartphones",
+        "Which category should I choose?",
+        "best bluetooth headphones under 2000",
+        "which earbuds should I buy?",
+        "recommend some good wireless earphones",
+        "top rated speakers",
+        "what are the best budget wearables?",
+        "list the headsets you have",
+        "suggest a good neckband for the gym",
+    ],
+    "feature_queries": [
+        "How's the battery life?",
+        "What about the camera quality?",
+        "Is the microphone good?",
+        "how long does the battery last on a full charge?",
+        "does it support fast charging?",
+        "what is the bluetooth range?",
+        "is the bass strong?",
+        "how good is the noise cancellation?",
+        "is it comfortable for long hours?",
+        "is it water resistant?",
+    ],
+    "product_queries": [
+        "What do people think about iPhone?",
+        "Is this product worth it?",
+        "Tell me about this laptop",
+        "what do reviewers say about the realme Buds Q?",
+        "is the boAt Rockerz 235v2 worth buying?",
+        "any complaints about the FitTrack Ultra?",
+        "should I buy the DevBook 13?",
+        "what are the pros and cons of the AudiophileMax?",
+        "how do customers rate the GalaxyWave S5?",
+        "tell me about the BassBoost Speaker",
+    ],
+}
+
+INTENT_PREDICTIONS = {intent: REGISTRY.counter(f"intent_{intent}_total", f"Chat questions classified as {intent}")
+                      for intent in INTENTS}
+
+
+def load_labelled_queries(path=INTENT_TRAINING_PATH):
+    """``(queries, intents)`` from a testset written by the data generator; empty if the file is missing."""
+    if not os.path.exists(path):
+        return [], []
+    with open(path, encoding="utf-8") as f:
+        items = [item for item in json.load(f)["synthetic_testset"] if item.get("query_type") in INTENTS]
+    return [item["query"] for item in items], [item["query_type"] for item in items]
+
+
+class IntentClassifier:
+    """TF-IDF + logistic-regression intent model."""
+
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+        self.classes = [str(intent) for intent in pipeline.classes_]
+        features, model = pipeline.steps[0][1], pipeline.steps[-1][1]
+        coef = model.coef_
+        self._intercept = model.intercept_
+        self._vectorizers = []
+        offset = 0
+        for _, vectorizer in features.transformer_list:
+            size = len(vectorizer.vocabulary_)
+            self._vectorizers.append((vectorizer.build_analyzer(), vectorizer.vocabulary_, vectorizer.idf_,
+                                      coef[:, offset:offset + size]))
+            offset += size
+
+    @classmethod
+    def train(cls, queries, intents, seeds=True):
+        """Fit on ``queries`` labelled with ``intents``, plus ``SEED_QUERIES`` unless ``seeds`` is False."""
+        # scikit-learn takes over a second to import; only training needs it
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.pipeline import FeatureUnion, make_pipeline
+
+        queries, intents = list(queries), list(intents)
+        if seeds:
+            for intent, examples in SEED_QUERIES.items():
+                queries += examples
+                intents += [intent] * len(examples)
+        features = FeatureUnion([
+            ("words", TfidfVectorizer(ngram_range=(1, 2), sublinear_tf=True)),
+            ("chars", TfidfVectorizer(analyzer="char_wb", ngram_range=(2, 4), sublinear_tf=True)),
+        ])
+        pipeline = make_pipeline(features, LogisticRegression(C=10.0, max_iter=1000))
+        pipeline.fit(queries, intents)
+        return cls(pipeline)
+
+    @classmethod
+    def from_testset(cls, path=INTENT_TRAINING_PATH):
+        return cls.train(*load_labelled_queries(path))
+
+    def predict_proba(self, queries):
+        """Probability of each intent in ``self.classes``, one row per query."""
+        return self.pipeline.predict_proba(queries)
+
+    def _proba(self, query):
+        """``predict_proba`` for one query: per-vectorizer sublinear TF-IDF, L2-normalized, times the coefficients."""
+        scores = self._intercept.copy()
+        for analyze, vocabulary, idf, coef in self._vectorizers:
+            counts = {}
+            for term in analyze(query):
+                j = vocabulary.get(term)
+                if j is not None:
+                    counts[j] = counts.get(j, 0) + 1
+            if not counts:
+                continue
+            columns = list(counts)
+            weights = np.array([1.0 + math.log(n) for n in counts.values()]) * idf[columns]
+            scores += coef[:, columns] @ (weights / np.linalg.norm(weights))
+        if len(scores) == 1:
+            # Two intents: one logit for the second class
+            p = 1.0 / (1.0 + math.exp(-scores[0]))
+            return np.array([1.0 - p, p])
+        scores = np.exp(scores - scores.max())
+        return scores / scores.sum()
+
+    def predict(self, query):
+        """``(intent, probability)`` for one query."""
+        probabilities = self._proba(query)
+        best = int(np.argmax(probabilities))
+        INTENT_PREDICTIONS[self.classes[best]].inc()
+        return self.classes[best], float(probabilities[best])
+
+    def is_category_query(self, query, min_confidence=INTENT_MIN_CONFIDENCE):
+        intent, probability = self.predict(query)
+        return intent == "category_queries" and probability >= min_confidence
@@ -0,0 +1,322 @@
+"""
+In-process vector store backed by a contiguous float32 NumPy matrix.
+
+Vectors are L2-normalized on insert, so a single BLAS matrix-vector product
+gives cosine similarity against the whole catalogue. ``product_name`` is
+dictionary-encoded into an int32 column, so filtering on it is a vectorized
+mask rather than a scan over metadata dicts. The index can be saved to a
+directory and loaded back memory-mapped.
+
+For large catalogues an IVF index (see ``ecommbot.ann_index``) can be built
+over the matrix; unfiltered searches then scan only ``nprobe`` inverted lists.
+"""
+
+import json
+import os
+import shutil
+import threading
+import uuid
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+from ecommbot.ann_index import IVFIndex, top_k
+
+_NO_PRODUCT = -1
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _replace_file(path, write):
+    """Write through a temporary file so readers (and memory maps) never see a partial file."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+class LocalVectorStore(VectorStore):
+    """LangChain VectorStore holding every vector in one NumPy matrix.
+
+    Args:
+        embedding: Embeddings used for queries and for ``add_texts``.
+        capacity (int): Initial number of rows to allocate; grows by doubling.
+        nprobe (int): Default number of IVF lists scanned per query.
+    """
+
+    def __init__(self, embedding, capacity=1024, nprobe=8):
+        self.embedding = embedding
+        self.nprobe = nprobe
+        self._ann = None
+        self._capacity = capacity
+        self._size = 0
+        self._vectors = None
+        self._products = np.full(capacity, _NO_PRODUCT, dtype=np.int32)
+        self._product_codes = {}
+        self._ids = []
+        self._id_to_row = {}
+        self._texts = []
+        self._metadatas = []
+        self._lock = threading.RLock()
+
+    @property
+    def embeddings(self):
+        return self.embedding
+
+    def __len__(self):
+        return self._size
+
+    def _reserve(self, extra, dim):
+        needed = self._size + extra
+        if self._vectors is None:
+            self._capacity = max(self._capacity, needed)
+            self._vectors = np.empty((self._capacity, dim), dtype=np.float32)
+            self._products = np.full(self._capacity, _NO_PRODUCT, dtype=np.int32)
+            return
+        if self._vectors.shape[1] != dim:
+            raise ValueError(f"Expected {self._vectors.shape[1]}-dimensional vectors, got {dim}")
+        if needed <= self._capacity and self._vectors.flags.writeable:
+            return
+        # Grow by doubling, or copy a read-only memory-mapped matrix into memory
+        capacity = max(needed, self._capacity * 2) if needed > self._capacity else self._capacity
+        vectors = np.empty((capacity, dim), dtype=np.float32)
+        vectors[:self._size] = self._vectors[:self._size]
+        products = np.full(capacity, _NO_PRODUCT, dtype=np.int32)
+        products[:self._size] = self._products[:self._size]
+        self._vectors, self._products, self._capacity = vectors, products, capacity
+
+    def _product_code(self, metadata):
+        name = metadata.get("product_name")
+        if name is None:
+            return _NO_PRODUCT
+        return self._product_codes.setdefault(name, len(self._product_codes))
+
+    def add_embeddings(self, text_embeddings, metadatas=None, ids=None, **kwargs):
+        """Add precomputed vectors; rows with an existing id are overwritten."""
+        text_embeddings = list(text_embeddings)
+        if not text_embeddings:
+            return []
+        texts = [text for text, _ in text_embeddings]
+        vectors = _normalize([vector for _, vector in text_embeddings])
+        metadatas = list(metadatas) if metadatas is not None else [{} for _ in texts]
+        ids = list(ids) if ids is not None else [str(uuid.uuid4()) for _ in texts]
+
+        with self._lock:
+            self._ann = None
+            self._reserve(len(texts), vectors.shape[1])
+            for text, vector, metadata, doc_id in zip(texts, vectors, metadatas, ids):
+                row = self._id_to_row.get(doc_id)
+                if row is None:
+                    row = self._size
+                    self._size += 1
+                    self._id_to_row[doc_id] = row
+                    self._ids.append(doc_id)
+                    self._texts.append(text)
+                    self._metadatas.append(metadata)
+                else:
+                    self._texts[row] = text
+                    self._metadatas[row] = metadata
+                self._vectors[row] = vector
+                self._products[row] = self._product_code(metadata)
+        return ids
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        vectors = self.embedding.embed_documents(texts)
+        return self.add_embeddings(zip(texts, vectors), metadatas=metadatas, ids=ids)
+
+    def delete(self, ids=None, **kwargs):
+        """Delete rows by id, moving the last row into each freed slot."""
+        if ids is None:
+            return False
+        if self._vectors is None:
+            return True
+        with self._lock:
+            self._ann = None
+            self._reserve(0, self._vectors.shape[1])
+            for doc_id in ids:
+                row = self._id_to_row.pop(doc_id, None)
+                if row is None:
+                    continue
+                last = self._size - 1
+                if row != last:
+                    moved_id = self._ids[last]
+                    self._vectors[row] = self._vectors[last]
+                    self._products[row] = self._products[last]
+                    self._ids[row] = moved_id
+                    self._texts[row] = self._texts[last]
+                    self._metadatas[row] = self._metadatas[last]
+                    self._id_to_row[moved_id] = row
+                self._ids.pop()
+                self._texts.pop()
+                self._metadatas.pop()
+                self._size = last
+        return True
+
+    @property
+    def ann_index(self):
+        """The IVF index, or None if it was never built or the data changed since."""
+        return self._ann
+
+    def build_ann_index(self, nlist=None, **kwargs):
+        """Train an IVF index over the current vectors; any later write drops it."""
+        with self._lock:
+            self._ann = IVFIndex.train(self._vectors[:self._size], nlist=nlist, **kwargs)
+        return self._ann
+
+    def get_by_ids(self, ids):
+        rows = [self._id_to_row[doc_id] for doc_id in ids if doc_id in self._id_to_row]
+        return [self._document(row) for row in rows]
+
+    def _document(self, row):
+        return Document(id=self._ids[row], page_content=self._texts[row],
+                        metadata=dict(self._metadatas[row]))
+
+    def _candidate_rows(self, filter):
+        """Rows allowed by ``filter``, or None when every row is allowed."""
+        if not filter:
+            return None
+        size = self._size
+        mask = np.ones(size, dtype=bool)
+        for key, value in filter.items():
+            if isinstance(value, dict):
+                # Mongo-style {"$in": [...]}, the form AstraDB filters use
+                value = value["$in"]
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            if key == "product_name":
+                codes = [self._product_codes[v] for v in values if v in self._product_codes]
+                mask &= np.isin(self._products[:size], codes)
+            else:
+                mask &= np.fromiter((m.get(key) in values for m in self._metadatas[:size]),
+                                    dtype=bool, count=size)
+        return np.flatnonzero(mask)
+
+    def _search(self, embedding, k, filter, nprobe, exact):
+        """Return (rows, scores) of the top-k matches, best first."""
+        if self._size == 0:
+            return [], []
+        query = _normalize(embedding)
+        rows = self._candidate_rows(filter)
+        if rows is None and self._ann is not None and not exact:
+            return self._ann.search(query, k, nprobe or self.nprobe)
+        if rows is None:
+            scores = self._vectors[:self._size] @ query
+            best = top_k(scores, k)
+            return best, scores[best]
+        if len(rows) == 0:
+            return [], []
+        scores = self._vectors[rows] @ query
+        best = top_k(scores, k)
+        return rows[best], scores[best]
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4, filter=None, nprobe=None,
+                                               exact=False, **kwargs):
+        """Top-k by cosine similarity, optionally restricted by metadata ``filter``.
+
+        ``filter`` maps metadata keys to a value, a list of accepted values, or
+        ``{"$in": [...]}``.
+        Unfiltered searches go through the IVF index when one is built, scanning
+        ``nprobe`` lists; ``exact=True`` forces a full scan. Filtered searches are
+        always exact, over the matching rows only.
+        """
+        rows, scores = self._search(embedding, k, filter, nprobe, exact)
+        return [(self._document(row), float(score)) for row, score in zip(rows, scores)]
+
+    def similarity_search_with_embedding_by_vector(self, embedding, k=4, filter=None, nprobe=None,
+                                                   exact=False, **kwargs):
+        """Like ``similarity_search_by_vector`` but also returns each hit's (unit-norm) vector."""
+        rows, _ = self._search(embedding, k, filter, nprobe, exact)
+        return [(self._document(row), self._vectors[row].tolist()) for row in rows]
+
+    async def asimilarity_search_with_embedding_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        return self.similarity_search_with_embedding_by_vector(embedding, k, filter, **kwargs)
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, filter, **kwargs)]
+
+    def similarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        return self.similarity_search_with_score_by_vector(
+            self.embedding.embed_query(query), k, filter, **kwargs)
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter, **kwargs)]
+
+    async def asimilarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        # Only the embedding call does I/O; the search itself is a short CPU-bound scan
+        embedding = await self.embedding.aembed_query(query)
+        return self.similarity_search_with_score_by_vector(embedding, k, filter, **kwargs)
+
+    async def asimilarity_search(self, query, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in await self.asimilarity_search_with_score(query, k, filter, **kwargs)]
+
+    async def asimilarity_search_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        return self.similarity_search_by_vector(embedding, k, filter, **kwargs)
+
+    def _select_relevance_score_fn(self):
+        return lambda score: (score + 1.0) / 2.0
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, **kwargs):
+        store = cls(embedding, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
+
+    def save(self, path):
+        """Write the index to ``path`` (a directory), replacing any previous copy."""
+        os.makedirs(path, exist_ok=True)
+        with self._lock:
+            size = self._size
+            if self._vectors is not None:
+                _replace_file(os.path.join(path, "vectors.npy"),
+                              lambda f: np.save(f, self._vectors[:size]))
+            _replace_file(os.path.join(path, "products.npy"),
+                          lambda f: np.save(f, self._products[:size]))
+            _replace_file(os.path.join(path, "products.json"),
+                          lambda f: f.write(json.dumps(list(self._product_codes),
+                                                       ensure_ascii=False).encode("utf-8")))
+
+            def write_documents(f):
+                for row in range(size):
+                    record = {"id": self._ids[row], "text": self._texts[row],
+                              "metadata": self._metadatas[row]}
+                    f.write(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+
+            _replace_file(os.path.join(path, "documents.jsonl"), write_documents)
+            ann_path = os.path.join(path, "ivf")
+            if self._ann is not None:
+                self._ann.save(ann_path)
+            elif IVFIndex.exists(ann_path):
+                shutil.rmtree(ann_path)
+
+    @classmethod
+    def load(cls, path, embedding, mmap=True, **kwargs):
+        """Load an index written by ``save``; vectors are memory-mapped read-only by default.
+
+        The first write after a memory-mapped load copies the matrix into memory.
+        """
+        store = cls(embedding, **kwargs)
+        vectors_path = os.path.join(path, "vectors.npy")
+        if not os.path.exists(vectors_path):
+            return store
+        store._vectors = np.load(vectors_path, mmap_mode="r" if mmap else None)
+        store._products = np.load(os.path.join(path, "products.npy"))
+        store._size = store._capacity = len(store._vectors)
+        with open(os.path.join(path, "products.json"), encoding="utf-8") as f:
+            store._product_codes = {name: code for code, name in enumerate(json.load(f))}
+        with open(os.path.join(path, "documents.jsonl"), encoding="utf-8") as f:
+            for row, line in enumerate(f):
+                record = json.loads(line)
+                store._ids.append(record["id"])
+                store._texts.append(record["text"])
+                store._metadatas.append(record["metadata"])
+                store._id_to_row[record["id"]] = row
+        ann_path = os.path.join(path, "ivf")
+        if IVFIndex.exists(ann_path):
+            store._ann = IVFIndex.load(ann_path, mmap=mmap)
+        return store
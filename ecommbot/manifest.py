@@ -0,0 +1,113 @@
+"""
+Content hashes and the local manifest of reviews already stored in the vector store.
+"""
+
+import hashlib
+import os
+import sqlite3
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+INGEST_MANIFEST_PATH = os.getenv("INGEST_MANIFEST_PATH", ".cache/ingest_manifest.sqlite")
+
+_SQL_CHUNK = 500
+
+
+def content_hash(doc):
+    """Stable id for a review: its product id (or title) plus whitespace-normalized text."""
+    product_key = doc.metadata.get("product_id") or doc.metadata.get("product_name", "")
+    review = " ".join(doc.page_content.split())
+    return hashlib.sha1(f"{product_key}\x1f{review}".encode("utf-8")).hexdigest()
+
+
+def assign_content_ids(batches):
+    """Set ``Document.id`` to the content hash for every document in a batch stream."""
+    for docs in batches:
+        for doc in docs:
+            doc.id = content_hash(doc)
+        yield docs
+
+
+def _chunks(items, size=_SQL_CHUNK):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class IngestManifest:
+    """SQLite record of every document id embedded and stored so far.
+
+    ``revision`` increases whenever stored content changes, so caches built on
+    top of the vector store can tell when they are stale.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS documents (id TEXT PRIMARY KEY, ingested_at REAL);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TEMP TABLE IF NOT EXISTS seen (id TEXT PRIMARY KEY);
+        """)
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def missing(self, ids):
+        """Return the subset of ``ids`` that is not in the manifest."""
+        present = set()
+        for chunk in _chunks(ids):
+            placeholders = ",".join("?" * len(chunk))
+            present.update(row[0] for row in self.conn.execute(
+                f"SELECT id FROM documents WHERE id IN ({placeholders})", chunk))
+        return set(ids) - present
+
+    def add(self, ids):
+        now = time.time()
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO documents VALUES (?, ?)",
+                                  ((doc_id, now) for doc_id in ids))
+
+    def remove(self, ids):
+        with self.conn:
+            self.conn.executemany("DELETE FROM documents WHERE id = ?", ((doc_id,) for doc_id in ids))
+
+    def mark_seen(self, ids):
+        """Record ids present in the current scan of the source file."""
+        self.conn.executemany("INSERT OR IGNORE INTO seen VALUES (?)", ((doc_id,) for doc_id in ids))
+
+    def unseen(self):
+        """Ids in the manifest that were not seen in the current scan."""
+        return [row[0] for row in self.conn.execute(
+            "SELECT id FROM documents WHERE id NOT IN (SELECT id FROM seen)")]
+
+    def reset_scan(self):
+        self.conn.execute("DELETE FROM seen")
+
+    def revision(self):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()
+        return int(row[0]) if row else 0
+
+    def bump_revision(self):
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('revision', ?)",
+                              (str(self.revision() + 1),))
+
+    def close(self):
+        self.conn.close()
+
+
+def read_revision(path=INGEST_MANIFEST_PATH):
+    """Current manifest revision, or 0 if nothing has been ingested yet."""
+    if not os.path.exists(path):
+        return 0
+    manifest = IngestManifest(path)
+    try:
+        return manifest.revision()
+    finally:
+        manifest.close()
@@ -0,0 +1,117 @@
+"""
+Minimal in-process metrics registry rendered in the Prometheus text format.
+"""
+
+import threading
+from collections import deque
+
+import numpy as np
+
+
+class Counter:
+    """Monotonically increasing value."""
+
+    type = "counter"
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1.0):
+        with self._lock:
+            self.value += amount
+
+    def samples(self):
+        yield self.name, {}, self.value
+
+
+class Gauge:
+    """Value computed by ``fn`` at scrape time."""
+
+    type = "gauge"
+
+    def __init__(self, name, help, fn):
+        self.name = name
+        self.help = help
+        self.fn = fn
+
+    def samples(self):
+        yield self.name, {}, self.fn()
+
+
+class Summary:
+    """Count, sum and quantiles of observed values, per label set.
+
+    Quantiles are computed at scrape time over the last ``window`` observations
+    of each label set, so they follow recent traffic.
+    """
+
+    type = "summary"
+
+    def __init__(self, name, help, quantiles=(0.5, 0.95, 0.99), window=1024):
+        self.name = name
+        self.help = help
+        self.quantiles = quantiles
+        self.window = window
+        self._series = {}  # sorted label items -> [count, sum, deque of recent values]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0, 0.0, deque(maxlen=self.window)]
+            series[0] += 1
+            series[1] += value
+            series[2].append(value)
+
+    def samples(self):
+        with self._lock:
+            series = [(dict(key), count, total, np.array(recent))
+                      for key, (count, total, recent) in self._series.items()]
+        for labels, count, total, recent in series:
+            for q, value in zip(self.quantiles, np.quantile(recent, self.quantiles)):
+                yield self.name, {**labels, "quantile": q}, float(value)
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, count
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        """Register ``metric``, or return the one already registered under its name."""
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help):
+        return self.register(Counter(name, help))
+
+    def gauge(self, name, help, fn):
+        return self.register(Gauge(name, help, fn))
+
+    def summary(self, name, help, **kwargs):
+        return self.register(Summary(name, help, **kwargs))
+
+    def render(self):
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
@@ -0,0 +1,309 @@
+"""
+Per-product and per-category review statistics, built once and stored in SQLite.
+
+The statistics (average rating, review count, features and attributes
+mentioned, sentiment distribution, a few sample reviews) are computed with a
+single pandas ``groupby``. They are saved to an indexed SQLite file and read
+back into dictionaries, so a lookup is a dict access. The data generator
+builds its knowledge-graph documents from them, and the chat path uses them
+to answer questions such as "average rating of X" (and, with the intent
+classifier, "best earbuds?") without retrieval or an LLM call.
+"""
+
+import json
+import os
+import re
+import sqlite3
+
+import numpy as np
+from dotenv import load_dotenv
+from langchain_core.runnables import Runnable
+
+from ecommbot.entity_matcher import EntityMatcher
+from ecommbot.metrics import REGISTRY
+
+load_dotenv()
+
+PRODUCT_AGGREGATES_PATH = os.getenv("PRODUCT_AGGREGATES_PATH", ".cache/product_aggregates.sqlite")
+
+SENTIMENTS = ("positive", "neutral", "negative")
+SAMPLE_REVIEWS = 5
+TOP_PRODUCTS = 3
+
+# Column names of data/product_reviews.csv (data generator) and of the Flipkart review CSV (chat)
+REVIEW_COLUMNS = {"product": "product", "category": "category", "rating": "rating",
+                  "review": "review_text", "feature": "feature_mentioned",
+                  "attribute": "attribute_mentioned", "sentiment": "sentiment"}
+FLIPKART_COLUMNS = {"product": "product_title", "rating": "rating", "review": "review"}
+
+PRODUCT_FIELDS = ("category", "average_rating", "review_count", "features", "attributes",
+                  "sentiment_distribution", "sample_reviews")
+CATEGORY_FIELDS = ("products", "average_rating", "review_count", "features", "attributes")
+_JSON_FIELDS = {"features", "attributes", "sentiment_distribution", "sample_reviews", "products"}
+
+# Only explicit requests for the statistic: "is it rated well for bass?" is an opinion question for RAG
+RATING_RE = re.compile(r"\b(average|overall|mean)( customer| user| star)? (rating|score)\b"
+                       r"|\bwhat(?: is|'s) (?:the |its )?(?:star |customer )?rating\b|\bhow many stars\b")
+COUNT_RE = re.compile(r"\b(how many|number of|count of)( customer| user)? reviews?\b"
+                      r"(?! (?:mention|say|talk|complain|praise|call|are|were)\b)")
+SENTIMENT_RE = re.compile(r"\b(sentiment|positive|negative)\b")
+
+STRUCTURED_ANSWERS_TOTAL = REGISTRY.counter(
+    "structured_answers_total", "Questions answered from product aggregates without the LLM")
+
+
+def _group_lists(keys, values, index, unique=False, limit=None):
+    """Per-key lists of ``values``, for each key of ``index``, in row order.
+
+    ``unique`` drops missing and repeated values; ``limit`` keeps the first
+    ``limit`` values. Rows are stably sorted by key and cut at the key
+    boundaries, instead of calling a Python function per group.
+    """
+    import pandas as pd
+
+    frame = pd.DataFrame({"key": keys, "value": values})
+    if unique:
+        frame = frame.dropna().drop_duplicates()
+    if limit is not None:
+        frame = frame.groupby("key", sort=False).head(limit)
+    codes = index.get_indexer(frame["key"])
+    order = np.argsort(codes, kind="stable")
+    codes, grouped = codes[order], frame["value"].to_numpy()[order]
+    # Rows whose key is not in index (code -1) sort first and fall outside every slice
+    bounds = np.searchsorted(codes, np.arange(len(index) + 1)).tolist()
+    grouped = grouped.tolist()
+    return [grouped[start:end] for start, end in zip(bounds, bounds[1:])]
+
+
+class ProductAggregates:
+    """Product and category statistics keyed by name.
+
+    ``products`` maps a product name to a dict with the keys in
+    ``PRODUCT_FIELDS``; ``categories`` maps a category to ``CATEGORY_FIELDS``.
+    Fields whose source column is absent are None.
+    """
+
+    def __init__(self, products, categories):
+        self.products = products
+        self.categories = categories
+        self._matcher = None
+        self._category_matcher = None
+
+    def __len__(self):
+        return len(self.products)
+
+    @classmethod
+    def from_dataframe(cls, df, columns=None):
+        """Aggregate a reviews DataFrame; ``columns`` maps roles to column names (see REVIEW_COLUMNS)."""
+        import pandas as pd
+
+        columns = {**REVIEW_COLUMNS, **(columns or {})}
+        present = {role: column for role, column in columns.items() if column in df.columns}
+        product = present["product"]
+
+        # Built-in (Cython) aggregations in one groupby; list-valued ones by sorting and splitting
+        aggregations = {"review_count": (product, "size")}
+        if "rating" in present:
+            aggregations["average_rating"] = (present["rating"], "mean")
+        if "category" in present:
+            aggregations["category"] = (present["category"], "first")
+        stats = df.groupby(product).agg(**aggregations)
+        for field, role, options in (("features", "feature", {"unique": True}),
+                                     ("attributes", "attribute", {"unique": True}),
+                                     ("sample_reviews", "review", {"limit": SAMPLE_REVIEWS})):
+            if role in present:
+                stats[field] = pd.Series(_group_lists(df[product], df[present[role]], stats.index, **options),
+                                         index=stats.index, dtype=object)
+
+        if "sentiment" in present:
+            rows = stats.index.get_indexer(df[product])
+            columns = pd.Index(SENTIMENTS).get_indexer(df[present["sentiment"]])
+            kept = (rows >= 0) & (columns >= 0)
+            counts = np.bincount(rows[kept] * len(SENTIMENTS) + columns[kept],
+                                 minlength=len(stats) * len(SENTIMENTS)).reshape(len(stats), len(SENTIMENTS))
+            stats["sentiment_distribution"] = [dict(zip(SENTIMENTS, row)) for row in counts.tolist()]
+        products = cls._records(stats, PRODUCT_FIELDS)
+
+        categories = {}
+        if "category" in present:
+            category = present["category"]
+            aggregations = {"review_count": (product, "size")}
+            if "rating" in present:
+                aggregations["average_rating"] = (present["rating"], "mean")
+            stats = df.groupby(category, sort=False).agg(**aggregations)
+            stats["products"] = pd.Series(_group_lists(df[category], df[product], stats.index, unique=True),
+                                          index=stats.index, dtype=object)
+            for field, role in (("features", "feature"), ("attributes", "attribute")):
+                if role in present:
+                    stats[field] = pd.Series(_group_lists(df[category], df[present[role]], stats.index, unique=True),
+                                             index=stats.index, dtype=object)
+            categories = cls._records(stats, CATEGORY_FIELDS)
+        return cls(products, categories)
+
+    @classmethod
+    def from_csv(cls, path, columns=None):
+        import pandas as pd
+
+        columns = {**REVIEW_COLUMNS, **(columns or {})}
+        header = pd.read_csv(path, nrows=0).columns
+        return cls.from_dataframe(pd.read_csv(path, usecols=[c for c in columns.values() if c in header]),
+                                  columns)
+
+    @staticmethod
+    def _records(stats, fields):
+        """``{name: {field: value}}`` from the aggregated frame, with plain Python values; absent fields are None."""
+        columns = [stats[field].tolist() if field in stats else [None] * len(stats) for field in fields]
+        return {name: dict(zip(fields, values)) for name, *values in zip(stats.index.tolist(), *columns)}
+
+    def product(self, name):
+        return self.products.get(name)
+
+    def category(self, name):
+        return self.categories.get(name)
+
+    @property
+    def matcher(self):
+        """EntityMatcher over the product names and their short aliases."""
+        if self._matcher is None:
+            self._matcher = EntityMatcher.with_aliases(list(self.products))
+        return self._matcher
+
+    @property
+    def category_matcher(self):
+        if self._category_matcher is None:
+            self._category_matcher = EntityMatcher(list(self.categories))
+        return self._category_matcher
+
+    def find_product(self, text):
+        """First product mentioned in ``text`` by name or alias, or None."""
+        names = self.matcher.find(text)
+        return names[0] if names else None
+
+    def answer(self, question):
+        """Answer a rating / review-count / sentiment question about one product, or return None."""
+        name = self.find_product(question)
+        if name is None:
+            return None
+        stats = self.products[name]
+        question = question.lower()
+        if COUNT_RE.search(question):
+            return f"{name} has {stats['review_count']} reviews."
+        if RATING_RE.search(question) and stats["average_rating"] is not None:
+            return (f"{name} has an average rating of {stats['average_rating']:.1f}/5 "
+                    f"from {stats['review_count']} reviews.")
+        if SENTIMENT_RE.search(question) and stats["sentiment_distribution"] is not None:
+            dist = stats["sentiment_distribution"]
+            return (f"Of the {stats['review_count']} reviews of {name}, {dist['positive']} are positive, "
+                    f"{dist['neutral']} neutral and {dist['negative']} negative.")
+        return None
+
+    def top_products(self, category=None, n=TOP_PRODUCTS):
+        """Names of the ``n`` best-rated products (of ``category``), more reviews breaking ties."""
+        names = self.categories[category]["products"] if category is not None else self.products
+        rated = [name for name in names if self.products[name]["average_rating"] is not None]
+        return sorted(rated, key=lambda name: (-self.products[name]["average_rating"],
+                                               -self.products[name]["review_count"]))[:n]
+
+    def answer_category(self, question):
+        """Best-rated products in the category ``question`` names, or None.
+
+        A question naming no known category (always the case when the data
+        has no category column) is left to retrieval, which can weigh its
+        constraints (wired, bass, price).
+        """
+        categories = self.category_matcher.find(question) if self.categories else []
+        if not categories:
+            return None
+        category = categories[0]
+        names = self.top_products(category)
+        if not names:
+            return None
+        ranked = "; ".join(f"{i}. {name} ({self.products[name]['average_rating']:.1f}/5 from "
+                           f"{self.products[name]['review_count']} reviews)" for i, name in enumerate(names, 1))
+        return f"Top rated {category} by customer reviews: {ranked}."
+
+    def save(self, path=PRODUCT_AGGREGATES_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        conn = sqlite3.connect(tmp_path)
+        with conn:
+            for table, fields, records in (("products", PRODUCT_FIELDS, self.products),
+                                           ("categories", CATEGORY_FIELDS, self.categories)):
+                conn.execute(f"CREATE TABLE {table} (name TEXT PRIMARY KEY, {', '.join(fields)})")
+                conn.executemany(
+                    f"INSERT INTO {table} VALUES ({', '.join('?' * (len(fields) + 1))})",
+                    ([name, *(json.dumps(record[f]) if f in _JSON_FIELDS and record[f] is not None
+                              else record[f] for f in fields)]
+                     for name, record in records.items()))
+            conn.execute("CREATE INDEX products_category ON products (category)")
+        conn.close()
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=PRODUCT_AGGREGATES_PATH):
+        conn = sqlite3.connect(path)
+        try:
+            tables = []
+            for table, fields in (("products", PRODUCT_FIELDS), ("categories", CATEGORY_FIELDS)):
+                records = {}
+                for name, *values in conn.execute(f"SELECT name, {', '.join(fields)} FROM {table}"):
+                    records[name] = {f: json.loads(v) if f in _JSON_FIELDS and v is not None else v
+                                     for f, v in zip(fields, values)}
+                tables.append(records)
+        finally:
+            conn.close()
+        return cls(*tables)
+
+    @staticmethod
+    def exists(path=PRODUCT_AGGREGATES_PATH):
+        return os.path.exists(path)
+
+
+class StructuredAnswerChain(Runnable):
+    """Answer product-statistics questions from ``aggregates``; pass anything else to ``chain``.
+
+    With an ``intents`` classifier, confident category questions that name a
+    known category and no product ("which earbuds should I buy?") are answered
+    with the category's best-rated products too.
+    """
+
+    def __init__(self, chain, aggregates, intents=None):
+        self.chain = chain
+        self.aggregates = aggregates
+        self.intents = intents
+
+    def _answer(self, input):
+        if not isinstance(input, str):
+            return None
+        answer = self.aggregates.answer(input)
+        if answer is None and self.intents is not None and self.aggregates.find_product(input) is None \
+                and self.intents.is_category_query(input):
+            answer = self.aggregates.answer_category(input)
+        if answer is not None:
+            STRUCTURED_ANSWERS_TOTAL.inc()
+        return answer
+
+    def invoke(self, input, config=None, **kwargs):
+        answer = self._answer(input)
+        return answer if answer is not None else self.chain.invoke(input, config, **kwargs)
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        answer = self._answer(input)
+        return answer if answer is not None else await self.chain.ainvoke(input, config, **kwargs)
+
+    def stream(self, input, config=None, **kwargs):
+        answer = self._answer(input)
+        if answer is not None:
+            yield answer
+            return
+        yield from self.chain.stream(input, config, **kwargs)
+
+    async def astream(self, input, config=None, **kwargs):
+        answer = self._answer(input)
+        if answer is not None:
+            yield answer
+            return
+        async for chunk in self.chain.astream(input, config, **kwargs):
+            yield chunk
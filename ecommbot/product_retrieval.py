@@ -0,0 +1,110 @@
+"""
+Product-diverse retrieval.
+
+Plain top-k search often returns several reviews of the same product. Here
+the retriever over-fetches candidates together with their vectors, drops
+duplicate review texts, groups the rest by ``product_name``, and picks
+products by maximal marginal relevance (MMR) over each product's best review,
+so the context covers distinct products that are still relevant to the
+question. Within a chosen product, near-duplicate reviews are skipped.
+All similarity computations are NumPy matrix products.
+"""
+
+import numpy as np
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+def mmr(query, vectors, k, lambda_mult=0.5):
+    """Indices of ``k`` rows of ``vectors`` chosen by MMR, in selection order.
+
+    Each step picks the row maximizing
+    ``lambda_mult * sim(query, row) - (1 - lambda_mult) * max sim(row, selected)``.
+    Vectors must be unit-norm.
+    """
+    if len(vectors) == 0:
+        return []
+    relevance = vectors @ query
+    pairwise = vectors @ vectors.T
+    selected = [int(np.argmax(relevance))]
+    redundancy = pairwise[selected[0]].copy()
+    while len(selected) < min(k, len(vectors)):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[selected] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        np.maximum(redundancy, pairwise[best], out=redundancy)
+    return selected
+
+
+def diverse_products(query, docs, vectors, k_products=3, per_product=2, lambda_mult=0.5,
+                     duplicate_threshold=0.95):
+    """Group candidate reviews by product and pick a diverse, relevant subset.
+
+    Args:
+        query: Query embedding.
+        docs (list): Candidate Documents.
+        vectors: Embeddings of ``docs``, one row per document.
+        k_products (int): Number of products to return.
+        per_product (int): Maximum reviews kept per product.
+        lambda_mult (float): MMR trade-off; 1 is pure relevance, 0 pure diversity.
+        duplicate_threshold (float): Reviews at least this similar to one
+            already kept for the same product are skipped.
+
+    Returns:
+        list: ``(product_name, [Document, ...])`` pairs, most relevant first.
+    """
+    if not docs:
+        return []
+    query = _normalize(query)
+    vectors = _normalize(vectors)
+    relevance = vectors @ query
+
+    groups = {}  # product name -> candidate indices, most relevant first
+    seen_texts = set()
+    for i in np.argsort(-relevance):
+        text = " ".join(docs[i].page_content.lower().split())
+        if text in seen_texts:
+            continue
+        seen_texts.add(text)
+        groups.setdefault(docs[i].metadata.get("product_name", ""), []).append(i)
+
+    products = list(groups)
+    heads = np.array([groups[product][0] for product in products])
+    result = []
+    for choice in mmr(query, vectors[heads], k_products, lambda_mult):
+        kept = []
+        for i in groups[products[choice]]:
+            if kept and np.max(vectors[kept] @ vectors[i]) >= duplicate_threshold:
+                continue
+            kept.append(i)
+            if len(kept) == per_product:
+                break
+        result.append((products[choice], [docs[i] for i in kept]))
+    return result
+
+
+def search_with_vectors(vstore, vector, k, filter=None):
+    """Top-k documents and their vectors, optionally restricted by a metadata ``filter``.
+
+    Stores that can return stored vectors (AstraDB, LocalVectorStore) do so in
+    the same call; otherwise the hits are re-embedded, which the embedding
+    cache usually answers locally.
+    """
+    if hasattr(vstore, "similarity_search_with_embedding_by_vector"):
+        pairs = vstore.similarity_search_with_embedding_by_vector(vector, k=k, filter=filter)
+        return [doc for doc, _ in pairs], [embedding for _, embedding in pairs]
+    docs = vstore.similarity_search_by_vector(vector, k=k, filter=filter)
+    return docs, vstore.embeddings.embed_documents([doc.page_content for doc in docs])
+
+
+async def asearch_with_vectors(vstore, vector, k, filter=None):
+    if hasattr(vstore, "asimilarity_search_with_embedding_by_vector"):
+        pairs = await vstore.asimilarity_search_with_embedding_by_vector(vector, k=k, filter=filter)
+        return [doc for doc, _ in pairs], [embedding for _, embedding in pairs]
+    docs = await vstore.asimilarity_search_by_vector(vector, k=k, filter=filter)
+    return docs, await vstore.embeddings.aembed_documents([doc.page_content for doc in docs])
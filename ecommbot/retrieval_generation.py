@@ -1,14 +1,137 @@
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnablePassthrough
-from langchain_openai import ChatOpenAI
-from ecommbot.ingest import ingestdata
+from langchain_core.runnables import RunnableLambda, RunnableParallel, RunnablePassthrough
+import os
+from dotenv import load_dotenv
+from ecommbot.clients import chat_model
+from ecommbot.context import CONTEXT_MAX_TOKENS, assemble_context
+from ecommbot.product_retrieval import asearch_with_vectors, diverse_products, search_with_vectors
+from ecommbot.coalescing import CoalescingChain
+from ecommbot.embedding_batcher import EMBED_BATCHING, MicroBatchEmbeddings
+from ecommbot.bm25_index import BM25_INDEX_PATH, BM25Index, LazyBM25Index, reciprocal_rank_fusion
+from ecommbot.intent_classifier import INTENT_TRAINING_PATH, IntentClassifier
+from ecommbot.manifest import read_revision
+from ecommbot.product_aggregates import PRODUCT_AGGREGATES_PATH, ProductAggregates, StructuredAnswerChain
+from ecommbot.semantic_cache import SemanticCache, SemanticCacheChain
+from ecommbot.tracing import TRACE_SAMPLE_RATE, TracedChain, stage
 
+load_dotenv()
 
-def generation(vstore):
-    retriever = vstore.as_retriever(search_kwargs={"k": 3})
+RETRIEVAL_MODE=os.getenv("RETRIEVAL_MODE", "hybrid")
+HYBRID_FETCH_K=int(os.getenv("HYBRID_FETCH_K", "10"))
+PRODUCT_FETCH_K=int(os.getenv("PRODUCT_FETCH_K", "20"))
+MMR_LAMBDA=float(os.getenv("MMR_LAMBDA", "0.5"))
+STRUCTURED_ANSWERS=os.getenv("STRUCTURED_ANSWERS", "on") == "on"
+PRODUCT_FILTER=os.getenv("PRODUCT_FILTER", "on") == "on"
+# Off by default: the bundled reviews have no category column for routed questions to use
+INTENT_ROUTING=os.getenv("INTENT_ROUTING", "off") == "on"
+# Off by default: without product statistics the cache cannot tell questions about different products apart
+SEMANTIC_CACHE=os.getenv("SEMANTIC_CACHE", "off") == "on"
+REQUEST_COALESCING=os.getenv("REQUEST_COALESCING", "on") == "on"
+SEMANTIC_CACHE_THRESHOLD=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_TTL=float(os.getenv("SEMANTIC_CACHE_TTL", "3600"))
+SEMANTIC_CACHE_MAX_ENTRIES=int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "10000"))
 
-    PRODUCT_BOT_TEMPLATE = """
+
+def product_filter(matcher, question):
+    """Metadata filter for the products named in ``question``, or None when it names none."""
+    names = matcher.find(question)
+    if not names:
+        return None
+    return {"product_name": names[0] if len(names) == 1 else {"$in": names}}
+
+
+def _query_inputs(embeddings, matcher):
+    """Stage(s) turning the question into ``{"vector", "filter"}``."""
+    embed_query = stage(RunnableLambda(embeddings.embed_query, afunc=embeddings.aembed_query), "embed_query")
+    if matcher is None:
+        return RunnableParallel(vector=embed_query, filter=RunnableLambda(lambda question: None))
+    match_products = stage(RunnableLambda(lambda question: product_filter(matcher, question)), "match_products")
+    return RunnableParallel(vector=embed_query, filter=match_products)
+
+
+def vector_retriever(vstore, k=3, matcher=None, embeddings=None):
+    """Query embedding and vector search as separately timed stages.
+
+    With an EntityMatcher, a question naming products is searched among those
+    products' reviews first (plain search if that finds nothing). ``embeddings``
+    embeds the question instead of the store's own embeddings.
+    """
+    embeddings = embeddings or vstore.embeddings
+    if embeddings is None:
+        # Server-side embedding (e.g. Astra vectorize): one opaque stage
+        return stage(vstore.as_retriever(search_kwargs={"k": k}), "retrieve")
+
+    def search(inputs):
+        if inputs["filter"] is not None:
+            docs = vstore.similarity_search_by_vector(inputs["vector"], k=k, filter=inputs["filter"])
+            if docs:
+                return docs
+        return vstore.similarity_search_by_vector(inputs["vector"], k=k)
+
+    async def asearch(inputs):
+        if inputs["filter"] is not None:
+            docs = await vstore.asimilarity_search_by_vector(inputs["vector"], k=k, filter=inputs["filter"])
+            if docs:
+                return docs
+        return await vstore.asimilarity_search_by_vector(inputs["vector"], k=k)
+
+    return _query_inputs(embeddings, matcher) | stage(RunnableLambda(search, afunc=asearch), "vector_search")
+
+
+def product_retriever(vstore, k=3, per_product=1, fetch_k=PRODUCT_FETCH_K, lambda_mult=MMR_LAMBDA, matcher=None,
+                      embeddings=None):
+    """Over-fetch and return reviews of ``k`` diverse products chosen by MMR, grouped by product."""
+    embeddings = embeddings or vstore.embeddings
+
+    def search(inputs):
+        vector = inputs["vector"]
+        docs, vectors = search_with_vectors(vstore, vector, fetch_k, inputs["filter"])
+        if not docs and inputs["filter"] is not None:
+            docs, vectors = search_with_vectors(vstore, vector, fetch_k)
+        groups = diverse_products(vector, docs, vectors, k, per_product, lambda_mult)
+        return [doc for _, docs in groups for doc in docs]
+
+    async def asearch(inputs):
+        vector = inputs["vector"]
+        docs, vectors = await asearch_with_vectors(vstore, vector, fetch_k, inputs["filter"])
+        if not docs and inputs["filter"] is not None:
+            docs, vectors = await asearch_with_vectors(vstore, vector, fetch_k)
+        groups = diverse_products(vector, docs, vectors, k, per_product, lambda_mult)
+        return [doc for _, docs in groups for doc in docs]
+
+    return _query_inputs(embeddings, matcher) | stage(RunnableLambda(search, afunc=asearch), "product_search")
+
+
+def build_retriever(vstore, k=3, mode=RETRIEVAL_MODE, bm25_path=BM25_INDEX_PATH, fetch_k=HYBRID_FETCH_K,
+                    matcher=None, embeddings=None):
+    """Retriever for the ``{context}`` slot, selected by ``mode``.
+
+    ``vector``: top-k vector search. ``hybrid``: vector and BM25 results merged
+    by reciprocal-rank fusion; falls back to vector search until ingest has
+    built the BM25 index. ``products``: reviews of ``k`` distinct products
+    chosen by MMR. ``matcher`` (an EntityMatcher over product names) restricts
+    the vector search to the products a question names.
+    """
+    if mode == "products" and vstore.embeddings is not None:
+        return product_retriever(vstore, k, matcher=matcher, embeddings=embeddings)
+    if mode != "hybrid" or not BM25Index.exists(bm25_path):
+        return vector_retriever(vstore, k, matcher=matcher, embeddings=embeddings)
+    index = LazyBM25Index(bm25_path)
+
+    def lexical_search(question):
+        return index.search(question, fetch_k)
+
+    def fuse(results):
+        return reciprocal_rank_fusion([results["vector"], results["lexical"]], k=k)
+
+    return RunnableParallel(
+        vector=vector_retriever(vstore, fetch_k, matcher=matcher, embeddings=embeddings),
+        lexical=stage(RunnableLambda(lexical_search), "lexical_search"),
+    ) | stage(RunnableLambda(fuse), "fuse")
+
+
+PRODUCT_BOT_TEMPLATE = """
     Your ecommercebot bot is an expert in product recommendations and customer queries.
     It analyzes product titles and reviews to provide accurate and helpful responses.
     Ensure your answers are relevant to the product context and refrain from straying off-topic.
@@ -24,22 +147,85 @@ def generation(vstore):
     """
 
 
+def context_assembler(max_tokens=CONTEXT_MAX_TOKENS):
+    """Turn ``{"docs", "question"}`` into the prompt inputs, with the context packed to ``max_tokens``."""
+    def assemble(inputs):
+        return {"context": assemble_context(inputs["docs"], inputs["question"], max_tokens),
+                "question": inputs["question"]}
+
+    return stage(RunnableLambda(assemble), "pack_context")
+
+
+def load_aggregates():
+    """Product statistics used by the product filter and structured answers, if enabled and built by ingest."""
+    if (STRUCTURED_ANSWERS or PRODUCT_FILTER) and ProductAggregates.exists(PRODUCT_AGGREGATES_PATH):
+        return ProductAggregates.load(PRODUCT_AGGREGATES_PATH)
+    return None
+
+
+def load_intents():
+    """Intent classifier for routing category questions, if enabled and its training testset exists."""
+    if STRUCTURED_ANSWERS and INTENT_ROUTING and os.path.exists(INTENT_TRAINING_PATH):
+        return IntentClassifier.from_testset(INTENT_TRAINING_PATH)
+    return None
+
+
+def generation(vstore, llm=None, semantic_cache=SEMANTIC_CACHE, trace_sample_rate=TRACE_SAMPLE_RATE,
+               context_max_tokens=CONTEXT_MAX_TOKENS, aggregates=None, intents=None,
+               retrieval_mode=RETRIEVAL_MODE, bm25_path=BM25_INDEX_PATH, coalesce=REQUEST_COALESCING,
+               embed_batching=EMBED_BATCHING):
+    if aggregates is None:
+        aggregates = load_aggregates()
+
+    # Product names mentioned in the question become a metadata filter on the vector search
+    matcher = aggregates.matcher if aggregates is not None and PRODUCT_FILTER else None
+    embeddings = vstore.embeddings
+    if embed_batching and embeddings is not None:
+        # Questions of concurrent requests are embedded together, in one batch call
+        embeddings = MicroBatchEmbeddings(embeddings)
+    retriever = build_retriever(vstore, k=3, mode=retrieval_mode, bm25_path=bm25_path, matcher=matcher,
+                                embeddings=embeddings)
+
     prompt = ChatPromptTemplate.from_template(PRODUCT_BOT_TEMPLATE)
 
-    llm = ChatOpenAI()
+    llm = llm or chat_model()
 
     chain = (
-        {"context": retriever, "question": RunnablePassthrough()}
-        | prompt
-        | llm
-        | StrOutputParser()
+        {"docs": retriever, "question": RunnablePassthrough()}
+        | context_assembler(context_max_tokens)
+        | stage(prompt, "format_prompt")
+        | stage(llm, "llm")
+        | stage(StrOutputParser(), "parse")
     )
+    chain = TracedChain(chain, sample_rate=trace_sample_rate)
+    if coalesce:
+        # Identical questions asked at the same time share one retrieval and LLM call
+        chain = CoalescingChain(chain)
+
+    if semantic_cache and embeddings is not None:
+        cache = SemanticCache(
+            embeddings,
+            threshold=SEMANTIC_CACHE_THRESHOLD,
+            max_entries=SEMANTIC_CACHE_MAX_ENTRIES,
+            ttl=SEMANTIC_CACHE_TTL,
+            revision_fn=read_revision,
+            # A cached answer is only reused for a question naming the same products
+            matcher=aggregates.matcher if aggregates is not None else None,
+        )
+        chain = SemanticCacheChain(chain, cache)
+
+    if aggregates is not None and STRUCTURED_ANSWERS:
+        if intents is None:
+            intents = load_intents()
+        # Rating / review-count questions, and category questions the intent model is sure of,
+        # are answered from precomputed statistics
+        chain = StructuredAnswerChain(chain, aggregates, intents)
 
     return chain
 
 if __name__=='__main__':
-    vstore = ingestdata("done")
-    chain  = generation(vstore)
+    from ecommbot.clients import vector_store
+    chain  = generation(vector_store())
     print(chain.invoke("can you tell me the best bluetooth buds?"))
     
     
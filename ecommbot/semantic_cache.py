@@ -0,0 +1,205 @@
+"""
+Semantic answer cache in front of the retrieval-generation chain.
+
+Incoming questions are embedded and compared, with one matrix-vector product,
+against every question answered recently. If the best match is above the
+similarity threshold and both questions name the same products, its stored
+answer is returned without retrieval or an LLM call. (Questions that differ
+only in the product or model number named embed almost identically, so
+similarity alone would serve one product's answer for another.) Entries
+expire after a TTL, the least recently used entry is evicted when the cache
+is full, and everything is dropped when the ingest manifest revision changes
+(the catalogue behind the answers was updated).
+"""
+
+import time
+from collections import OrderedDict
+from threading import Lock
+
+import numpy as np
+from langchain_core.runnables import Runnable
+
+from ecommbot.metrics import REGISTRY
+
+CACHE_HITS = REGISTRY.counter("semantic_cache_hits_total", "Questions answered from the semantic cache")
+CACHE_MISSES = REGISTRY.counter("semantic_cache_misses_total", "Questions that went through the chain")
+CACHE_SAVED_SECONDS = REGISTRY.counter(
+    "semantic_cache_saved_seconds_total", "Chain latency avoided by cache hits, in seconds")
+CACHE_INVALIDATIONS = REGISTRY.counter(
+    "semantic_cache_invalidations_total", "Cache flushes caused by a new ingest manifest revision")
+REGISTRY.gauge(
+    "semantic_cache_hit_rate", "Fraction of questions answered from the semantic cache",
+    lambda: CACHE_HITS.value / max(CACHE_HITS.value + CACHE_MISSES.value, 1))
+
+
+class SemanticCache:
+    """Bounded cache of (question vector, answer) pairs looked up by cosine similarity.
+
+    Args:
+        embedding: Embeddings used for incoming questions.
+        threshold (float): Minimum cosine similarity for a hit.
+        max_entries (int): Capacity; the least recently used entry is evicted.
+        ttl (float): Seconds an answer stays valid.
+        revision_fn (callable): Returns the current ingest revision; the cache
+            is cleared when it changes. Polled at most every ``revision_interval`` seconds.
+        matcher: EntityMatcher over product names; a hit must name the same products.
+    """
+
+    def __init__(self, embedding, threshold=0.95, max_entries=10_000, ttl=3600.0,
+                 revision_fn=None, revision_interval=5.0, matcher=None):
+        self.embedding = embedding
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.revision_fn = revision_fn
+        self.revision_interval = revision_interval
+        self.matcher = matcher
+        self._revision = revision_fn() if revision_fn else None
+        self._revision_checked = time.monotonic()
+        self._vectors = None
+        self._expires = np.zeros(max_entries, dtype=np.float64)
+        # Id of the product names each slot's question mentions
+        self._groups = np.zeros(max_entries, dtype=np.int64)
+        self._group_ids = {}
+        self._entries = OrderedDict()  # slot -> (question, answer, latency), in LRU order
+        self._slots = {}  # question -> slot
+        self._free = list(range(max_entries - 1, -1, -1))
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._slots.clear()
+            self._expires[:] = 0
+            self._free = list(range(self.max_entries - 1, -1, -1))
+
+    def _check_revision(self):
+        now = time.monotonic()
+        if self.revision_fn is None or now - self._revision_checked < self.revision_interval:
+            return
+        self._revision_checked = now
+        revision = self.revision_fn()
+        if revision != self._revision:
+            self._revision = revision
+            CACHE_INVALIDATIONS.inc()
+            self.clear()
+
+    def _group(self, question):
+        """Id of the set of products ``question`` names (0 for none, or without a matcher)."""
+        if self.matcher is None:
+            return 0
+        names = tuple(sorted(self.matcher.find(question)))
+        if not names:
+            return 0
+        with self._lock:
+            return self._group_ids.setdefault(names, len(self._group_ids) + 1)
+
+    def _search(self, vector, group):
+        """Return the stored answer closest to ``vector`` among questions naming the same products."""
+        self._check_revision()
+        with self._lock:
+            if not self._entries:
+                return None
+            scores = self._vectors @ vector
+            # Free and expired slots have an expiry in the past and can never match
+            scores[(self._expires <= time.monotonic()) | (self._groups != group)] = -np.inf
+            slot = int(np.argmax(scores))
+            if scores[slot] < self.threshold:
+                return None
+            self._entries.move_to_end(slot)
+            return self._entries[slot]
+
+    def _record(self, hit):
+        if hit is None:
+            CACHE_MISSES.inc()
+            return None
+        CACHE_HITS.inc()
+        CACHE_SAVED_SECONDS.inc(hit[2])
+        return hit[1]
+
+    def lookup(self, question):
+        """Return ``(answer or None, question vector)``; pass the vector back to ``store``."""
+        vector = _unit(self.embedding.embed_query(question))
+        return self._record(self._search(vector, self._group(question))), vector
+
+    async def alookup(self, question):
+        vector = _unit(await self.embedding.aembed_query(question))
+        return self._record(self._search(vector, self._group(question))), vector
+
+    def store(self, question, answer, latency, vector):
+        group = self._group(question)
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, len(vector)), dtype=np.float32)
+            # Storing a question again (coalesced requests all store the same answer) replaces its entry
+            slot = self._slots.get(question)
+            if slot is None:
+                if self._free:
+                    slot = self._free.pop()
+                else:
+                    slot, (evicted, _, _) = self._entries.popitem(last=False)
+                    del self._slots[evicted]
+                self._slots[question] = slot
+            self._vectors[slot] = vector
+            self._groups[slot] = group
+            self._expires[slot] = time.monotonic() + self.ttl
+            self._entries[slot] = (question, answer, latency)
+            self._entries.move_to_end(slot)
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / (np.linalg.norm(vector) or 1.0)
+
+
+class SemanticCacheChain(Runnable):
+    """Wrap a question -> answer chain so cache hits skip it entirely."""
+
+    def __init__(self, chain, cache):
+        self.chain = chain
+        self.cache = cache
+
+    def invoke(self, input, config=None, **kwargs):
+        answer, vector = self.cache.lookup(input)
+        if answer is not None:
+            return answer
+        start = time.perf_counter()
+        answer = self.chain.invoke(input, config, **kwargs)
+        self.cache.store(input, answer, time.perf_counter() - start, vector)
+        return answer
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        answer, vector = await self.cache.alookup(input)
+        if answer is not None:
+            return answer
+        start = time.perf_counter()
+        answer = await self.chain.ainvoke(input, config, **kwargs)
+        self.cache.store(input, answer, time.perf_counter() - start, vector)
+        return answer
+
+    def stream(self, input, config=None, **kwargs):
+        answer, vector = self.cache.lookup(input)
+        if answer is not None:
+            yield answer
+            return
+        start = time.perf_counter()
+        chunks = []
+        for chunk in self.chain.stream(input, config, **kwargs):
+            chunks.append(chunk)
+            yield chunk
+        self.cache.store(input, "".join(chunks), time.perf_counter() - start, vector)
+
+    async def astream(self, input, config=None, **kwargs):
+        answer, vector = await self.cache.alookup(input)
+        if answer is not None:
+            yield answer
+            return
+        start = time.perf_counter()
+        chunks = []
+        async for chunk in self.chain.astream(input, config, **kwargs):
+            chunks.append(chunk)
+            yield chunk
+        self.cache.store(input, "".join(chunks), time.perf_counter() - start, vector)
@@ -0,0 +1,86 @@
+"""
+Flask front-end for the chat chain (threaded, synchronous serving).
+"""
+
+import json
+import logging
+import os
+import time
+
+from flask import Flask, Response, render_template, request, stream_with_context
+
+from ecommbot.metrics import REGISTRY
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEMPLATE_FOLDER = os.path.join(ROOT_DIR, "templates")
+STATIC_FOLDER = os.path.join(ROOT_DIR, "static")
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4"
+
+logger = logging.getLogger(__name__)
+
+
+def sse_event(data, event=None):
+    """Format one Server-Sent Event; ``data`` is JSON-encoded so tokens may contain newlines."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+class StreamTimer:
+    """Tracks time-to-first-token and total time for one streamed answer."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.first_token = None
+
+    def token(self):
+        if self.first_token is None:
+            self.first_token = time.perf_counter()
+
+    def log(self, msg):
+        end = time.perf_counter()
+        ttft = (self.first_token or end) - self.start
+        logger.info("stream ttft_ms=%.1f total_ms=%.1f msg=%r",
+                    ttft * 1000, (end - self.start) * 1000, msg[:80])
+
+
+def create_app(chain):
+    app = Flask(__name__, template_folder=TEMPLATE_FOLDER, static_folder=STATIC_FOLDER)
+
+    @app.route("/")
+    def index():
+        return render_template('chat.html')
+
+    @app.route("/get", methods=["GET", "POST"])
+    def chat():
+        msg = request.form["msg"]
+        result = chain.invoke(msg)
+        logger.debug("response: %r", result)
+        return str(result)
+
+    @app.route("/metrics")
+    def metrics():
+        return Response(REGISTRY.render(), content_type=METRICS_CONTENT_TYPE)
+
+    @app.route("/stream", methods=["POST"])
+    def chat_stream():
+        msg = request.form["msg"]
+
+        def generate():
+            timer = StreamTimer()
+            try:
+                for token in chain.stream(msg):
+                    if token:
+                        timer.token()
+                        yield sse_event({"token": token})
+            except Exception:
+                logger.exception("streaming failed")
+                yield sse_event({"error": "Sorry, something went wrong."}, event="error")
+            yield sse_event({}, event="done")
+            timer.log(msg)
+
+        return Response(stream_with_context(generate()), mimetype="text/event-stream",
+                        headers=SSE_HEADERS)
+
+    return app
@@ -0,0 +1,152 @@
+"""
+Lazy initialization of the chat chain for the web apps.
+
+Importing ``app.py`` used to import LangChain, OpenAI, Astra and pandas,
+connect to the vector store and build the chain before the first request,
+in every worker process. ``chain`` here is a stand-in that builds the real
+chain on first use, so the apps import in a fraction of a second. Heavy
+modules are imported inside the functions that need them. ``APP_INIT``
+selects when the work happens:
+
+- ``lazy``: on the first request (concurrent first requests wait for one build);
+- ``eager``: at import, via ``warmup()``;
+- ``prefork``: at import, the parent process loads the modules and the
+  read-only state (a local vector index, product statistics and their
+  matchers, the intent model, the tokenizer), which forked workers then share copy-on-write. Network
+  clients (vector store, LLM) are only created after the fork, in each
+  worker, because sockets and client pools must not cross a fork. Use with
+  ``gunicorn -c gunicorn.conf.py app:app``, which warms each worker up.
+
+``APP_WARMUP_QUERY``, when set, is answered once by ``warmup()`` so the
+first user request also finds HTTP connections and lazily opened indexes
+ready.
+"""
+
+import asyncio
+import gc
+import logging
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+APP_INIT = os.getenv("APP_INIT", "lazy")
+APP_WARMUP_QUERY = os.getenv("APP_WARMUP_QUERY", "")
+
+logger = logging.getLogger(__name__)
+
+# Read-only state loaded by preload() before forking
+_preloaded = {}
+
+
+def preload():
+    """Import the chain's modules and load its read-only state, without creating network clients."""
+    start = time.perf_counter()
+    import langchain_openai  # noqa: F401
+
+    from ecommbot.context import count_tokens
+    from ecommbot.clients import IVF_NPROBE, LOCAL_INDEX_PATH, VECTOR_BACKEND
+    from ecommbot.local_vectorstore import LocalVectorStore
+    from ecommbot.retrieval_generation import load_aggregates, load_intents
+    if VECTOR_BACKEND == "astra":
+        import langchain_astradb  # noqa: F401
+    elif VECTOR_BACKEND == "local":
+        # Documents and metadata are loaded here; each worker attaches its own embedder
+        _preloaded["vstore"] = LocalVectorStore.load(LOCAL_INDEX_PATH, None, nprobe=IVF_NPROBE)
+
+    aggregates = load_aggregates()
+    if aggregates is not None:
+        # Built on first access otherwise; build them once here so workers share them
+        aggregates.matcher, aggregates.category_matcher
+    _preloaded["aggregates"] = aggregates
+    _preloaded["intents"] = load_intents()
+    count_tokens("warm up the tokenizer")
+    # Keep the collector from writing to (and so copying) the shared objects in every worker
+    gc.freeze()
+    logger.info("preloaded chain state in %.2f s", time.perf_counter() - start)
+
+
+def build_chain():
+    """Connect to the vector store and build the chat chain, reusing anything ``preload()`` loaded."""
+    from ecommbot.clients import embeddings, vector_store
+    from ecommbot.retrieval_generation import generation
+    vstore = _preloaded.get("vstore")
+    if vstore is not None:
+        vstore.embedding = embeddings()
+    else:
+        vstore = vector_store()
+    return generation(vstore, aggregates=_preloaded.get("aggregates"), intents=_preloaded.get("intents"))
+
+
+class LazyChain:
+    """Stand-in for the chain built by ``factory`` on first use.
+
+    Exposes the ``invoke``/``ainvoke``/``stream``/``astream`` calls the
+    servers make. It is deliberately not a LangChain Runnable, so importing
+    it does not import LangChain.
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self._chain = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self._chain is not None
+
+    @property
+    def chain(self):
+        if self._chain is None:
+            with self._lock:
+                if self._chain is None:
+                    start = time.perf_counter()
+                    self._chain = self.factory()
+                    logger.info("chain built in %.2f s", time.perf_counter() - start)
+        return self._chain
+
+    def warmup(self, query=APP_WARMUP_QUERY):
+        """Build the chain now and, if ``query`` is given, answer it once."""
+        chain = self.chain
+        if query:
+            chain.invoke(query)
+        return chain
+
+    async def _achain(self):
+        # Build in a thread: connecting and loading must not block the event loop
+        return self._chain if self._chain is not None else await asyncio.to_thread(lambda: self.chain)
+
+    def invoke(self, input, config=None, **kwargs):
+        return self.chain.invoke(input, config, **kwargs)
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        return await (await self._achain()).ainvoke(input, config, **kwargs)
+
+    def stream(self, input, config=None, **kwargs):
+        yield from self.chain.stream(input, config, **kwargs)
+
+    async def astream(self, input, config=None, **kwargs):
+        async for chunk in (await self._achain()).astream(input, config, **kwargs):
+            yield chunk
+
+
+chain = LazyChain(build_chain)
+
+
+def initialize(mode=APP_INIT):
+    """Import-time initialization of ``chain`` for the ``APP_INIT`` mode."""
+    if mode == "eager":
+        chain.warmup()
+    elif mode == "prefork":
+        preload()
+    elif mode != "lazy":
+        raise ValueError(f"Unknown APP_INIT {mode!r}, expected 'lazy', 'eager' or 'prefork'")
+
+
+def warm_worker(mode=APP_INIT):
+    """Worker start-up after a fork: build the worker's own clients unless initialization is lazy."""
+    if mode != "lazy":
+        chain.warmup()
@@ -0,0 +1,145 @@
+"""
+Per-stage latency tracing for the retrieval-generation chain.
+
+Each stage of the chain is given a run name with ``stage()``. For a sampled
+request, a ``StageTracer`` callback handler times every named stage from its
+start to its end callback, feeds the durations into the ``rag_stage_seconds``
+summary (scraped at ``/metrics``) and logs one line with the request's spans.
+Unsampled requests run with no tracing callbacks attached at all.
+"""
+
+import logging
+import os
+import random
+import time
+from threading import Lock
+
+from dotenv import load_dotenv
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.runnables import Runnable
+from langchain_core.runnables.config import ensure_config
+
+from ecommbot.metrics import REGISTRY
+
+load_dotenv()
+
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+
+STAGE_SECONDS = REGISTRY.summary("rag_stage_seconds", "Latency of each chat chain stage, in seconds")
+TRACED_REQUESTS = REGISTRY.counter("rag_traced_requests_total", "Chat chain requests traced per stage")
+
+ROOT_STAGE = "total"
+STAGES = set()
+
+logger = logging.getLogger(__name__)
+
+
+def stage(runnable, name):
+    """Give ``runnable`` the run name ``name`` and time it as a stage of the chain."""
+    STAGES.add(name)
+    return runnable.with_config(run_name=name)
+
+
+class StageTracer(BaseCallbackHandler):
+    """Collects the spans of one request; create a new handler per request."""
+
+    run_inline = True
+
+    def __init__(self):
+        self.spans = []  # (stage, start offset, duration) in seconds
+        self._open = {}  # run id -> (stage, start time)
+        self._start = time.perf_counter()
+        self._lock = Lock()
+
+    def _begin(self, run_id, parent_run_id, name):
+        if parent_run_id is None:
+            name = ROOT_STAGE
+        elif name not in STAGES:
+            return
+        with self._lock:
+            self._open[run_id] = (name, time.perf_counter())
+
+    def _finish(self, run_id, parent_run_id=None, error=False):
+        with self._lock:
+            span = self._open.pop(run_id, None)
+        if span is None:
+            return
+        name, start = span
+        duration = time.perf_counter() - start
+        STAGE_SECONDS.observe(duration, stage=name)
+        self.spans.append((name, start - self._start, duration))
+        if name == ROOT_STAGE:
+            TRACED_REQUESTS.inc()
+            logger.info("trace %s%s", " ".join(
+                f"{stage}_ms={duration * 1000:.1f}" for stage, _, duration in self.spans),
+                " error=1" if error else "")
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, **kwargs):
+        self._begin(run_id, parent_run_id, kwargs.get("name"))
+
+    def on_chain_end(self, outputs, *, run_id, parent_run_id=None, **kwargs):
+        self._finish(run_id)
+
+    def on_chain_error(self, error, *, run_id, parent_run_id=None, **kwargs):
+        self._finish(run_id, error=True)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+        self._begin(run_id, parent_run_id, kwargs.get("name"))
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, **kwargs):
+        self._begin(run_id, parent_run_id, kwargs.get("name"))
+
+    def on_llm_end(self, response, *, run_id, parent_run_id=None, **kwargs):
+        self._finish(run_id)
+
+    def on_llm_error(self, error, *, run_id, parent_run_id=None, **kwargs):
+        self._finish(run_id, error=True)
+
+    def on_retriever_start(self, serialized, query, *, run_id, parent_run_id=None, **kwargs):
+        self._begin(run_id, parent_run_id, kwargs.get("name"))
+
+    def on_retriever_end(self, documents, *, run_id, parent_run_id=None, **kwargs):
+        self._finish(run_id)
+
+    def on_retriever_error(self, error, *, run_id, parent_run_id=None, **kwargs):
+        self._finish(run_id, error=True)
+
+
+def with_tracer(config, handler):
+    """Return ``config`` with ``handler`` added to its callbacks."""
+    config = ensure_config(config)
+    callbacks = config.get("callbacks")
+    if callbacks is None:
+        callbacks = [handler]
+    elif isinstance(callbacks, list):
+        callbacks = [*callbacks, handler]
+    else:
+        callbacks = callbacks.copy()
+        callbacks.add_handler(handler, inherit=True)
+    return {**config, "callbacks": callbacks}
+
+
+class TracedChain(Runnable):
+    """Attach a ``StageTracer`` to a random ``sample_rate`` fraction of calls."""
+
+    def __init__(self, chain, sample_rate=TRACE_SAMPLE_RATE):
+        self.chain = chain
+        self.sample_rate = sample_rate
+
+    def _config(self, config):
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return config
+        return with_tracer(config, StageTracer())
+
+    def invoke(self, input, config=None, **kwargs):
+        return self.chain.invoke(input, self._config(config), **kwargs)
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        return await self.chain.ainvoke(input, self._config(config), **kwargs)
+
+    def stream(self, input, config=None, **kwargs):
+        yield from self.chain.stream(input, self._config(config), **kwargs)
+
+    async def astream(self, input, config=None, **kwargs):
+        async for chunk in self.chain.astream(input, self._config(config), **kwargs):
+            yield chunk
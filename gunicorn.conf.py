@@ -0,0 +1,18 @@
+"""
+Gunicorn settings for the chat apps:
+
+    APP_INIT=prefork gunicorn -c gunicorn.conf.py -w 4 app:app
+    APP_INIT=prefork gunicorn -c gunicorn.conf.py -w 4 -k uvicorn.workers.UvicornWorker app_async:app
+
+With APP_INIT=prefork the app is imported once in the master process, which
+preloads the chain's read-only state before forking the workers. Each worker
+then builds its own vector store and LLM clients before taking requests.
+"""
+
+from ecommbot.startup import APP_INIT, warm_worker
+
+preload_app = APP_INIT == "prefork"
+
+
+def post_worker_init(worker):
+    warm_worker()
@@ -0,0 +1,21 @@
+"""
+Shared fixtures. The offline stand-ins (stub LLM, fake embeddings) live in benchmarks/common.py.
+"""
+
+import os
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT_DIR, os.path.join(ROOT_DIR, "benchmarks")]
+# OpenAI clients need a key to be created; the tests never call the API
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+FLIPKART_CSV = os.path.join(ROOT_DIR, "data", "flipkart_product_review.csv")
+
+
+@pytest.fixture(scope="session")
+def flipkart_aggregates():
+    from ecommbot.product_aggregates import FLIPKART_COLUMNS, ProductAggregates
+    return ProductAggregates.from_csv(FLIPKART_CSV, FLIPKART_COLUMNS)
@@ -0,0 +1,141 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnableLambda
+
+from common import StubChatModel
+from ecommbot.coalescing import CoalescingChain
+
+QUESTIONS = ["Best earbuds for bass?", "best earbuds for bass", "  BEST earbuds  for bass?"]
+
+
+def stub_chain(latency=0.2):
+    llm = StubChatModel(latency=latency)
+    return llm, CoalescingChain(llm | StrOutputParser())
+
+
+class Failing:
+    """Runnable body that fails after ``delay``, counting its runs."""
+
+    def __init__(self, delay=0.2):
+        self.delay = delay
+        self.calls = 0
+
+    def __call__(self, question):
+        self.calls += 1
+        time.sleep(self.delay)
+        raise ValueError("backend down")
+
+    async def acall(self, question):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        raise ValueError("backend down")
+
+    def chain(self):
+        return CoalescingChain(RunnableLambda(self, afunc=self.acall))
+
+
+def concurrently(fn, inputs):
+    with ThreadPoolExecutor(max_workers=len(inputs)) as pool:
+        return list(pool.map(fn, inputs))
+
+
+def test_threaded_invoke_shares_one_run():
+    llm, chain = stub_chain()
+    answers = concurrently(chain.invoke, QUESTIONS * 3)
+    assert llm.calls == 1
+    assert set(answers) == {llm.reply}
+    assert chain._flights == {}
+
+
+def test_threaded_stream_followers_get_the_whole_answer():
+    llm, chain = stub_chain()
+    answers = concurrently(lambda question: "".join(chain.stream(question)), QUESTIONS * 3)
+    assert llm.calls == 1
+    assert set(answers) == {llm.reply}
+
+
+def test_different_questions_run_separately():
+    llm, chain = stub_chain()
+    concurrently(chain.invoke, ["best earbuds for bass", "best earbuds for calls"])
+    assert llm.calls == 2
+
+
+def test_threaded_error_reaches_every_waiter_and_clears_the_flight():
+    failing = Failing()
+    chain = failing.chain()
+
+    def ask(question):
+        with pytest.raises(ValueError, match="backend down"):
+            chain.invoke(question)
+
+    concurrently(ask, QUESTIONS * 2)
+    assert failing.calls == 1
+    assert chain._flights == {}
+    # The failed run is not reused: the next request runs again
+    with pytest.raises(ValueError):
+        chain.invoke(QUESTIONS[0])
+    assert failing.calls == 2
+
+
+def test_async_invoke_and_stream_share_one_run():
+    llm, chain = stub_chain()
+
+    async def stream(question):
+        return "".join([chunk async for chunk in chain.astream(question)])
+
+    async def burst():
+        return await asyncio.gather(*(chain.ainvoke(q) for q in QUESTIONS), *(stream(q) for q in QUESTIONS))
+
+    answers = asyncio.run(burst())
+    assert llm.calls == 1
+    assert set(answers) == {llm.reply}
+
+
+def test_async_error_reaches_every_waiter_and_clears_the_flight():
+    failing = Failing()
+    chain = failing.chain()
+
+    async def burst():
+        results = await asyncio.gather(*(chain.ainvoke(q) for q in QUESTIONS * 2), return_exceptions=True)
+        return results, dict(chain._loop_table())
+
+    results, in_flight = asyncio.run(burst())
+    assert failing.calls == 1
+    assert all(isinstance(result, ValueError) for result in results)
+    assert in_flight == {}
+
+
+def test_async_run_survives_the_cancelled_leader():
+    llm, chain = stub_chain()
+
+    async def scenario():
+        leader = asyncio.ensure_future(chain.ainvoke(QUESTIONS[0]))
+        await asyncio.sleep(0.05)
+        follower = asyncio.ensure_future(chain.ainvoke(QUESTIONS[1]))
+        await asyncio.sleep(0.05)
+        leader.cancel()
+        return await follower
+
+    assert asyncio.run(scenario()) == llm.reply
+    assert llm.calls == 1
+
+
+def test_abandoned_run_does_not_drop_the_next_flight():
+    llm, chain = stub_chain()
+
+    async def scenario():
+        abandoned = asyncio.ensure_future(chain.ainvoke(QUESTIONS[0]))
+        await asyncio.sleep(0.05)
+        abandoned.cancel()
+        # Registers a new flight before the abandoned run handles its cancellation
+        first = asyncio.ensure_future(chain.ainvoke(QUESTIONS[1]))
+        await asyncio.sleep(0.05)
+        second = asyncio.ensure_future(chain.ainvoke(QUESTIONS[2]))
+        return await asyncio.gather(first, second)
+
+    assert asyncio.run(scenario()) == [llm.reply, llm.reply]
+    assert llm.calls == 2
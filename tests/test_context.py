@@ -0,0 +1,29 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ecommbot import context
+
+
+def test_encoding_is_loaded_once_under_concurrent_first_calls(monkeypatch):
+    loads = []
+    lock = threading.Lock()
+
+    def slow_get_encoding(name):
+        with lock:
+            loads.append(name)
+        time.sleep(0.1)
+        return object()
+
+    monkeypatch.setattr(context.tiktoken, "get_encoding", slow_get_encoding)
+    monkeypatch.setattr(context, "_encodings", {})
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        encodings = list(pool.map(lambda _: context._encoding("test-encoding"), range(8)))
+
+    assert loads == ["test-encoding"]
+    assert len({id(encoding) for encoding in encodings}) == 1
+
+
+def test_relevant_excerpt_truncates_text_without_sentences():
+    excerpt = context.relevant_excerpt("." * 5000, "battery", 50)
+    assert excerpt and context.count_tokens(excerpt) <= 50
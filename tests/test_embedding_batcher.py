@@ -0,0 +1,151 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from ecommbot.embedding_batcher import MicroBatchEmbeddings
+from ecommbot.embedding_cache import CachedEmbeddings
+
+
+class CountingEmbeddings(Embeddings):
+    """Fake embeddings API taking ``delay`` per call; records the size of every call."""
+
+    def __init__(self, delay=0.2, error=None):
+        self.delay = delay
+        self.error = error
+        self.batches = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def vector(text):
+        return [float(len(text)), float(sum(map(ord, text)))]
+
+    def embed_documents(self, texts):
+        with self._lock:
+            self.batches.append(len(texts))
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return [self.vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts):
+        with self._lock:
+            self.batches.append(len(texts))
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return [self.vector(text) for text in texts]
+
+    async def aembed_query(self, text):
+        return (await self.aembed_documents([text]))[0]
+
+
+def embed_in_threads(batcher, texts, head_start=0.05):
+    """Embed ``texts[0]`` first, then the rest while it is in flight; ``{text: vector or exception}``."""
+    results = {}
+
+    def embed(text):
+        try:
+            results[text] = batcher.embed_query(text)
+        except Exception as error:
+            results[text] = error
+
+    threads = [threading.Thread(target=embed, args=(text,)) for text in texts]
+    threads[0].start()
+    time.sleep(head_start)
+    for thread in threads[1:]:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+async def embed_on_loop(batcher, texts, head_start=0.05):
+    first = asyncio.ensure_future(batcher.aembed_query(texts[0]))
+    await asyncio.sleep(head_start)
+    rest = await asyncio.gather(*(batcher.aembed_query(text) for text in texts[1:]), return_exceptions=True)
+    first = (await asyncio.gather(first, return_exceptions=True))[0]
+    return dict(zip(texts, [first, *rest]))
+
+
+TEXTS = [f"question {i}" for i in range(6)]
+
+
+def test_idle_question_is_sent_at_once():
+    backend = CountingEmbeddings(delay=0.0)
+    batcher = MicroBatchEmbeddings(backend, max_wait=1.0)
+    start = time.perf_counter()
+    assert batcher.embed_query("hello") == CountingEmbeddings.vector("hello")
+    assert time.perf_counter() - start < 0.5
+    assert backend.batches == [1]
+
+
+def test_concurrent_threads_share_a_batch():
+    backend = CountingEmbeddings()
+    batcher = MicroBatchEmbeddings(backend, max_wait=0.1)
+    results = embed_in_threads(batcher, TEXTS)
+    assert backend.batches == [1, 5]
+    assert results == {text: CountingEmbeddings.vector(text) for text in TEXTS}
+
+
+def test_concurrent_coroutines_share_a_batch():
+    backend = CountingEmbeddings()
+    batcher = MicroBatchEmbeddings(backend, max_wait=0.1)
+    results = asyncio.run(embed_on_loop(batcher, TEXTS))
+    assert backend.batches == [1, 5]
+    assert results == {text: CountingEmbeddings.vector(text) for text in TEXTS}
+
+
+
+def test_coroutines_use_the_async_backend_through_the_cache():
+    backend = CountingEmbeddings()
+    backend.embed_documents = backend.embed_query = None  # any sync call would fail
+    batcher = MicroBatchEmbeddings(CachedEmbeddings(backend, path=":memory:"), max_wait=0.1)
+    results = asyncio.run(embed_on_loop(batcher, TEXTS))
+    assert backend.batches == [1, 5]
+    assert results == {text: CountingEmbeddings.vector(text) for text in TEXTS}
+
+def test_full_batch_is_sent_without_waiting():
+    backend = CountingEmbeddings()
+    batcher = MicroBatchEmbeddings(backend, max_batch_size=5, max_wait=10.0)
+    start = time.perf_counter()
+    embed_in_threads(batcher, TEXTS)
+    assert backend.batches == [1, 5]
+    assert time.perf_counter() - start < 2.0
+
+
+def test_partial_batch_is_sent_after_max_wait():
+    backend = CountingEmbeddings(delay=0.0)
+    batcher = MicroBatchEmbeddings(backend, max_batch_size=100, max_wait=0.2)
+    batcher._in_flight = 1  # as if another batch call were running, so the next batch waits
+    start = time.perf_counter()
+    results = asyncio.run(embed_on_loop(batcher, TEXTS[:3], head_start=0.0))
+    elapsed = time.perf_counter() - start
+    assert backend.batches == [3]
+    assert 0.15 <= elapsed < 2.0
+    assert results == {text: CountingEmbeddings.vector(text) for text in TEXTS[:3]}
+
+
+def test_duplicate_questions_are_embedded_once():
+    backend = CountingEmbeddings()
+    batcher = MicroBatchEmbeddings(backend, max_wait=0.1, recent_size=0)
+    results = embed_in_threads(batcher, ["first", "same", "same", "same"])
+    assert backend.batches == [1, 1]
+    assert results["same"] == CountingEmbeddings.vector("same")
+
+
+@pytest.mark.parametrize("loop", [False, True])
+def test_batch_failure_reaches_every_caller(loop):
+    backend = CountingEmbeddings(error=ValueError("rate limited"))
+    batcher = MicroBatchEmbeddings(backend, max_wait=0.1)
+    results = asyncio.run(embed_on_loop(batcher, TEXTS)) if loop else embed_in_threads(batcher, TEXTS)
+    assert backend.batches == [1, 5]
+    assert all(isinstance(result, ValueError) for result in results.values())
+    # Nothing is left pending: the next question is embedded (and fails) on its own
+    with pytest.raises(ValueError):
+        batcher.embed_query("later")
@@ -0,0 +1,39 @@
+import numpy as np
+
+from ecommbot.embedding_cache import CachedEmbeddings
+
+
+class CountingEmbeddings:
+    """Backend whose vectors depend only on the text."""
+
+    def embed_documents(self, texts):
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def rows(cache):
+    return cache.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+
+def test_overwritten_keys_are_not_counted_as_new():
+    cache = CachedEmbeddings(CountingEmbeddings(), path=":memory:", max_entries=100)
+    texts = [f"review {i}" for i in range(10)]
+    cache.embed_documents(texts)
+    keys = [cache._key("document", text) for text in texts]
+    # Storing the same texts again, as another process racing on a miss would
+    cache._store(keys, [np.ones(2, dtype=np.float32)] * len(keys))
+    assert cache.stats()["entries"] == rows(cache) == 10
+
+
+def test_eviction_keeps_the_most_recent_ninety_percent():
+    cache = CachedEmbeddings(CountingEmbeddings(), path=":memory:", max_entries=20)
+    for i in range(20):
+        cache.embed_documents([f"review {i}"])
+    keys = [cache._key("document", f"review {i}") for i in range(20)]
+    for _ in range(5):
+        cache._store(keys, [np.ones(2, dtype=np.float32)] * len(keys))
+    assert rows(cache) == 20
+    cache.embed_documents(["one more review"])
+    assert rows(cache) == cache.stats()["entries"] == 18
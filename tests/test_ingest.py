@@ -0,0 +1,105 @@
+import threading
+
+import pytest
+from langchain_core.documents import Document
+
+from ecommbot.ingest import _new_documents
+from ecommbot.ingest_pipeline import BatchIngestor
+from ecommbot.manifest import IngestManifest, assign_content_ids, content_hash
+
+
+class RecordingStore:
+    """Vector store stand-in that counts how often each id is added; fails on the ``fail_on``-th call."""
+
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+        self.calls = 0
+        self.added = {}
+        self._lock = threading.Lock()
+
+    def add_documents(self, docs, ids=None):
+        with self._lock:
+            self.calls += 1
+            if self.calls == self.fail_on:
+                raise ConnectionError("store unavailable")
+            for doc_id in ids:
+                self.added[doc_id] = self.added.get(doc_id, 0) + 1
+
+
+def reviews(n, product="BoAt Rockerz 235v2"):
+    return [Document(page_content=f"review number {i}", metadata={"product_name": product}) for i in range(n)]
+
+
+def batches(docs, size=7):
+    return list(assign_content_ids(docs[i:i + size] for i in range(0, len(docs), size)))
+
+
+@pytest.mark.parametrize("max_workers", [1, 3])
+def test_resume_after_failure_neither_duplicates_nor_drops(tmp_path, max_workers):
+    docs = reviews(100)
+    checkpoint = str(tmp_path / "checkpoint.json")
+    failing = RecordingStore(fail_on=6)
+
+    with pytest.raises(ConnectionError):
+        BatchIngestor(failing, batch_size=10, max_workers=max_workers, checkpoint_path=checkpoint,
+                      source_key="reviews.csv", max_retries=0).run(batches(docs))
+    assert 0 < len(failing.added) < len(docs)
+
+    resumed = RecordingStore()
+    stats = BatchIngestor(resumed, batch_size=10, max_workers=max_workers, checkpoint_path=checkpoint,
+                          source_key="reviews.csv", max_retries=0).run(batches(docs))
+
+    assert stats.skipped_batches == len(failing.added) // 10
+    assert set(failing.added).isdisjoint(resumed.added)
+    assert set(failing.added) | set(resumed.added) == {doc.id for doc in docs}
+    assert all(count == 1 for count in (*failing.added.values(), *resumed.added.values()))
+    assert not (tmp_path / "checkpoint.json").exists()
+
+
+def test_checkpoint_of_another_source_is_ignored(tmp_path):
+    docs = reviews(50)
+    checkpoint = str(tmp_path / "checkpoint.json")
+    with pytest.raises(ConnectionError):
+        BatchIngestor(RecordingStore(fail_on=3), batch_size=10, max_workers=1, checkpoint_path=checkpoint,
+                      source_key="old.csv", max_retries=0).run(batches(docs))
+
+    store = RecordingStore()
+    stats = BatchIngestor(store, batch_size=10, max_workers=1, checkpoint_path=checkpoint,
+                          source_key="new.csv", max_retries=0).run(batches(docs))
+    assert stats.skipped_batches == 0
+    assert len(store.added) == len(docs)
+
+
+def test_content_hash_ignores_whitespace_and_separates_products():
+    doc = Document(page_content="great  bass\n", metadata={"product_name": "A"})
+    assert content_hash(doc) == content_hash(Document(page_content="great bass", metadata={"product_name": "A"}))
+    assert content_hash(doc) != content_hash(Document(page_content="great bass", metadata={"product_name": "B"}))
+
+
+def test_manifest_skips_stored_and_repeated_documents():
+    manifest = IngestManifest(":memory:")
+    docs = reviews(10)
+    first = batches(docs)
+    manifest.add(doc.id for doc in docs[:6])
+
+    # Review 9 appears twice in the source; only its first copy is queued
+    repeated = batches([*docs, reviews(10)[9]])
+    fresh = [doc.id for batch in _new_documents(repeated, manifest) for doc in batch]
+
+    assert fresh == [doc.id for batch in first for doc in batch][6:]
+
+
+def test_manifest_prunes_documents_gone_from_the_source():
+    manifest = IngestManifest(":memory:")
+    docs = batches(reviews(10))
+    all_ids = [doc.id for batch in docs for doc in batch]
+    manifest.add(all_ids)
+
+    # The next scan of the source no longer contains the last three reviews
+    list(_new_documents([docs[0]], manifest))
+    stale = manifest.unseen()
+    assert sorted(stale) == sorted(all_ids[7:])
+
+    manifest.remove(stale)
+    assert len(manifest) == 7
+    assert manifest.missing(all_ids) == set(all_ids[7:])
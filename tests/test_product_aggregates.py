@@ -0,0 +1,68 @@
+import pandas as pd
+from langchain_core.runnables import RunnableLambda
+
+from ecommbot.product_aggregates import ProductAggregates, StructuredAnswerChain
+
+
+class AlwaysCategory:
+    """Intent classifier stand-in that tags every question as a category question."""
+
+    def is_category_query(self, question):
+        return True
+
+
+def rag(question):
+    return f"rag: {question}"
+
+
+def categorized_aggregates():
+    df = pd.DataFrame({
+        "product": ["Buds A", "Buds A", "Buds B", "Speaker C"],
+        "category": ["earbuds", "earbuds", "earbuds", "speaker"],
+        "rating": [5, 4, 3, 5],
+        "review_text": ["great", "good", "ok", "loud"],
+    })
+    return ProductAggregates.from_dataframe(df)
+
+
+def test_category_question_without_categories_goes_to_rag(flipkart_aggregates):
+    assert not flipkart_aggregates.categories
+    chain = StructuredAnswerChain(RunnableLambda(rag), flipkart_aggregates, AlwaysCategory())
+    for question in ("can you tell me the best bluetooth buds?", "best wired earphones under 500"):
+        assert flipkart_aggregates.answer_category(question) is None
+        assert chain.invoke(question) == f"rag: {question}"
+
+
+def test_category_question_naming_no_known_category_goes_to_rag():
+    aggregates = categorized_aggregates()
+    assert aggregates.answer_category("best wired earphones under 500") is None
+
+
+def test_category_question_naming_a_category_is_answered():
+    aggregates = categorized_aggregates()
+    chain = StructuredAnswerChain(RunnableLambda(rag), aggregates, AlwaysCategory())
+    answer = chain.invoke("which earbuds should I buy?")
+    assert answer.startswith("Top rated earbuds by customer reviews: 1. Buds A")
+    assert "Speaker C" not in answer
+
+
+PRODUCT = "boAt Rockerz 235v2"
+
+
+def test_statistics_questions_are_answered(flipkart_aggregates):
+    for question in (f"What is the average rating of the {PRODUCT}?",
+                     f"what's the rating of {PRODUCT}",
+                     f"How many stars does the {PRODUCT} have?"):
+        assert "average rating of" in flipkart_aggregates.answer(question), question
+    for question in (f"How many reviews does the {PRODUCT} have?",
+                     f"total number of reviews for {PRODUCT}"):
+        assert flipkart_aggregates.answer(question).endswith(" reviews."), question
+
+
+def test_opinion_questions_are_not_answered_from_statistics(flipkart_aggregates):
+    for question in (f"Is the {PRODUCT} rated well for bass?",
+                     f"Would you give the {PRODUCT} five stars for battery life?",
+                     f"Does the {PRODUCT} score well on call quality?",
+                     f"Is the {PRODUCT} worth it, given its total price and reviews?",
+                     f"How many reviews mention the bass of the {PRODUCT}?"):
+        assert flipkart_aggregates.answer(question) is None, question
@@ -0,0 +1,55 @@
+from langchain_core.embeddings import Embeddings
+from langchain_core.runnables import RunnableLambda
+
+from ecommbot.semantic_cache import SemanticCache, SemanticCacheChain
+
+
+class ConstantEmbeddings(Embeddings):
+    """Every text gets the same vector, so every pair of questions has similarity 1."""
+
+    def embed_documents(self, texts):
+        return [[1.0, 0.0, 0.0] for _ in texts]
+
+    def embed_query(self, text):
+        return [1.0, 0.0, 0.0]
+
+
+def answering_chain(calls):
+    def answer(question):
+        calls.append(question)
+        return f"answer to {question}"
+
+    return RunnableLambda(answer)
+
+
+def test_questions_naming_different_products_do_not_share_an_answer(flipkart_aggregates):
+    calls = []
+    cache = SemanticCache(ConstantEmbeddings(), matcher=flipkart_aggregates.matcher)
+    chain = SemanticCacheChain(answering_chain(calls), cache)
+
+    first = chain.invoke("Is the boAt Rockerz 235v2 good for bass?")
+    second = chain.invoke("Is the realme Buds Q good for bass?")
+
+    assert first != second
+    assert len(calls) == 2
+
+
+def test_questions_naming_the_same_product_share_an_answer(flipkart_aggregates):
+    calls = []
+    cache = SemanticCache(ConstantEmbeddings(), matcher=flipkart_aggregates.matcher)
+    chain = SemanticCacheChain(answering_chain(calls), cache)
+
+    first = chain.invoke("Is the boAt Rockerz 235v2 good for bass?")
+    second = chain.invoke("is the boat rockerz 235v2 good for bass")
+
+    assert first == second
+    assert len(calls) == 1
+
+
+def test_question_naming_no_product_does_not_get_a_product_answer(flipkart_aggregates):
+    calls = []
+    cache = SemanticCache(ConstantEmbeddings(), matcher=flipkart_aggregates.matcher)
+    chain = SemanticCacheChain(answering_chain(calls), cache)
+
+    chain.invoke("Is the boAt Rockerz 235v2 good for bass?")
+    assert chain.invoke("Which earphones are good for bass?") == "answer to Which earphones are good for bass?"